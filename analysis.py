@@ -0,0 +1,286 @@
+from typing import Any
+
+import numpy as np
+
+SUMMARY_PERCENTILES: tuple[int, ...] = (10, 25, 75, 90)
+
+
+def summary_stats(values: np.ndarray) -> dict[str, Any]:
+    """Min, max, mean, median, std and percentiles of `values` in one pass over the data."""
+    if values.size == 0:
+        return {
+            "min": None,
+            "max": None,
+            "mean": None,
+            "median": None,
+            "std": None,
+            **{f"p{p}": None for p in SUMMARY_PERCENTILES},
+            "count": 0,
+        }
+    q = np.percentile(values, (0, 50, 100, *SUMMARY_PERCENTILES))
+    return {
+        "min": float(q[0]),
+        "max": float(q[2]),
+        "mean": float(values.mean()),
+        "median": float(q[1]),
+        "std": float(values.std(ddof=1)) if values.size > 1 else None,
+        **{f"p{p}": float(v) for p, v in zip(SUMMARY_PERCENTILES, q[3:])},
+        "count": int(values.size),
+    }
+
+
+def ordered_window(values: np.ndarray, tiebreak: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """
+    Indices of the elements at positions [start, stop) when ordered ascending by
+    (value, tiebreak), found by partial selection instead of a full sort.
+    """
+    n = values.size
+    start = max(0, start)
+    stop = min(n, stop)
+    if start >= stop:
+        return np.array([], dtype=np.intp)
+    partitioned = np.partition(values, (start, stop - 1))
+    lo = partitioned[start]
+    hi = partitioned[stop - 1]
+    # Everything tied with the window edges takes part in the final ordering.
+    candidates = np.flatnonzero((values >= lo) & (values <= hi))
+    below = int(np.count_nonzero(values < lo))
+    ordered = candidates[np.lexsort((tiebreak[candidates], values[candidates]))]
+    return ordered[start - below : stop - below]
+
+
+def rank_slices(
+    values: np.ndarray, tiebreak: np.ndarray, order: str, limit: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Top, bottom and median `limit` indices of `values` sorted by (value, tiebreak),
+    descending when `order` is "desc". The bottom slice starts from the extreme end.
+    """
+    n = values.size
+    empty = np.array([], dtype=np.intp)
+    if n == 0:
+        return empty, empty, empty
+    k = max(1, min(limit, n))
+    median_start = max(0, (n - 1) // 2 - (k // 2))
+    median_start = min(median_start, n - k)
+    if order.lower() == "desc":
+        top = ordered_window(values, tiebreak, n - k, n)[::-1]
+        bottom = ordered_window(values, tiebreak, 0, k)
+        median = ordered_window(values, tiebreak, n - median_start - k, n - median_start)[::-1]
+    else:
+        top = ordered_window(values, tiebreak, 0, k)
+        bottom = ordered_window(values, tiebreak, n - k, n)[::-1]
+        median = ordered_window(values, tiebreak, median_start, median_start + k)
+    return top, bottom, median
+
+
+def rank_columns(matrix: np.ndarray) -> np.ndarray:
+    """Average ranks (1-based) within each column, ignoring and preserving NaN."""
+    ranks = np.full(matrix.shape, np.nan)
+    for j in range(matrix.shape[1]):
+        column = matrix[:, j]
+        present = np.flatnonzero(~np.isnan(column))
+        if present.size == 0:
+            continue
+        _, inverse, counts = np.unique(
+            column[present], return_inverse=True, return_counts=True
+        )
+        # Tied values share the mean of the ranks they span.
+        upper = np.cumsum(counts)
+        ranks[present, j] = (upper - (counts - 1) / 2.0)[inverse]
+    return ranks
+
+
+def pairwise_correlation(
+    matrix: np.ndarray, method: str = "pearson"
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Correlation between every pair of columns using the rows where both are present.
+    Returns (correlations, observation counts); undefined correlations are NaN. For
+    Spearman, ranks are taken per column over all of its present values.
+    """
+    if method == "spearman":
+        matrix = rank_columns(matrix)
+    present = (~np.isnan(matrix)).astype(float)
+    values = np.where(present > 0, matrix, 0.0)
+    n = present.T @ present
+    sum_x = values.T @ present
+    sum_y = present.T @ values
+    sum_xy = values.T @ values
+    sum_xx = (values * values).T @ present
+    sum_yy = present.T @ (values * values)
+    return _correlation_from_sums(n, sum_x, sum_y, sum_xy, sum_xx, sum_yy), n.astype(np.intp)
+
+
+def rowwise_correlation(a: np.ndarray, b: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Pearson correlation of a[i] with b[i] for every row over the columns where both exist."""
+    present = ~np.isnan(a) & ~np.isnan(b)
+    x = np.where(present, a, 0.0)
+    y = np.where(present, b, 0.0)
+    n = present.sum(axis=1).astype(float)
+    r = _correlation_from_sums(
+        n,
+        x.sum(axis=1),
+        y.sum(axis=1),
+        (x * y).sum(axis=1),
+        (x * x).sum(axis=1),
+        (y * y).sum(axis=1),
+    )
+    return r, n.astype(np.intp)
+
+
+def _correlation_from_sums(
+    n: np.ndarray,
+    sum_x: np.ndarray,
+    sum_y: np.ndarray,
+    sum_xy: np.ndarray,
+    sum_xx: np.ndarray,
+    sum_yy: np.ndarray,
+) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = n * sum_xy - sum_x * sum_y
+        var_x = n * sum_xx - sum_x * sum_x
+        var_y = n * sum_yy - sum_y * sum_y
+        r = cov / np.sqrt(var_x * var_y)
+    # Constant series and fewer than two observations have no defined correlation.
+    flat_x = var_x <= 1e-12 * np.maximum(1.0, n * sum_xx)
+    flat_y = var_y <= 1e-12 * np.maximum(1.0, n * sum_yy)
+    r[(n < 2) | flat_x | flat_y] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def _previous_present(present: np.ndarray) -> np.ndarray:
+    """For each cell, the column of the nearest present cell to its left in the row, or -1."""
+    cols = np.where(present, np.arange(present.shape[1]), -1)
+    last = np.maximum.accumulate(cols, axis=1)
+    return np.concatenate([np.full((present.shape[0], 1), -1), last[:, :-1]], axis=1)
+
+
+def trend_metrics(values: np.ndarray, x: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Trend statistics for every row of `values` (row, period) at once, over the periods
+    at positions `x` (e.g. years) where the row has a value; NaN marks a gap.
+
+    - slope: least-squares slope of value on x.
+    - cagr: compound annual growth rate from the first to the last present value, per
+      unit of x; only defined when both are positive.
+    - volatility: sample standard deviation of the changes between consecutive present
+      values, each divided by the distance in x, so a gap does not count as one step.
+    - trend_breaks: how often the direction of those changes reverses; zero changes
+      have no direction and are skipped.
+
+    Also returns observations, and first/last (value and column) of each row. Statistics
+    a row has too few values for are NaN.
+    """
+    n_rows, n_cols = values.shape
+    present = ~np.isnan(values)
+    observations = present.sum(axis=1)
+    has_value = observations > 0
+    index = np.arange(n_rows)
+    first = np.where(has_value, np.argmax(present, axis=1), -1)
+    last = np.where(has_value, n_cols - 1 - np.argmax(present[:, ::-1], axis=1), -1)
+    first_values = np.where(has_value, values[index, np.maximum(first, 0)], np.nan)
+    last_values = np.where(has_value, values[index, np.maximum(last, 0)], np.nan)
+
+    xs = np.where(present, x[np.newaxis, :], 0.0)
+    ys = np.where(present, values, 0.0)
+    n = observations.astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Centred on each row's mean x, which keeps the sums small for year-sized x.
+        mean_x = xs.sum(axis=1) / n
+        dx = np.where(present, x[np.newaxis, :] - mean_x[:, np.newaxis], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        slope = (dx * ys).sum(axis=1) / sxx
+        slope[(observations < 2) | (sxx <= 0)] = np.nan
+
+        span = np.where(has_value, x[np.maximum(last, 0)] - x[np.maximum(first, 0)], 0.0)
+        growth = (first_values > 0) & (last_values > 0) & (span > 0)
+        cagr = np.full(n_rows, np.nan)
+        cagr[growth] = (last_values[growth] / first_values[growth]) ** (1.0 / span[growth]) - 1.0
+
+        prev = _previous_present(present)
+        step = present & (prev >= 0)
+        prev_safe = np.maximum(prev, 0)
+        prev_values = values[index[:, np.newaxis], prev_safe]
+        changes = np.where(
+            step, (values - prev_values) / (x[np.newaxis, :] - x[prev_safe]), np.nan
+        )
+
+    n_changes = step.sum(axis=1)
+    mean_change = np.where(step, changes, 0.0).sum(axis=1) / np.maximum(n_changes, 1)
+    deviations = np.where(step, changes - mean_change[:, np.newaxis], 0.0)
+    volatility = np.sqrt((deviations * deviations).sum(axis=1) / np.maximum(n_changes - 1, 1))
+    volatility[n_changes < 2] = np.nan
+
+    signs = np.sign(np.where(step, changes, 0.0))
+    directed = signs != 0
+    prev_directed = _previous_present(directed)
+    prev_sign = signs[index[:, np.newaxis], np.maximum(prev_directed, 0)]
+    reversals = directed & (prev_directed >= 0) & (signs != prev_sign)
+    trend_breaks = reversals.sum(axis=1).astype(float)
+    trend_breaks[n_changes < 2] = np.nan
+
+    return {
+        "observations": observations,
+        "first": first,
+        "last": last,
+        "first_values": first_values,
+        "last_values": last_values,
+        "slope": slope,
+        "cagr": cagr,
+        "volatility": volatility,
+        "trend_breaks": trend_breaks,
+    }
+
+
+def group_stats(
+    membership: np.ndarray,
+    values: np.ndarray,
+    weights: np.ndarray | None = None,
+    quantiles: tuple[float, ...] = (0.25, 0.5, 0.75),
+) -> dict[str, np.ndarray]:
+    """
+    Statistics of `values` (one per row, NaN for missing) within each group, for every
+    group of the boolean `membership` matrix (group, row) at once: count, mean, std
+    (sample), min, max and the given quantiles (linear interpolation, like
+    np.percentile). With `weights`, also weighted_mean and weight over the members that
+    have a positive weight. Statistics of groups without enough values are NaN.
+    """
+    present = ~np.isnan(values)
+    member = membership & present[np.newaxis, :]
+    count = member.sum(axis=1)
+    filled = np.where(present, values, 0.0)
+    result: dict[str, np.ndarray] = {"count": count}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (member.astype(float) @ filled) / count
+        deviations = np.where(member, filled[np.newaxis, :] - mean[:, np.newaxis], 0.0)
+        std = np.sqrt((deviations * deviations).sum(axis=1) / (count - 1))
+    std[count < 2] = np.nan
+    empty = count == 0
+    result["mean"] = mean
+    result["std"] = std
+    result["min"] = np.where(empty, np.nan, np.where(member, values, np.inf).min(axis=1))
+    result["max"] = np.where(empty, np.nan, np.where(member, values, -np.inf).max(axis=1))
+
+    # Quantiles from one sort: the k-th smallest member value of a group is at the first
+    # sorted position where the group's running member count exceeds k.
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    running = np.cumsum(member[:, order], axis=1)
+    for q in quantiles:
+        h = (count - 1) * q
+        lo = np.floor(h)
+        lo_pos = np.argmax(running > lo[:, np.newaxis], axis=1)
+        hi_pos = np.argmax(running > np.ceil(h)[:, np.newaxis], axis=1)
+        low = sorted_values[lo_pos]
+        value = low + (h - lo) * (sorted_values[hi_pos] - low)
+        result[f"p{round(q * 100)}"] = np.where(empty, np.nan, value)
+
+    if weights is not None:
+        weighted = member & (~np.isnan(weights) & (weights > 0))[np.newaxis, :]
+        w = np.where(weighted, weights[np.newaxis, :], 0.0)
+        total = w.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result["weighted_mean"] = (w @ filled) / total
+        result["weight"] = total
+    return result
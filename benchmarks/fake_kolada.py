@@ -0,0 +1,185 @@
+import asyncio
+import json
+import random
+import re
+import zlib
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+# Synthetic stand-in for the Kolada v2 API, sized like production by default. Served
+# through httpx.MockTransport so benchmarks run offline with a configurable latency.
+
+AREAS: tuple[str, ...] = (
+    "Befolkning", "Demokrati", "Ekonomi", "Folkhälsa", "Förskola", "Grundskola",
+    "Gymnasieskola", "Hälso- och sjukvård", "Individ- och familjeomsorg", "Kultur",
+    "Miljö", "Näringsliv", "Personal", "Skola,Förskola", "Vård och omsorg",
+)
+WORDS: tuple[str, ...] = (
+    "andel", "antal", "kostnad", "invånare", "elever", "kommun", "region", "äldre",
+    "barn", "hemtjänst", "särskilt", "boende", "förskola", "grundskola", "gymnasium",
+    "behörighet", "nettokostnad", "personal", "sjukfrånvaro", "utsläpp", "avfall",
+    "bostäder", "arbetslöshet", "ekonomiskt", "bistånd", "kultur", "bibliotek",
+    "vårdcentral", "väntetid", "resultat", "nöjdhet", "brukare", "per", "invånare",
+    "kronor", "procent", "totalt", "kvinnor", "män", "årskurs", "betyg", "meritvärde",
+)
+DATA_YEARS: tuple[int, ...] = tuple(range(2010, 2024))
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+class FakeKolada:
+    """
+    Deterministic synthetic catalog and data. Every request waits `latency` seconds
+    plus up to `jitter` seconds before it is answered, and fails with a 503 with
+    probability `error_rate`.
+    """
+
+    def __init__(
+        self,
+        n_kpis: int = 6000,
+        n_municipalities: int = 290,
+        n_regions: int = 21,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 1,
+        error_rate: float = 0.0,
+    ) -> None:
+        rng = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.seed = seed
+        self._rng = random.Random(seed + 1)
+        self.kpis: list[dict[str, Any]] = [
+            {
+                "id": f"N{i:05d}",
+                "title": _text(rng, rng.randint(4, 10)).capitalize(),
+                "description": _text(rng, rng.randint(20, 60)).capitalize() + ".",
+                "operating_area": AREAS[i % len(AREAS)],
+                "municipality_type": "K" if i % 5 else "L",
+                "is_divided_by_gender": i % 3 == 0,
+                "has_ou_data": i % 4 == 0,
+                "auspices": "E",
+                "perspective": "Resurser",
+                "publication_date": "2024-03-01",
+            }
+            for i in range(n_kpis)
+        ]
+        self.municipalities: list[dict[str, Any]] = [
+            {"id": f"{i:04d}", "title": f"Kommun {i}", "type": "K"}
+            for i in range(1, n_municipalities + 1)
+        ] + [
+            {"id": f"{i:04d}", "title": f"Region {i}", "type": "L"}
+            for i in range(9001, 9001 + n_regions)
+        ]
+        # One group per region with its municipalities, plus peer groups of every 10th.
+        kommuner = [m for m in self.municipalities if m["type"] == "K"]
+        self.groups: list[dict[str, Any]] = [
+            {
+                "id": f"G{r:05d}",
+                "title": f"Kommuner i {region['title']}",
+                "members": [
+                    {"id": m["id"], "title": m["title"]}
+                    for i, m in enumerate(kommuner)
+                    if i % n_regions == r
+                ],
+            }
+            for r, region in enumerate(m for m in self.municipalities if m["type"] == "L")
+        ] + [
+            {
+                "id": f"G9{p:04d}",
+                "title": f"Jämförelsegrupp {p + 1}",
+                "members": [
+                    {"id": m["id"], "title": m["title"]} for m in kommuner[p :: 10]
+                ],
+            }
+            for p in range(10)
+        ]
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def value(self, kpi_id: str, municipality_id: str, year: int, gender: str) -> float | None:
+        key = f"{self.seed}|{kpi_id}|{municipality_id}|{year}|{gender}"
+        h = zlib.crc32(key.encode()) % 10000
+        if h < 300:
+            return None
+        return round(h / 100 + (year - 2000), 1)
+
+    def _data_rows(
+        self, kpi_ids: list[str], municipality_ids: list[str], years: list[int]
+    ) -> list[dict[str, Any]]:
+        rows = []
+        for kpi_id in kpi_ids:
+            for m in municipality_ids:
+                for y in years:
+                    rows.append(
+                        {
+                            "kpi": kpi_id,
+                            "municipality": m,
+                            "period": y,
+                            "values": [
+                                {
+                                    "gender": g,
+                                    "count": 1,
+                                    "status": "",
+                                    "value": self.value(kpi_id, m, y, g),
+                                }
+                                for g in ("T", "K", "M")
+                            ],
+                        }
+                    )
+        return rows
+
+    def _page(self, request: httpx.Request, items: list[dict[str, Any]]) -> httpx.Response:
+        url = urlparse(str(request.url))
+        query = parse_qs(url.query)
+        per_page = int(query.get("per_page", ["5000"])[0])
+        page = int(query.get("page", ["1"])[0])
+        chunk = items[(page - 1) * per_page : page * per_page]
+        next_page = None
+        if page * per_page < len(items):
+            next_page = (
+                f"{url.scheme}://{url.netloc}{url.path}?per_page={per_page}&page={page + 1}"
+            )
+        body = json.dumps(
+            {"count": len(items), "values": chunk, "next_page": next_page},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        self.bytes_sent += len(body)
+        return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        delay = self.latency + (self._rng.random() * self.jitter if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            return httpx.Response(503, json={"error": "service unavailable"})
+        path = re.sub(r"^/v\d+", "", request.url.path)
+        if path == "/kpi":
+            return self._page(request, self.kpis)
+        if path == "/municipality":
+            return self._page(request, self.municipalities)
+        if path == "/municipality_groups":
+            return self._page(request, self.groups)
+        match = re.match(
+            r"^/data/kpi/([^/]+)(?:/municipality/([^/]+))?(?:/year/([^/]+))?$", path
+        )
+        if match:
+            kpis, munis, years = match.groups()
+            municipality_ids = (
+                munis.split(",") if munis else [m["id"] for m in self.municipalities]
+            )
+            year_list = [int(y) for y in years.split(",")] if years else list(DATA_YEARS)
+            rows = self._data_rows(kpis.split(","), municipality_ids, year_list)
+            return self._page(request, rows)
+        return httpx.Response(404, json={"error": f"unknown path {path}"})
@@ -0,0 +1,159 @@
+"""
+Resident memory of the catalog, per part and per representation.
+
+    python benchmarks/memory_report.py --kpis 6000 --workers 4
+
+Builds the catalog from the synthetic Kolada API and reports the deep size of each
+part held by a worker: as plain decoded dicts and posting lists, as the compact record
+tables and packed postings the server keeps, and as views into the shared memory-mapped
+file. The per-container estimate counts private memory once per worker and the mapped
+file once.
+"""
+
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import sys
+import tempfile
+from array import array
+from typing import Any
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_CACHE_DIR = tempfile.mkdtemp(prefix="kolada-memory-")
+os.environ["KOLADA_CACHE_DIR"] = _CACHE_DIR
+os.environ["KOLADA_CATALOG_SNAPSHOT"] = ""
+os.environ["KOLADA_SHARED_CATALOG_PATH"] = os.path.join(_CACHE_DIR, "catalog.map")
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from fake_kolada import FakeKolada
+from lifespan import (
+    LifespanContext,
+    ServerServices,
+    context_from_map,
+    fetch_catalog,
+    save_catalog_map,
+)
+from search import SearchIndex
+from shared_catalog import CatalogMap
+from upstream import create_http_client
+
+CATALOG_PARTS: tuple[str, ...] = (
+    "kpi_cache",
+    "kpi_map",
+    "municipality_cache",
+    "municipality_map",
+    "operating_areas_summary",
+    "operating_area_index",
+    "search_index",
+    "related_kpis",
+)
+
+
+def deep_sizeof(obj: Any, seen: set[int] | None = None) -> int:
+    """
+    Bytes reachable from `obj`, counting shared objects once. Arrays and buffers over
+    a memory mapping are not counted: their pages belong to the mapped file.
+    """
+    seen = set() if seen is None else seen
+    if id(obj) in seen or obj is None or isinstance(obj, (bool, type)):
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, mmap.mmap):
+        return 0
+    if isinstance(obj, np.ndarray):
+        owns = obj.base is None
+        return sys.getsizeof(obj) + (0 if owns else deep_sizeof(obj.base, seen))
+    if isinstance(obj, memoryview):
+        return sys.getsizeof(obj) + deep_sizeof(obj.obj, seen)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, array)):
+        return size
+    if isinstance(obj, dict):
+        return size + sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(deep_sizeof(v, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    for slot in getattr(type(obj), "__slots__", ()):
+        size += deep_sizeof(getattr(obj, slot, None), seen)
+    return size
+
+
+def report(ctx: LifespanContext) -> dict[str, int]:
+    # One seen set across parts, so the maps are only charged for what they add.
+    seen: set[int] = set()
+    parts = {
+        part: deep_sizeof(ctx[part], seen)  # type: ignore[literal-required]
+        for part in CATALOG_PARTS
+    }
+    parts["total"] = sum(parts.values())
+    return parts
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    fake = FakeKolada(n_kpis=args.kpis, n_municipalities=args.municipalities)
+    services: ServerServices = {
+        "http_client": create_http_client(fake.transport()),
+        "data_cache": None,  # type: ignore[typeddict-item]
+        "popularity": None,  # type: ignore[typeddict-item]
+        "mirror": None,
+        "readiness": None,  # type: ignore[typeddict-item]
+    }
+    try:
+        compact = await fetch_catalog(services)
+    finally:
+        await services["http_client"].aclose()
+
+    plain: dict[str, Any] = dict(compact)
+    plain["kpi_cache"] = [dict(k) for k in compact["kpi_cache"]]
+    plain["kpi_map"] = {k["id"]: k for k in plain["kpi_cache"]}
+    plain["municipality_cache"] = [dict(m) for m in compact["municipality_cache"]]
+    plain["municipality_map"] = {m["id"]: m for m in plain["municipality_cache"]}
+    index = compact["search_index"]
+    plain["search_index"] = SearchIndex(
+        list(index.doc_ids), {t: (list(d), list(v)) for t, (d, v) in index.postings.items()}
+    )
+
+    save_catalog_map(compact)
+    catalog = CatalogMap(os.environ["KOLADA_SHARED_CATALOG_PATH"])
+    mapped = context_from_map(catalog, services)
+
+    result: dict[str, Any] = {
+        "kpis": len(compact["kpi_cache"]),
+        "municipalities": len(compact["municipality_cache"]),
+        "plain_dicts": report(plain),  # type: ignore[arg-type]
+        "compact": report(compact),
+        "shared_map": {**report(mapped), "mapped_file": catalog.nbytes},
+    }
+    workers = args.workers
+    result["per_container"] = {
+        "workers": workers,
+        "plain_dicts": workers * result["plain_dicts"]["total"],
+        "compact": workers * result["compact"]["total"],
+        "shared_map": workers * result["shared_map"]["total"] + catalog.nbytes,
+    }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kpis", type=int, default=6000)
+    parser.add_argument("--municipalities", type=int, default=290)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    stderr, sys.stderr = sys.stderr, open(os.devnull, "w")
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
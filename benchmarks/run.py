@@ -0,0 +1,426 @@
+"""
+Offline benchmarks against a synthetic Kolada API.
+
+    python benchmarks/run.py --latency-ms 30 --output bench.json
+    python benchmarks/run.py --compare bench.json
+
+Measures lifespan startup (full fetch and snapshot), background catalog refresh,
+per-tool latency (upstream, local mirror, cached) and throughput, the
+decode/ingest/encode costs of one data response, and memory, and prints the results
+as JSON.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Configuration is read at import time, so isolate the server from the user's cache first.
+_CACHE_DIR = tempfile.mkdtemp(prefix="kolada-bench-")
+os.environ["KOLADA_CACHE_DIR"] = _CACHE_DIR
+os.environ["KOLADA_CATALOG_SNAPSHOT"] = os.path.join(_CACHE_DIR, "catalog.snapshot")
+os.environ["KOLADA_DATA_CACHE_DISK"] = ""
+os.environ["KOLADA_POPULARITY_PATH"] = ""
+os.environ["KOLADA_PREFETCH_INTERVAL"] = "0"
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+import tools
+from codec import decode_data_page, decoder_name, encode_json
+from config import BASE_URL
+from fake_kolada import FakeKolada
+from lifespan import LifespanContext, open_context, revalidate_catalog
+from mirror import DataMirror
+from store import ValueStore
+from upstream import create_http_client
+
+
+class BenchContext:
+    """Minimal stand-in for the MCP request context that tools read the lifespan from."""
+
+    class _Request:
+        def __init__(self, lifespan_context: LifespanContext) -> None:
+            self.lifespan_context = lifespan_context
+
+    def __init__(self, lifespan_context: LifespanContext) -> None:
+        self.request_context = self._Request(lifespan_context)
+
+
+Call = Callable[[BenchContext, int], Awaitable[Any]]
+
+
+def _latency_summary(samples: list[float]) -> dict[str, float | int]:
+    ms = sorted(s * 1000.0 for s in samples)
+    return {
+        "n": len(ms),
+        "min_ms": ms[0],
+        "p50_ms": statistics.median(ms),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "max_ms": ms[-1],
+        "mean_ms": statistics.fmean(ms),
+    }
+
+
+# KPIs a scenario call uses are kpi(i, offset) for offsets below this.
+KPI_OFFSETS: int = 10
+
+
+def _kpi(fake: FakeKolada, i: int, offset: int = 0) -> str:
+    return fake.kpis[(i * 7 + offset) % len(fake.kpis)]["id"]
+
+
+def _scenarios(fake: FakeKolada, years: str) -> dict[str, tuple[Call, bool]]:
+    """Tool calls by name: (call(ctx, i), whether it reads KPI data). i varies the KPI."""
+    munis = [m["id"] for m in fake.municipalities if m["type"] == "K"]
+    area = fake.kpis[0]["operating_area"].split(",")[0]
+    year = years.split(",")[-1]
+
+    def kpi(i: int, offset: int = 0) -> str:
+        return _kpi(fake, i, offset)
+
+    return {
+        "list_operating_areas": (lambda c, i: tools.list_operating_areas(c), False),
+        "get_kpis_by_operating_area": (
+            lambda c, i: tools.get_kpis_by_operating_area(area, c, limit=100),
+            False,
+        ),
+        "get_kpi_metadata": (lambda c, i: tools.get_kpi_metadata(kpi(i), c), False),
+        "find_related_kpis": (lambda c, i: tools.find_related_kpis(c, kpi(i)), False),
+        "search_kpis": (
+            lambda c, i: tools.search_kpis(("kostnad elever", "andel äldre hemtjänst")[i % 2], c),
+            False,
+        ),
+        "list_municipalities": (lambda c, i: tools.list_municipalities(c), False),
+        "list_municipality_groups": (lambda c, i: tools.list_municipality_groups(c), False),
+        "fetch_kolada_data": (
+            lambda c, i: tools.fetch_kolada_data(kpi(i), ",".join(munis[:5]), c, years),
+            True,
+        ),
+        "fetch_kolada_data_bulk": (
+            lambda c, i: tools.fetch_kolada_data_bulk(
+                ",".join(kpi(i, j) for j in range(KPI_OFFSETS)), ",".join(munis[:20]), c, years
+            ),
+            True,
+        ),
+        "analyze_kpi_across_municipalities": (
+            lambda c, i: tools.analyze_kpi_across_municipalities(kpi(i), c, year),
+            True,
+        ),
+        "analyze_kpi_across_municipalities_multi_year": (
+            lambda c, i: tools.analyze_kpi_across_municipalities(kpi(i), c, years),
+            True,
+        ),
+        "analyze_kpi_trends": (
+            lambda c, i: tools.analyze_kpi_trends(kpi(i), c, years),
+            True,
+        ),
+        "analyze_kpi_by_municipality_group": (
+            lambda c, i: tools.analyze_kpi_by_municipality_group(kpi(i), c, year),
+            True,
+        ),
+        "compare_kpis": (
+            lambda c, i: tools.compare_kpis(kpi(i), kpi(i, 1), years, c),
+            True,
+        ),
+        "correlate_kpis": (
+            lambda c, i: tools.correlate_kpis(
+                ",".join(kpi(i, j) for j in range(1, 6)), years, c, target_kpi_id=kpi(i)
+            ),
+            True,
+        ),
+        "filter_municipalities_by_kpi": (
+            lambda c, i: tools.filter_municipalities_by_kpi(c, kpi(i), 50.0, "above", year),
+            True,
+        ),
+    }
+
+
+async def bench_startup(fake: FakeKolada, repeat: int) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for mode in ("full_fetch", "snapshot"):
+        samples = []
+        serving = []
+        municipalities = []
+        for _ in range(repeat):
+            if mode == "full_fetch":
+                _drop_snapshot()
+            start = time.perf_counter()
+            async with open_context(create_http_client(fake.transport())) as ctx:
+                serving.append(time.perf_counter() - start)
+                await ctx["readiness"].wait("municipalities")
+                municipalities.append(time.perf_counter() - start)
+                await ctx["readiness"].wait("catalog")
+                samples.append(time.perf_counter() - start)
+        # The last full fetch leaves the snapshot that the snapshot runs start from.
+        results[mode] = _latency_summary(samples)
+        # A cold start serves at once and loads the catalog in the background.
+        results[f"{mode}_serving"] = _latency_summary(serving)
+        results[f"{mode}_municipalities"] = _latency_summary(municipalities)
+    # Background refresh of a loaded catalog: refetch, diff and swap, re-indexing only
+    # changed KPIs (none here, so this is the refresh floor).
+    samples = []
+    async with open_context(create_http_client(fake.transport())) as ctx:
+        await ctx["readiness"].wait("catalog")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await revalidate_catalog(ctx)
+            samples.append(time.perf_counter() - start)
+    results["refresh"] = _latency_summary(samples)
+    return results
+
+
+def _drop_snapshot() -> None:
+    # Without a snapshot the lifespan does a full fetch and does not revalidate right away.
+    snapshot = os.environ["KOLADA_CATALOG_SNAPSHOT"]
+    if os.path.exists(snapshot):
+        os.remove(snapshot)
+
+
+async def bench_tools(
+    fake: FakeKolada, years: str, iterations: int, concurrency: int, only: set[str]
+) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    _drop_snapshot()
+    async with open_context(create_http_client(fake.transport())) as ctx:
+        await ctx["readiness"].wait("catalog")
+        bench_ctx = BenchContext(ctx)
+        # A local mirror of the KPIs the cold calls use, for the local-first phase.
+        mirror = DataMirror(os.path.join(_CACHE_DIR, "bench-mirror.sqlite3"))
+        local_kpis = {
+            _kpi(fake, 10_000 + i, j) for i in range(iterations) for j in range(KPI_OFFSETS)
+        }
+        await mirror.sync(ctx["http_client"], [k for k in fake.kpis if k["id"] in local_kpis])
+        for name, (call, reads_data) in _scenarios(fake, years).items():
+            if only and name not in only:
+                continue
+            entry: dict[str, Any] = {}
+            if reads_data:
+                # Each call uses a KPI no earlier call touched, so it goes upstream.
+                cold = []
+                for i in range(iterations):
+                    ctx["data_cache"].clear()
+                    ctx["value_store"].clear()
+                    start = time.perf_counter()
+                    await call(bench_ctx, 10_000 + i)
+                    cold.append(time.perf_counter() - start)
+                entry["cold"] = _latency_summary(cold)
+                # The same calls answered from the local mirror instead of upstream.
+                local = []
+                ctx["mirror"] = mirror
+                for i in range(iterations):
+                    ctx["data_cache"].clear()
+                    ctx["value_store"].clear()
+                    start = time.perf_counter()
+                    await call(bench_ctx, 10_000 + i)
+                    local.append(time.perf_counter() - start)
+                ctx["mirror"] = None
+                entry["local"] = _latency_summary(local)
+            await call(bench_ctx, 0)
+            warm = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                await call(bench_ctx, 0)
+                warm.append(time.perf_counter() - start)
+            entry["warm"] = _latency_summary(warm)
+
+            total = iterations * concurrency
+            start = time.perf_counter()
+            for _ in range(iterations):
+                await asyncio.gather(*(call(bench_ctx, 0) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            entry["throughput"] = {
+                "concurrency": concurrency,
+                "calls": total,
+                "calls_per_s": total / elapsed if elapsed else None,
+            }
+            results[name] = entry
+        mirror.close()
+    return results
+
+
+def _json_response(raw: bytes, names: dict[str, Any]) -> dict[str, Any]:
+    # What fetch_kolada_data did before the codec: json.loads and tag every item in place.
+    data = json.loads(raw)
+    for item in data.get("values", []):
+        m_id = item.get("municipality", "Unknown")
+        item["municipality_name"] = names.get(m_id, {}).get("title", f"Kommun {m_id}")
+    return data
+
+
+async def bench_codec(fake: FakeKolada, years: str, iterations: int) -> dict[str, Any]:
+    """Costs of one all-municipality /data response, phase by phase, without the network."""
+    async with create_http_client(fake.transport()) as client:
+        resp = await client.get(f"{BASE_URL}/data/kpi/N00000/year/{years}?per_page=100000")
+    raw = resp.content
+    table, _ = decode_data_page(raw)
+    names = {m["id"]: m for m in fake.municipalities}
+    store = ValueStore(names, memory_budget=1 << 30)
+    response = table.to_response(names)
+    # Decoded tables build their columns on first use; do that before timing "ingest".
+    store.ingest("N00000", table, years.split(","))
+    phases: dict[str, Callable[[], Any]] = {
+        "json_loads": lambda: json.loads(raw),
+        "json_response": lambda: _json_response(raw, names),
+        "decode": lambda: decode_data_page(raw),
+        "decode_columns": lambda: decode_data_page(raw)[0].value_offsets,
+        "decode_response": lambda: decode_data_page(raw)[0].to_response(names),
+        "ingest": lambda: store.ingest("N00000", table, years.split(",")),
+        "to_response": lambda: table.to_response(names),
+        "encode": lambda: encode_json(response),
+    }
+    result: dict[str, Any] = {"decoder": decoder_name(), "bytes": len(raw), "rows": len(table)}
+    for name, phase in phases.items():
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            phase()
+            samples.append(time.perf_counter() - start)
+        result[name] = _latency_summary(samples)
+    return result
+
+
+async def bench_memory(fake: FakeKolada, years: str) -> dict[str, Any]:
+    _drop_snapshot()
+    gc.collect()
+    tracemalloc.start()
+    async with open_context(create_http_client(fake.transport())) as ctx:
+        await ctx["readiness"].wait("catalog")
+        gc.collect()
+        catalog_bytes, startup_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        bench_ctx = BenchContext(ctx)
+        for i in range(20):
+            await tools.analyze_kpi_across_municipalities(f"N{i:05d}", bench_ctx, years)
+        loaded_bytes, loaded_peak = tracemalloc.get_traced_memory()
+        store = ctx["value_store"].stats()
+        cache = ctx["data_cache"].stats()
+    tracemalloc.stop()
+    result: dict[str, Any] = {
+        "catalog_bytes": catalog_bytes,
+        "startup_peak_bytes": startup_peak,
+        "after_20_kpis_bytes": loaded_bytes,
+        "after_20_kpis_peak_bytes": loaded_peak,
+        "value_store_bytes": store["bytes"],
+        "data_cache_entries": cache["entries"],
+    }
+    try:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in KiB on Linux and bytes on macOS.
+        result["max_rss_bytes"] = rss if sys.platform == "darwin" else rss * 1024
+    except ImportError:
+        pass
+    return result
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> dict[str, Any]:
+    """Ratios current/baseline for the headline numbers; < 1 is faster or smaller."""
+
+    def ratio(a: Any, b: Any) -> float | None:
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)) and b:
+            return round(a / b, 3)
+        return None
+
+    out: dict[str, Any] = {"startup": {}, "tools": {}, "codec": {}, "memory": {}}
+    for mode, summary in current.get("startup", {}).items():
+        base = baseline.get("startup", {}).get(mode, {})
+        out["startup"][mode] = ratio(summary.get("p50_ms"), base.get("p50_ms"))
+    for name, entry in current.get("tools", {}).items():
+        base = baseline.get("tools", {}).get(name, {})
+        out["tools"][name] = {
+            phase: ratio(entry[phase]["p50_ms"], base.get(phase, {}).get("p50_ms"))
+            for phase in ("cold", "local", "warm")
+            if phase in entry
+        }
+    for phase, summary in current.get("codec", {}).items():
+        if isinstance(summary, dict):
+            base = baseline.get("codec", {}).get(phase, {})
+            out["codec"][phase] = ratio(summary.get("p50_ms"), base.get("p50_ms"))
+    for key, value in current.get("memory", {}).items():
+        out["memory"][key] = ratio(value, baseline.get("memory", {}).get(key))
+    return out
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    fake = FakeKolada(
+        n_kpis=args.kpis,
+        n_municipalities=args.municipalities,
+        latency=args.latency_ms / 1000.0,
+        jitter=args.jitter_ms / 1000.0,
+        error_rate=args.error_rate,
+    )
+    only = set(filter(None, args.tools.split(","))) if args.tools else set()
+    result: dict[str, Any] = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "kpis": args.kpis,
+            "municipalities": len(fake.municipalities),
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "years": args.years,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+        },
+        "startup": await bench_startup(fake, args.startup_repeat),
+        "tools": await bench_tools(fake, args.years, args.iterations, args.concurrency, only),
+        "codec": await bench_codec(fake, args.years, args.iterations),
+        "memory": await bench_memory(fake, args.years),
+    }
+    result["upstream"] = {
+        "requests": fake.requests,
+        "errors": fake.errors,
+        "bytes": fake.bytes_sent,
+    }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--kpis", type=int, default=6000)
+    parser.add_argument("--municipalities", type=int, default=290)
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="per upstream request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of 503 answers")
+    parser.add_argument("--years", default="2019,2020,2021,2022")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--startup-repeat", type=int, default=3)
+    parser.add_argument("--tools", default="", help="comma-separated subset of scenarios")
+    parser.add_argument("--output", default="", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", default="", help="baseline JSON to compare against")
+    args = parser.parse_args()
+
+    # Keep the server's stderr logging out of the way of the results.
+    stderr, sys.stderr = sys.stderr, open(os.devnull, "w")
+    try:
+        result = asyncio.run(run(args))
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            result["compared_to_baseline"] = compare(result, json.load(f))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+CacheKey = tuple[str, tuple[str, ...], tuple[str, ...]]
+
+# Seconds between deletions of expired entries from the disk store.
+DISK_PURGE_INTERVAL: float = 3600.0
+
+
+def make_data_key(
+    kpi_id: str, municipality_ids: list[str] | None, years: list[str] | None
+) -> CacheKey:
+    """
+    Normalizes a data request to (kpi, sorted municipality set, sorted years). An empty
+    municipality tuple means all municipalities, an empty year tuple means all years.
+    """
+    return (
+        kpi_id.strip(),
+        tuple(sorted({m.strip() for m in municipality_ids or [] if m.strip()})),
+        tuple(sorted({y.strip() for y in years or [] if y.strip()})),
+    )
+
+
+def _json_dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _encode_key(key: CacheKey) -> str:
+    kpi_id, municipality_ids, years = key
+    return f"{kpi_id}|{','.join(municipality_ids)}|{','.join(years)}"
+
+
+class _DiskStore:
+    """
+    SQLite table of encoded responses. With `max_bytes`, the oldest entries are deleted
+    whenever the bodies stored add up to more than that.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dumps: Callable[[Any], bytes] = _json_dumps,
+        loads: Callable[[bytes], Any] = json.loads,
+        max_bytes: int = 0,
+    ) -> None:
+        self._dumps = dumps
+        self._loads = loads
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, body BLOB NOT NULL)"
+        )
+        self._conn.commit()
+        self.evictions = 0
+        # Bytes stored, kept up to date by this process and recounted before evicting.
+        self.nbytes = self._count_bytes()
+
+    def _count_bytes(self) -> int:
+        cursor = self._conn.execute("SELECT COALESCE(SUM(length(body)), 0) FROM responses")
+        return int(cursor.fetchone()[0])
+
+    def get(self, key: str) -> tuple[float, Any] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stored_at, body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return row[0], self._loads(row[1])
+        except Exception as e:
+            # Corrupt, or written by an incompatible version: a miss, and gone.
+            print(f"[Kolada MCP Lite] Dropping unreadable cache entry {key}: {e}", file=sys.stderr)
+            self.delete(key)
+            return None
+
+    def put(self, key: str, stored_at: float, value: Any) -> None:
+        body = self._dumps(value)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT length(body) FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, stored_at, body) VALUES (?, ?, ?)",
+                (key, stored_at, body),
+            )
+            self.nbytes += len(body) - (old[0] if old is not None else 0)
+            if self.max_bytes > 0 and self.nbytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        # Other processes may share the file, so start from the actual total.
+        self.nbytes = self._count_bytes()
+        doomed: list[tuple[str]] = []
+        for key, size in self._conn.execute(
+            "SELECT key, length(body) FROM responses ORDER BY stored_at"
+        ):
+            if self.nbytes <= self.max_bytes:
+                break
+            doomed.append((key,))
+            self.nbytes -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+            self.nbytes = self._count_bytes()
+
+    def purge_older_than(self, cutoff: float) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE stored_at < ?", (cutoff,))
+            self._conn.commit()
+            self.nbytes = self._count_bytes()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache for upstream data responses. Concurrent misses for the same key
+    share a single upstream call. Cached values are shared between callers and must
+    not be mutated. `dumps` and `loads` convert values for the disk store (JSON by default),
+    which keeps at most `disk_max_bytes` of them (0 for no limit) and is purged of
+    expired entries every DISK_PURGE_INTERVAL seconds.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        disk_path: str = "",
+        dumps: Callable[[Any], bytes] = _json_dumps,
+        loads: Callable[[bytes], Any] = json.loads,
+        disk_max_bytes: int = 0,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[CacheKey, tuple[float, Any]] = OrderedDict()
+        self._inflight: dict[CacheKey, asyncio.Task[Any]] = {}
+        self._disk: _DiskStore | None = None
+        self._purged_at = 0.0
+        if disk_path:
+            try:
+                self._disk = _DiskStore(disk_path, dumps, loads, disk_max_bytes)
+                self._disk.purge_older_than(time.time() - ttl)
+                self._purged_at = time.time()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[Kolada MCP Lite] Disk cache disabled: {e}", file=sys.stderr)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: CacheKey, max_age: float | None = None) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        age = time.time() - stored_at
+        # Expired entries stay until evicted, as a fallback while Kolada is unavailable.
+        if age > self.ttl or (max_age is not None and age > max_age):
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def get_stale(self, key: CacheKey) -> Any | None:
+        """The last value stored for `key` in memory or on disk, however old."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry[1]
+        if self._disk is None:
+            return None
+        try:
+            found = await asyncio.to_thread(self._disk.get, _encode_key(key))
+        except sqlite3.Error:
+            return None
+        return found[1] if found is not None else None
+
+    def age(self, key: CacheKey) -> float | None:
+        """Seconds since `key` was stored in memory, or None if it is not cached."""
+        stored_at = self.stored_at(key)
+        return time.time() - stored_at if stored_at is not None else None
+
+    def stored_at(self, key: CacheKey) -> float | None:
+        """When `key` was stored in memory, or None if it is not cached."""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key: CacheKey, value: Any, stored_at: float | None = None) -> None:
+        self._entries[key] = (stored_at if stored_at is not None else time.time(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _disk_get(self, key: CacheKey, max_age: float) -> Any | None:
+        if self._disk is None:
+            return None
+        try:
+            found = await asyncio.to_thread(self._disk.get, _encode_key(key))
+        except sqlite3.Error:
+            return None
+        if found is None or time.time() - found[0] > min(self.ttl, max_age):
+            return None
+        self.put(key, found[1], stored_at=found[0])
+        return found[1]
+
+    async def _disk_put(self, key: CacheKey, value: Any) -> None:
+        if self._disk is None:
+            return
+        try:
+            await asyncio.to_thread(self._disk.put, _encode_key(key), time.time(), value)
+            if time.time() - self._purged_at > DISK_PURGE_INTERVAL:
+                self._purged_at = time.time()
+                await asyncio.to_thread(self._disk.purge_older_than, time.time() - self.ttl)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[Kolada MCP Lite] Could not persist cache entry: {e}", file=sys.stderr)
+
+    async def _load(
+        self,
+        key: CacheKey,
+        fetch: Callable[[], Awaitable[Any]],
+        max_age: float,
+    ) -> Any:
+        value = await self._disk_get(key, max_age)
+        if value is not None:
+            self.disk_hits += 1
+            return value
+        self.misses += 1
+        value = await fetch()
+        self.put(key, value)
+        await self._disk_put(key, value)
+        return value
+
+    def _finish(self, key: CacheKey, task: asyncio.Task[Any]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away.
+            task.exception()
+
+    async def get_or_fetch(
+        self,
+        key: CacheKey,
+        fetch: Callable[[], Awaitable[Any]],
+        max_age: float | None = None,
+    ) -> Any:
+        """
+        Returns the cached value for `key`, or awaits `fetch()` and caches its result.
+        Entries older than `max_age` seconds count as missing. The upstream call runs in
+        its own task so a cancelled caller does not cancel it for the others. Exceptions
+        propagate to every waiter and are not cached.
+        """
+        value = self.get(key, max_age)
+        if value is not None:
+            self.hits += 1
+            return value
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(
+                self._load(key, fetch, self.ttl if max_age is None else max_age)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "disk_bytes": self._disk.nbytes if self._disk is not None else None,
+            "disk_evictions": self._disk.evictions if self._disk is not None else None,
+            "in_flight": len(self._inflight),
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else None,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
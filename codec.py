@@ -0,0 +1,263 @@
+import json
+import sys
+import time
+from array import array
+from itertools import accumulate
+from typing import Any, Mapping, Sequence, cast
+
+from metrics import ENCODE_LATENCY
+
+try:
+    import msgspec  # type: ignore[import-not-found]
+except ImportError:  # Optional; the stdlib decoder produces the same objects.
+    msgspec = None
+
+# Kind of each stored value, so integers and nulls come back out as they went in.
+NULL, FLOAT, INT = 0, 1, 2
+
+_intern = sys.intern
+
+
+# The column attributes of a DataTable; a decoded table builds them on first access.
+_COLUMNS: frozenset[str] = frozenset(
+    ("kpi", "municipality", "period", "value_offsets", "gender", "value", "kind", "count", "status")
+)
+
+
+class DataTable:
+    """
+    A Kolada /data response held column-wise instead of as nested dicts. Each row is
+    (kpi, municipality, period) and owns the value entries value_offsets[i] to
+    value_offsets[i + 1]: gender, value (float64 plus a kind code), count and status.
+    Repeated strings are interned.
+
+    A table decoded from a response keeps the decoded items until its columns are first
+    accessed, so passing a response through (to_response, to_json) never walks its
+    individual values. Once built, the columns replace the items, which take several
+    times the memory. Tables built from columns keep only the fields above.
+    """
+
+    __slots__ = (*sorted(_COLUMNS), "_decoded", "_response")
+
+    def __init__(self) -> None:
+        self.kpi: list[str] = []
+        self.municipality: list[str] = []
+        self.period: list[int | str | None] = []
+        self.value_offsets = array("I", [0])
+        self.gender: list[str | None] = []
+        self.value = array("d")
+        self.kind = bytearray()
+        self.count: list[int | None] = []
+        self.status: list[str | None] = []
+        self._decoded: list[dict[str, Any]] | None = None
+        self._response: tuple[Mapping[str, Any], dict[str, Any]] | None = None
+
+    @classmethod
+    def from_items(cls, items: list[dict[str, Any]]) -> "DataTable":
+        """A table over decoded Kolada items, as checked by decode_data_page."""
+        table = cls.__new__(cls)
+        table._decoded = items
+        table._response = None
+        return table
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for unset slots, i.e. the columns of a decoded table.
+        if name not in _COLUMNS:
+            raise AttributeError(name)
+        self._build_columns()
+        return object.__getattribute__(self, name)
+
+    def __len__(self) -> int:
+        decoded = self._decoded
+        return len(decoded) if decoded is not None else len(self.kpi)
+
+    def _build_columns(self) -> None:
+        items = cast(list[dict[str, Any]], self._decoded)
+        entries = [
+            [e for e in row if type(e) is dict] if type(row) is list else []
+            for row in (item.get("values") for item in items)
+        ]
+        self.value_offsets = array("I", accumulate(map(len, entries), initial=0))
+        flat = [entry for row in entries for entry in row]
+        self.kpi = [_intern(str(item.get("kpi") or "")) for item in items]
+        self.municipality = [_intern(str(item.get("municipality") or "")) for item in items]
+        self.period = [
+            p if isinstance(p, (int, str)) else None for p in (item.get("period") for item in items)
+        ]
+        self.gender = [
+            _intern(g) if type(g) is str else None for g in (e.get("gender") for e in flat)
+        ]
+        values = [e.get("value") for e in flat]
+        kinds = [FLOAT if type(v) is float else _kind(v) for v in values]
+        self.kind = bytearray(kinds)
+        self.value = array(
+            "d",
+            [
+                v if type(v) is float else 0.0 if k == NULL else float(v)
+                for v, k in zip(values, kinds, strict=True)
+            ],
+        )
+        self.count = [c if type(c) is int else None for c in (e.get("count") for e in flat)]
+        self.status = [
+            _intern(s) if type(s) is str else None for s in (e.get("status") for e in flat)
+        ]
+        # Last, so that to_json on another thread sees either the items or all columns.
+        self._decoded = None
+
+    @classmethod
+    def concat(cls, tables: Sequence["DataTable"]) -> "DataTable":
+        if len(tables) == 1:
+            return tables[0]
+        if tables and all(t._decoded is not None for t in tables):
+            return cls.from_items([item for t in tables for item in cast(list, t._decoded)])
+        out = cls()
+        for t in tables:
+            base = out.value_offsets[-1]
+            out.kpi.extend(t.kpi)
+            out.municipality.extend(t.municipality)
+            out.period.extend(t.period)
+            out.value_offsets.extend(base + o for o in t.value_offsets[1:])
+            out.gender.extend(t.gender)
+            out.value.extend(t.value)
+            out.kind.extend(t.kind)
+            out.count.extend(t.count)
+            out.status.extend(t.status)
+        return out
+
+    def take(self, rows: Sequence[int]) -> "DataTable":
+        """A new table with the given rows, in the given order."""
+        out = DataTable()
+        offsets = self.value_offsets
+        for i in rows:
+            lo, hi = offsets[i], offsets[i + 1]
+            out.kpi.append(self.kpi[i])
+            out.municipality.append(self.municipality[i])
+            out.period.append(self.period[i])
+            out.gender.extend(self.gender[lo:hi])
+            out.value.extend(self.value[lo:hi])
+            out.kind.extend(self.kind[lo:hi])
+            out.count.extend(self.count[lo:hi])
+            out.status.extend(self.status[lo:hi])
+            out.value_offsets.append(len(out.value))
+        return out
+
+    def _items(self) -> list[dict[str, Any]]:
+        decoded = self._decoded
+        if decoded is not None:
+            return decoded
+        offsets = self.value_offsets
+        values = [
+            None if k == NULL else int(v) if k == INT else v
+            for v, k in zip(self.value, self.kind, strict=True)
+        ]
+        entries = [
+            {"gender": g, "count": c, "status": s, "value": v}
+            for g, c, s, v in zip(self.gender, self.count, self.status, values, strict=True)
+        ]
+        return [
+            {
+                "kpi": kpi,
+                "municipality": m,
+                "period": period,
+                "values": entries[offsets[i] : offsets[i + 1]],
+            }
+            for i, (kpi, m, period) in enumerate(
+                zip(self.kpi, self.municipality, self.period, strict=True)
+            )
+        ]
+
+    def to_response(self, names: Mapping[str, Mapping[str, Any]]) -> dict[str, Any]:
+        """
+        Kolada-style response with each item's municipality_name, as tools return it.
+        Kept for repeat calls with the same `names`; like cached tables, it must not be
+        mutated.
+        """
+        if self._response is not None and self._response[0] is names:
+            return self._response[1]
+        start = time.perf_counter()
+        titles: dict[str, str] = {}
+        items: list[dict[str, Any]] = []
+        for item in self._items():
+            m = item.get("municipality")
+            m = m if type(m) is str else str(m or "")
+            title = titles.get(m)
+            if title is None:
+                title = titles[m] = names.get(m, {}).get("title", f"Kommun {m}")
+            items.append({**item, "municipality_name": title})
+        response = {"count": len(items), "values": items}
+        ENCODE_LATENCY.observe(time.perf_counter() - start, kind="data_response")
+        self._response = (names, response)
+        return response
+
+    def to_json(self) -> bytes:
+        items = self._items()
+        return encode_json({"count": len(items), "values": items}, kind="data_table")
+
+
+def _kind(value: Any) -> int:
+    if type(value) is float:
+        return FLOAT
+    if value is None or isinstance(value, bool):
+        return NULL
+    if isinstance(value, int):
+        return INT
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return NULL
+    return FLOAT
+
+
+if msgspec is not None:
+    _JSON_DECODER = msgspec.json.Decoder()
+    _JSON_ENCODER = msgspec.json.Encoder()
+
+
+def decoder_name() -> str:
+    return "msgspec" if msgspec is not None else "json"
+
+
+def loads(raw: bytes) -> Any:
+    """Untyped JSON decoding, through msgspec when it is installed."""
+    if msgspec is not None:
+        try:
+            return _JSON_DECODER.decode(raw)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+    return json.loads(raw)
+
+
+def decode_data_page(raw: bytes) -> tuple[DataTable, str | None]:
+    """
+    Decodes one page of a Kolada /data response into a DataTable. Returns the table and
+    the next page URL. Raises ValueError on malformed input: anything but an object whose
+    "values" is a list of objects. Value entries are only checked when the columns are
+    built, which leaves out those that are not objects.
+    """
+    try:
+        data = loads(raw)
+    except ValueError as e:
+        raise ValueError(f"malformed Kolada data page: {e}") from e
+    if type(data) is not dict:
+        raise ValueError("malformed Kolada data page: expected an object")
+    items = data.get("values") or []
+    # Both decoders produce plain dicts and lists, so one check covers either.
+    if type(items) is not list or not all(type(item) is dict for item in items):
+        raise ValueError("malformed Kolada data page: expected a list of objects")
+    next_page = data.get("next_page")
+    return DataTable.from_items(items), next_page if isinstance(next_page, str) else None
+
+
+def decode_data_table(raw: bytes) -> DataTable:
+    return decode_data_page(raw)[0]
+
+
+def encode_json(obj: Any, kind: str = "json") -> bytes:
+    """Compact UTF-8 JSON, through msgspec when it is installed; timed per `kind`."""
+    start = time.perf_counter()
+    if msgspec is not None:
+        body = _JSON_ENCODER.encode(obj)
+    else:
+        body = json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    ENCODE_LATENCY.observe(time.perf_counter() - start, kind=kind)
+    return body
@@ -1,2 +1,131 @@
+import os
+
 BASE_URL: str = "https://api.kolada.se/v2"
 KPI_PER_PAGE: int = 5000
+
+CACHE_DIR: str = os.environ.get(
+    "KOLADA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kolada-mcp")
+)
+
+# Catalog snapshot used for warm startup. Set the path to an empty string to disable.
+CATALOG_SNAPSHOT_PATH: str = os.environ.get(
+    "KOLADA_CATALOG_SNAPSHOT", os.path.join(CACHE_DIR, "catalog.snapshot")
+)
+CATALOG_SNAPSHOT_MAX_AGE: float = float(
+    os.environ.get("KOLADA_CATALOG_SNAPSHOT_MAX_AGE", 7 * 24 * 3600)
+)
+
+# Seconds between background catalog refreshes, 0 to only revalidate a snapshot on startup.
+# Only KPIs whose title or description changed are re-indexed.
+CATALOG_REFRESH_INTERVAL: float = float(os.environ.get("KOLADA_CATALOG_REFRESH_INTERVAL", 6 * 3600))
+
+# Max number of KPI catalog pages fetched in parallel during bootstrap.
+CATALOG_FETCH_CONCURRENCY: int = int(os.environ.get("KOLADA_CATALOG_FETCH_CONCURRENCY", 4))
+
+# Shared upstream HTTP client.
+HTTP2_ENABLED: bool = os.environ.get("KOLADA_HTTP2", "0").lower() in ("1", "true", "yes")
+HTTP_MAX_CONNECTIONS: int = int(os.environ.get("KOLADA_HTTP_MAX_CONNECTIONS", 20))
+HTTP_MAX_KEEPALIVE_CONNECTIONS: int = int(os.environ.get("KOLADA_HTTP_MAX_KEEPALIVE", 10))
+HTTP_KEEPALIVE_EXPIRY: float = float(os.environ.get("KOLADA_HTTP_KEEPALIVE_EXPIRY", 60.0))
+HTTP_CONNECT_TIMEOUT: float = float(os.environ.get("KOLADA_HTTP_CONNECT_TIMEOUT", 10.0))
+CATALOG_REQUEST_TIMEOUT: float = float(os.environ.get("KOLADA_CATALOG_TIMEOUT", 180.0))
+DATA_REQUEST_TIMEOUT: float = float(os.environ.get("KOLADA_DATA_TIMEOUT", 180.0))
+
+# Upstream scheduling for every Kolada request: an AIMD concurrency limit, jittered
+# retries for idempotent requests, a circuit breaker and optional hedged requests.
+UPSTREAM_MIN_CONCURRENCY: int = int(os.environ.get("KOLADA_UPSTREAM_MIN_CONCURRENCY", 1))
+UPSTREAM_MAX_CONCURRENCY: int = int(
+    os.environ.get("KOLADA_UPSTREAM_MAX_CONCURRENCY", HTTP_MAX_CONNECTIONS)
+)
+UPSTREAM_INITIAL_CONCURRENCY: int = int(
+    os.environ.get("KOLADA_UPSTREAM_INITIAL_CONCURRENCY", 8)
+)
+# Multiplier applied to the concurrency limit when Kolada throttles or times out.
+UPSTREAM_CONCURRENCY_BACKOFF: float = float(
+    os.environ.get("KOLADA_UPSTREAM_CONCURRENCY_BACKOFF", 0.5)
+)
+UPSTREAM_RETRIES: int = int(os.environ.get("KOLADA_UPSTREAM_RETRIES", 3))
+UPSTREAM_RETRY_BASE_DELAY: float = float(os.environ.get("KOLADA_UPSTREAM_RETRY_BASE_DELAY", 0.5))
+UPSTREAM_RETRY_MAX_DELAY: float = float(os.environ.get("KOLADA_UPSTREAM_RETRY_MAX_DELAY", 10.0))
+# Consecutive failed attempts that open the circuit, and seconds before a trial request.
+CIRCUIT_FAILURE_THRESHOLD: int = int(os.environ.get("KOLADA_CIRCUIT_FAILURE_THRESHOLD", 5))
+CIRCUIT_RESET_TIMEOUT: float = float(os.environ.get("KOLADA_CIRCUIT_RESET_TIMEOUT", 30.0))
+# Seconds before a second copy of a slow GET is sent; 0 disables hedging.
+UPSTREAM_HEDGE_DELAY: float = float(os.environ.get("KOLADA_UPSTREAM_HEDGE_DELAY", 0))
+# Seconds one request may take with all its retries and backoff; 0 for no limit.
+UPSTREAM_DEADLINE: float = float(os.environ.get("KOLADA_UPSTREAM_DEADLINE", 240.0))
+
+# Response cache for /data/kpi requests. Set the disk path to persist entries across restarts;
+# the disk file is kept under its size limit (MiB, 0 for no limit) by dropping the oldest.
+DATA_CACHE_MAX_ENTRIES: int = int(os.environ.get("KOLADA_DATA_CACHE_MAX_ENTRIES", 512))
+DATA_CACHE_TTL: float = float(os.environ.get("KOLADA_DATA_CACHE_TTL", 24 * 3600))
+DATA_CACHE_DISK_PATH: str = os.environ.get("KOLADA_DATA_CACHE_DISK", "")
+DATA_CACHE_DISK_MAX_BYTES: int = (
+    int(os.environ.get("KOLADA_DATA_CACHE_DISK_MB", 1024)) * 1024 * 1024
+)
+
+# Local SQLite mirror of Kolada data, filled by `python server.py sync`. With local-first
+# reads on, data tools answer mirrored KPIs from it and only call Kolada for the rest.
+MIRROR_PATH: str = os.environ.get(
+    "KOLADA_MIRROR_PATH", os.path.join(CACHE_DIR, "mirror.sqlite3")
+)
+LOCAL_FIRST: bool = os.environ.get("KOLADA_LOCAL_FIRST", "1").lower() in ("1", "true", "yes")
+# Seconds after its last sync that a mirrored KPI is still read locally; 0 for no limit.
+MIRROR_MAX_AGE: float = float(os.environ.get("KOLADA_MIRROR_MAX_AGE", 30 * 24 * 3600))
+
+# Data fetch engine: municipality/year sets are split into chunks fetched in parallel.
+DATA_PER_PAGE: int = 5000
+DATA_MUNICIPALITY_CHUNK_SIZE: int = int(os.environ.get("KOLADA_DATA_MUNICIPALITY_CHUNK", 50))
+DATA_YEAR_CHUNK_SIZE: int = int(os.environ.get("KOLADA_DATA_YEAR_CHUNK", 10))
+DATA_FETCH_CONCURRENCY: int = int(os.environ.get("KOLADA_DATA_FETCH_CONCURRENCY", 8))
+
+# Memory budget for parsed KPI values held as NumPy arrays.
+VALUE_STORE_MEMORY_BUDGET: int = (
+    int(os.environ.get("KOLADA_VALUE_STORE_MB", 256)) * 1024 * 1024
+)
+
+# Group rollups (statistics per municipality group) kept for the most recently used KPIs.
+GROUP_ROLLUP_CACHE_SIZE: int = int(os.environ.get("KOLADA_GROUP_ROLLUP_CACHE", 256))
+
+# Nearest neighbours precomputed per KPI for the related-KPIs tool.
+RELATED_KPI_COUNT: int = int(os.environ.get("KOLADA_RELATED_KPIS", 20))
+
+# Request popularity tracking and background prefetch of the most requested data slices.
+# Set the path to an empty string to keep the hot set in memory only, and the interval
+# to 0 to disable prefetching.
+POPULARITY_PATH: str = os.environ.get(
+    "KOLADA_POPULARITY_PATH", os.path.join(CACHE_DIR, "popularity.json")
+)
+POPULARITY_HALF_LIFE: float = float(os.environ.get("KOLADA_POPULARITY_HALF_LIFE", 6 * 3600))
+PREFETCH_INTERVAL: float = float(os.environ.get("KOLADA_PREFETCH_INTERVAL", 300))
+PREFETCH_TOP_N: int = int(os.environ.get("KOLADA_PREFETCH_TOP_N", 20))
+PREFETCH_REQUEST_BUDGET: int = int(os.environ.get("KOLADA_PREFETCH_BUDGET", 40))
+
+# Prometheus metrics served next to the MCP endpoint. Set KOLADA_METRICS=0 to disable.
+METRICS_ENABLED: bool = os.environ.get("KOLADA_METRICS", "1").lower() in ("1", "true", "yes")
+METRICS_PATH: str = os.environ.get("KOLADA_METRICS_PATH", "/metrics")
+
+# Startup: the server accepts requests at once and loads the catalog in the background,
+# municipalities first. Tools wait up to KOLADA_STARTUP_WAIT seconds for the part they
+# need; a failed load is retried every KOLADA_STARTUP_RETRY_INTERVAL seconds.
+STARTUP_WAIT_TIMEOUT: float = float(os.environ.get("KOLADA_STARTUP_WAIT", 20))
+STARTUP_RETRY_INTERVAL: float = float(os.environ.get("KOLADA_STARTUP_RETRY_INTERVAL", 5))
+LIVENESS_PATH: str = os.environ.get("KOLADA_LIVENESS_PATH", "/healthz")
+READINESS_PATH: str = os.environ.get("KOLADA_READINESS_PATH", "/readyz")
+
+# Multi-worker mode. With more than one worker, the catalog and search index are built
+# once into a memory-mapped file that every worker process reads in place.
+WORKERS: int = int(os.environ.get("KOLADA_WORKERS", 1))
+SHARED_CATALOG: bool = WORKERS > 1 or (
+    os.environ.get("KOLADA_SHARED_CATALOG", "0").lower() in ("1", "true", "yes")
+)
+SHARED_CATALOG_PATH: str = os.environ.get(
+    "KOLADA_SHARED_CATALOG_PATH", os.path.join(CACHE_DIR, "catalog.map")
+)
+# Workers check the file this often; one of them refetches once it is older than the refresh age.
+SHARED_CATALOG_CHECK_INTERVAL: float = float(
+    os.environ.get("KOLADA_SHARED_CATALOG_CHECK_INTERVAL", 30)
+)
+SHARED_CATALOG_REFRESH_AGE: float = float(
+    os.environ.get("KOLADA_SHARED_CATALOG_REFRESH_AGE", 24 * 3600)
+)
@@ -11,16 +11,28 @@ def kolada_entry_point() -> str:
         "**Available Tools & Common Use Cases:**\n\n"
         "1.  **`list_operating_areas()`:**\n"
         "    *   **Use When:** The user asks for the general *categories* or *themes* of data available.\n"
-        "2.  **`get_kpis_by_operating_area(operating_area: str)`:**\n"
-        "    *   **Use When:** The user wants to see *all KPIs within a specific category*.\n"
+        "2.  **`get_kpis_by_operating_area(operating_area: str, fields: str = \"id,title\", limit: int = 100, cursor: str | None = None)`:**\n"
+        "    *   **Use When:** The user wants to see *all KPIs within a specific category*. Results are paginated; pass `next_cursor` back as `cursor` for more, and `fields=\"all\"` for full records.\n"
         "3.  **`search_kpis(keyword: str, limit: int = 20)`:**\n"
-        "    *   **Use When:** The user is looking for KPIs related to a *specific topic or keyword*.\n"
+        "    *   **Use When:** The user is looking for KPIs related to a *specific topic or keyword*. To find more KPIs like one you already have, use `find_related_kpis(kpi_id: str = \"\", text: str = \"\", limit: int = 10)` instead of trying more keywords.\n"
         "4.  **`get_kpi_metadata(kpi_id: str)`:**\n"
         "    *   **Use When:** You have identified a *specific KPI ID* and need its *detailed description*.\n"
         "5.  **`fetch_kolada_data(kpi_id: str, municipality_id: str, year: str | None = None)`:**\n"
-        "    *   **Use When:** The user wants the *actual data value(s)* for a *specific KPI* in a *specific municipality*.\n"
+        "    *   **Use When:** The user wants the *actual data value(s)* for a *specific KPI* in a *specific municipality*. For several KPIs at once (e.g. a dashboard), use `fetch_kolada_data_bulk(kpi_ids: str, municipality_ids: str, year: str | None = None)` instead.\n"
         "6.  **`analyze_kpi_across_municipalities(...)`:**\n"
-        "    *   **Use When:** The user wants to *compare municipalities* for a *specific KPI* (supports multi-year analysis).\n\n"
+        "    *   **Use When:** The user wants to *compare municipalities* for a *specific KPI* (supports multi-year analysis).\n"
+        "7.  **`analyze_multiple_kpis(kpi_ids: str, year: str, ...)`:**\n"
+        "    *   **Use When:** The same ranking is needed for *several KPIs* (comma-separated IDs) at once.\n"
+        "8.  **`analyze_kpi_trends(kpi_ids: str, year: str = \"\", sort_by: str = \"slope\", ...)`:**\n"
+        "    *   **Use When:** The user asks which municipalities *improved or declined fastest* over several years. Ranks by least-squares `slope`, `cagr`, `volatility` or `trend_breaks`; gaps between years are handled. An empty `year` uses every year with data.\n"
+        "9.  **`correlate_kpis(kpi_ids: str, year: str, target_kpi_id: str | None = None, method: str = \"pearson\", ...)`:**\n"
+        "    *   **Use When:** The user asks which KPIs *move together*. Correlates a target KPI with each listed KPI, or all listed KPIs pairwise, strongest first.\n"
+        "10. **`list_municipality_groups(search: str = \"\", limit: int = 100)`:**\n"
+        "    *   **Use When:** You need the ID of a *municipality group*, such as a county or a comparison group of similar municipalities.\n"
+        "11. **`analyze_kpi_by_municipality_group(kpi_id: str, year: str = \"\", group_ids: str = \"\", weight_kpi_id: str | None = None, ...)`:**\n"
+        "    *   **Use When:** The user wants a KPI *summarized per group of municipalities* (mean, median, quartiles, spread), e.g. by county. Pass a population KPI as `weight_kpi_id` for population-weighted means.\n"
+        "12. **`filter_municipalities_by_kpi(kpi_id: str, cutoff: float, operator: str = \"above\", year: str | None = None, ...)`:**\n"
+        "    *   **Use When:** The user wants municipalities *meeting a condition*. Operators: `above`, `below`, `between` (with `upper`), `top_percent`, `bottom_percent`. Pass `conditions=[{\"kpi_id\": ..., \"operator\": ..., \"cutoff\": ...}, ...]` with `combine=\"and\"|\"or\"` to combine KPIs.\n\n"
         "**General Strategy & Workflow:**\n\n"
         "1. Understand the user's goal.\n"
         "2. If you need a KPI ID, find it (via `get_kpis_by_operating_area` or `search_kpis`).\n"
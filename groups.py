@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from typing import Any, Iterable, Mapping
+
+import numpy as np
+
+from analysis import group_stats
+from store import KpiFrame
+
+
+class GroupIndex:
+    """
+    Kolada municipality groups (counties, peer groups and the like) over the value
+    store's rows: group -> member IDs, and a boolean (group, row) membership matrix so
+    statistics for every group come out of one pass over a KPI's values. Rollups are
+    kept per KPI, gender, periods and weighting KPI, least recently used first out, and
+    reused while the store holds the same frames.
+    """
+
+    def __init__(
+        self,
+        groups: Iterable[Mapping[str, Any]],
+        row_index: Mapping[str, int],
+        cache_size: int,
+    ) -> None:
+        self.groups: list[Mapping[str, Any]] = [g for g in groups if g.get("id")]
+        self.ids: list[str] = [g["id"] for g in self.groups]
+        self.position: dict[str, int] = {gid: i for i, gid in enumerate(self.ids)}
+        self.members: dict[str, list[str]] = {
+            g["id"]: list(g.get("members") or []) for g in self.groups
+        }
+        self.membership = np.zeros((len(self.groups), len(row_index)), dtype=bool)
+        for i, gid in enumerate(self.ids):
+            rows = [row_index[m] for m in self.members[gid] if m in row_index]
+            self.membership[i, rows] = True
+        self.cache_size = cache_size
+        self._rollups: OrderedDict[tuple[Any, ...], tuple[Any, ...]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def rollup(
+        self,
+        frame: KpiFrame,
+        gender: str,
+        positions: list[int],
+        weights: KpiFrame | None = None,
+        weight_positions: list[int] | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        group_stats over each municipality's latest value among the period `positions`,
+        for every group. `weights` gives each municipality's latest weighting value (e.g.
+        population) of the same gender among `weight_positions`.
+        """
+        key = (
+            frame.kpi_id,
+            gender,
+            tuple(positions),
+            weights.kpi_id if weights is not None else None,
+            tuple(weight_positions or ()),
+        )
+        cached = self._rollups.get(key)
+        if cached is not None and cached[0] is frame and cached[1] is weights:
+            self._rollups.move_to_end(key)
+            self.hits += 1
+            return cached[2]
+        self.misses += 1
+        rows = np.arange(self.membership.shape[1])
+        values, _ = frame.latest(gender, rows, positions)
+        weight_values = None
+        if weights is not None:
+            weight_values, _ = weights.latest(gender, rows, weight_positions)
+        stats = group_stats(self.membership, values, weight_values)
+        if self.cache_size > 0:
+            self._rollups[key] = (frame, weights, stats)
+            self._rollups.move_to_end(key)
+            while len(self._rollups) > self.cache_size:
+                self._rollups.popitem(last=False)
+        return stats
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "groups": len(self.groups),
+            "cached_rollups": len(self._rollups),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
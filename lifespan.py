@@ -1,11 +1,72 @@
+import asyncio
 import sys
-from contextlib import asynccontextmanager
-from typing import Any, AsyncIterator, TypedDict, Required, cast
+import time
+from contextlib import asynccontextmanager, suppress
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Mapping,
+    Required,
+    Sequence,
+    TypedDict,
+    TypeVar,
+    cast,
+)
 
 import httpx
 from mcp.server.fastmcp import FastMCP
 
-from config import BASE_URL, KPI_PER_PAGE
+from config import (
+    BASE_URL,
+    CATALOG_FETCH_CONCURRENCY,
+    CATALOG_REFRESH_INTERVAL,
+    CATALOG_REQUEST_TIMEOUT,
+    CATALOG_SNAPSHOT_MAX_AGE,
+    CATALOG_SNAPSHOT_PATH,
+    DATA_CACHE_DISK_MAX_BYTES,
+    DATA_CACHE_DISK_PATH,
+    DATA_CACHE_MAX_ENTRIES,
+    DATA_CACHE_TTL,
+    GROUP_ROLLUP_CACHE_SIZE,
+    KPI_PER_PAGE,
+    LOCAL_FIRST,
+    MIRROR_MAX_AGE,
+    MIRROR_PATH,
+    POPULARITY_HALF_LIFE,
+    POPULARITY_PATH,
+    PREFETCH_INTERVAL,
+    PREFETCH_REQUEST_BUDGET,
+    PREFETCH_TOP_N,
+    RELATED_KPI_COUNT,
+    SHARED_CATALOG,
+    SHARED_CATALOG_CHECK_INTERVAL,
+    SHARED_CATALOG_PATH,
+    SHARED_CATALOG_REFRESH_AGE,
+    STARTUP_RETRY_INTERVAL,
+    VALUE_STORE_MEMORY_BUDGET,
+)
+from cache import ResponseCache
+from codec import DataTable, decode_data_table
+from groups import GroupIndex
+from metrics import CATALOG_CHANGES, CATALOG_REFRESHES, REGISTRY, Family
+from mirror import DataMirror, open_local_mirror
+from popularity import PopularityTracker, run_prefetcher
+from records import RecordTable, as_dict
+from related import RelatedKpis
+from search import SEARCH_FIELDS, SearchIndex, SearchIndexBuilder
+from shared_catalog import (
+    LOCK_POLL_INTERVAL,
+    CatalogMap,
+    CatalogMapError,
+    FileLock,
+    file_identity,
+    write_catalog_map,
+)
+from snapshot import SnapshotError, load_snapshot, try_save_snapshot
+from store import ValueStore
+from upstream import create_http_client, decode_json
 
 
 class Kpi(TypedDict, total=False):
@@ -21,64 +82,369 @@ class Municipality(TypedDict, total=False):
     type: str
 
 
-class LifespanContext(TypedDict):
-    kpi_cache: list[Kpi]
-    kpi_map: dict[str, Kpi]
+class MunicipalityGroup(TypedDict, total=False):
+    id: Required[str]
+    title: str
+    # Member municipality IDs.
+    members: list[str]
+
+
+# Catalog parts loaded in the background on a cold start, in order, with their names in
+# messages.
+STARTUP_RESOURCES: dict[str, str] = {
+    "municipalities": "municipality list",
+    "catalog": "KPI catalog",
+}
+
+
+class Readiness:
+    """
+    Startup progress of the catalog parts in STARTUP_RESOURCES. Tools await the part
+    they need, and the readiness endpoint reports all of them. A part only ever goes
+    from loading to ready; refreshes later swap in complete catalogs.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self._events = {resource: asyncio.Event() for resource in STARTUP_RESOURCES}
+        # Seconds from start until each part was ready.
+        self.ready_after: dict[str, float] = {}
+        # Last load error of parts still loading.
+        self.errors: dict[str, str] = {}
+        # Counters of the load in progress, e.g. KPI pages fetched.
+        self.progress: dict[str, int] = {}
+
+    def set_ready(self, *resources: str) -> None:
+        for resource in resources or tuple(STARTUP_RESOURCES):
+            if not self._events[resource].is_set():
+                self.ready_after[resource] = time.time() - self.started_at
+                self.errors.pop(resource, None)
+                self._events[resource].set()
+
+    def is_ready(self, resource: str | None = None) -> bool:
+        if resource is None:
+            return all(event.is_set() for event in self._events.values())
+        return self._events[resource].is_set()
+
+    async def wait(self, resource: str, timeout: float | None = None) -> bool:
+        """Waits until `resource` is ready; False if `timeout` seconds pass first."""
+        try:
+            await asyncio.wait_for(self._events[resource].wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def status(self) -> dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "resources": {
+                resource: {
+                    "ready": self.is_ready(resource),
+                    "ready_after_seconds": self.ready_after.get(resource),
+                    "error": self.errors.get(resource),
+                }
+                for resource in STARTUP_RESOURCES
+            },
+            "progress": dict(self.progress),
+        }
+
+
+class ServerServices(TypedDict):
+    http_client: httpx.AsyncClient
+    data_cache: ResponseCache
+    popularity: PopularityTracker
+    # Local data mirror for local-first reads, when one has been synced.
+    mirror: DataMirror | None
+    readiness: Readiness
+
+
+class LifespanContext(ServerServices):
+    # A compact RecordTable in memory, or views into the shared catalog file.
+    kpi_cache: Sequence[Kpi]
+    kpi_map: Mapping[str, Kpi]
     municipality_cache: list[Municipality]
     municipality_map: dict[str, Municipality]
+    municipality_groups: list[MunicipalityGroup]
+    group_index: GroupIndex
     operating_areas_summary: list[dict[str, str | int]]
-    simple_search_index: list[dict[str, str]]
+    operating_area_index: dict[str, list[str]]
+    search_index: SearchIndex
+    related_kpis: RelatedKpis
+    value_store: ValueStore
+    catalog_updated_at: float
+    bootstrap_timings: dict[str, float]
+    # KPIs added, removed and changed by the last refresh; empty after a cold start.
+    catalog_diff: dict[str, int]
 
 
-def get_operating_areas_summary(kpis: list[Kpi]) -> list[dict[str, str | int]]:
-    grouped: dict[str, list[Kpi]] = {}
-    for kpi in kpis:
-        areas = [a.strip() for a in (kpi.get("operating_area", "")).split(",")]
-        for area in areas:
-            if not area:
-                continue
-            grouped.setdefault(area, []).append(kpi)
+def normalize_operating_area(area: str) -> str:
+    return area.strip().lower()
+
+
+def add_to_operating_area_groups(grouped: dict[str, list[str]], kpi: Kpi) -> None:
+    for area in (kpi.get("operating_area") or "").split(","):
+        area = area.strip()
+        if area:
+            grouped.setdefault(area, []).append(kpi["id"])
+
+
+def summarize_operating_areas(grouped: dict[str, list[str]]) -> list[dict[str, str | int]]:
     return [
-        {"operating_area": area, "kpi_count": len(items)}
-        for area, items in sorted(grouped.items())
+        {"operating_area": area, "kpi_count": len(items)} for area, items in sorted(grouped.items())
     ]
 
 
-@asynccontextmanager
-async def app_lifespan(server: FastMCP) -> AsyncIterator[LifespanContext]:
-    print("[Kolada MCP Lite] Starting lifespan setup...", file=sys.stderr)
+def index_operating_areas(grouped: dict[str, list[str]]) -> dict[str, list[str]]:
+    # Areas that only differ in case share one entry; KPI IDs are kept sorted.
+    index: dict[str, list[str]] = {}
+    for area, kpi_ids in grouped.items():
+        index.setdefault(normalize_operating_area(area), []).extend(kpi_ids)
+    return {area: sorted(set(kpi_ids)) for area, kpi_ids in index.items()}
+
+
+def group_operating_areas(kpis: list[Kpi]) -> dict[str, list[str]]:
+    grouped: dict[str, list[str]] = {}
+    for kpi in kpis:
+        if kpi.get("id"):
+            add_to_operating_area_groups(grouped, kpi)
+    return grouped
+
+
+def get_operating_areas_summary(kpis: list[Kpi]) -> list[dict[str, str | int]]:
+    return summarize_operating_areas(group_operating_areas(kpis))
+
+
+class CatalogBuilder:
+    """
+    Indexes KPI pages as they arrive so that no extra passes over the full catalog
+    are needed once the last page is in. Pages may be added in any order. With a
+    `previous` catalog, KPIs whose title and description are unchanged take their
+    search terms from its index instead of being tokenized again.
+    """
+
+    def __init__(self, previous: LifespanContext | None = None) -> None:
+        self.pages: dict[int, list[Kpi]] = {}
+        self.area_groups: dict[str, list[str]] = {}
+        self.search = SearchIndexBuilder(previous["search_index"] if previous else None)
+        self.previous_map: Mapping[str, Kpi] | None = previous["kpi_map"] if previous else None
+        # Differences from the previous catalog, by KPI ID.
+        self.diff: dict[str, int] = {"added": 0, "removed": 0, "changed": 0}
+        self._matched = 0
+        self.reindexed = 0
+        self.index_seconds: float = 0.0
+
+    def add_page(self, page_no: int, kpis: list[Kpi]) -> None:
+        started = time.perf_counter()
+        for k in kpis:
+            kid = k.get("id")
+            if not kid:
+                continue
+            reuse = False
+            if self.previous_map is not None:
+                old = self.previous_map.get(kid)
+                if old is None:
+                    self.diff["added"] += 1
+                else:
+                    old_kpi = as_dict(old)
+                    self._matched += 1
+                    self.diff["changed"] += old_kpi != k
+                    reuse = all(old_kpi.get(f) == k.get(f) for f in SEARCH_FIELDS)
+            if not (reuse and self.search.reuse(kid)):
+                self.search.add(k)
+                self.reindexed += 1
+            add_to_operating_area_groups(self.area_groups, k)
+        self.pages[page_no] = kpis
+        self.index_seconds += time.perf_counter() - started
+
+    def kpi_list(self) -> list[Kpi]:
+        return [k for page_no in sorted(self.pages) for k in self.pages[page_no]]
+
+    def finish_diff(self) -> dict[str, int]:
+        if self.previous_map is not None:
+            self.diff["removed"] = max(0, len(self.previous_map) - self._matched)
+        return self.diff
+
 
-    kpi_list: list[Kpi] = []
-    municipality_list: list[Municipality] = []
+async def _get_json(client: httpx.AsyncClient, url: str) -> dict[str, Any]:
+    print(f"[Kolada MCP Lite] Fetching: {url}", file=sys.stderr)
+    resp = await client.get(url, timeout=CATALOG_REQUEST_TIMEOUT)
+    resp.raise_for_status()
+    return decode_json(resp)
 
-    async with httpx.AsyncClient() as client:
-        next_url: str | None = f"{BASE_URL}/kpi?per_page={KPI_PER_PAGE}"
+
+async def _fetch_municipalities(
+    client: httpx.AsyncClient, timings: dict[str, float]
+) -> list[Municipality]:
+    started = time.perf_counter()
+    mun_data = await _get_json(client, f"{BASE_URL}/municipality")
+    timings["municipalities"] = time.perf_counter() - started
+    return cast(list[Municipality], mun_data.get("values", []))
+
+
+async def _fetch_municipality_groups(
+    client: httpx.AsyncClient, timings: dict[str, float]
+) -> list[MunicipalityGroup]:
+    # Groups only serve the group rollups, so the catalog loads without them on failure.
+    started = time.perf_counter()
+    groups: list[MunicipalityGroup] = []
+    next_url: str | None = f"{BASE_URL}/municipality_groups"
+    try:
+        while next_url:
+            data = await _get_json(client, next_url)
+            for g in data.get("values", []):
+                if not isinstance(g, dict) or not g.get("id"):
+                    continue
+                members = [
+                    m.get("id") if isinstance(m, dict) else m for m in g.get("members") or []
+                ]
+                groups.append(
+                    {
+                        "id": g["id"],
+                        "title": g.get("title") or "",
+                        "members": [m for m in members if isinstance(m, str) and m],
+                    }
+                )
+            next_url = data.get("next_page")
+    except (httpx.HTTPError, ValueError) as e:
+        print(f"[Kolada MCP Lite] Could not fetch municipality groups: {e}", file=sys.stderr)
+        return []
+    timings["municipality_groups"] = time.perf_counter() - started
+    return groups
+
+
+async def fetch_municipalities(
+    client: httpx.AsyncClient, timings: dict[str, float]
+) -> tuple[list[Municipality], list[MunicipalityGroup]]:
+    municipality_list, municipality_groups = await asyncio.gather(
+        _fetch_municipalities(client, timings), _fetch_municipality_groups(client, timings)
+    )
+    return municipality_list, municipality_groups
+
+
+async def _fetch_kpis(
+    client: httpx.AsyncClient,
+    builder: CatalogBuilder,
+    timings: dict[str, float],
+    progress: dict[str, int] | None = None,
+) -> None:
+    if progress is None:
+        progress = {}
+    started = time.perf_counter()
+    first_url = f"{BASE_URL}/kpi?per_page={KPI_PER_PAGE}"
+    first = await _get_json(client, first_url)
+    builder.add_page(1, cast(list[Kpi], first.get("values", [])))
+    timings["kpi_first_page"] = time.perf_counter() - started
+    progress["kpi_pages_loaded"] = 1
+
+    total = first.get("count")
+    if isinstance(total, int):
+        page_count = max(1, -(-total // KPI_PER_PAGE))
+        progress["kpi_pages_total"] = page_count
+        semaphore = asyncio.Semaphore(CATALOG_FETCH_CONCURRENCY)
+
+        async def _fetch_page(page_no: int) -> None:
+            async with semaphore:
+                data = await _get_json(client, f"{first_url}&page={page_no}")
+            builder.add_page(page_no, cast(list[Kpi], data.get("values", [])))
+            progress["kpi_pages_loaded"] += 1
+
+        await asyncio.gather(*(_fetch_page(p) for p in range(2, page_count + 1)))
+    else:
+        # Without a total count the page URLs cannot be computed up front.
+        next_url: str | None = first.get("next_page")
+        page_no = 1
         while next_url:
-            print(f"[Kolada MCP Lite] Fetching page: {next_url}", file=sys.stderr)
-            resp = await client.get(next_url, timeout=180.0)
-            resp.raise_for_status()
-            data: dict[str, Any] = resp.json()
-            kpi_list.extend(cast(list[Kpi], data.get("values", [])))
+            page_no += 1
+            data = await _get_json(client, next_url)
+            builder.add_page(page_no, cast(list[Kpi], data.get("values", [])))
+            progress["kpi_pages_loaded"] += 1
             next_url = data.get("next_page")
+    timings["kpi_pages"] = time.perf_counter() - started
+
 
+async def fetch_catalog(
+    services: ServerServices,
+    previous: LifespanContext | None = None,
+    municipalities: tuple[list[Municipality], list[MunicipalityGroup]] | None = None,
+    progress: dict[str, int] | None = None,
+) -> LifespanContext:
+    """
+    Fetches and indexes the catalog. Pass the `previous` catalog on a refresh to
+    re-index only the KPIs that changed since, and already fetched `municipalities`
+    (list and groups) to only fetch the KPIs. `progress` is updated with KPI pages.
+    """
+    started = time.perf_counter()
+    timings: dict[str, float] = {}
+    builder = CatalogBuilder(previous)
+    client = services["http_client"]
+
+    if municipalities is None:
+        (municipality_list, municipality_groups), _ = await asyncio.gather(
+            fetch_municipalities(client, timings), _fetch_kpis(client, builder, timings, progress)
+        )
+    else:
+        municipality_list, municipality_groups = municipalities
+        await _fetch_kpis(client, builder, timings, progress)
+
+    kpi_list = builder.kpi_list()
     print(
         f"[Kolada MCP Lite] Fetched {len(kpi_list)} total KPIs from Kolada.",
         file=sys.stderr,
     )
+    timings["index"] = builder.index_seconds
+    # Packing the index and the neighbour lists is CPU-bound work over data no one else
+    # holds yet, so it runs in a thread and leaves the event loop to serve tool calls.
+    search_index = await asyncio.to_thread(builder.search.build)
+    related_started = time.perf_counter()
+    related_kpis = await asyncio.to_thread(RelatedKpis.build, search_index, RELATED_KPI_COUNT)
+    timings["related"] = time.perf_counter() - related_started
+    ctx = build_context(
+        kpi_list,
+        municipality_list,
+        services,
+        time.time(),
+        municipality_groups=municipality_groups,
+        operating_areas_summary=summarize_operating_areas(builder.area_groups),
+        operating_area_index=index_operating_areas(builder.area_groups),
+        search_index=search_index,
+        related_kpis=related_kpis,
+    )
+    timings["total"] = time.perf_counter() - started
+    ctx["bootstrap_timings"] = timings
+    print(
+        "[Kolada MCP Lite] Bootstrap timings: "
+        + ", ".join(f"{phase}={seconds * 1000:.0f}ms" for phase, seconds in timings.items()),
+        file=sys.stderr,
+    )
+    if previous is not None:
+        ctx["catalog_diff"] = builder.finish_diff()
+        print(
+            f"[Kolada MCP Lite] Re-indexed {builder.reindexed} of {len(kpi_list)} KPIs.",
+            file=sys.stderr,
+        )
+    return ctx
 
-    async with httpx.AsyncClient() as client:
-        muni_url = f"{BASE_URL}/municipality"
-        print(f"[Kolada MCP Lite] Fetching municipalities: {muni_url}", file=sys.stderr)
-        resp = await client.get(muni_url, timeout=180.0)
-        resp.raise_for_status()
-        mun_data: dict[str, Any] = resp.json()
-        municipality_list = cast(list[Municipality], mun_data.get("values", []))
 
-    kpi_map: dict[str, Kpi] = {}
-    for k in kpi_list:
-        kid = k.get("id")
-        if kid:
-            kpi_map[kid] = k
+def build_context(
+    kpi_list: Sequence[Kpi],
+    municipality_list: list[Municipality],
+    services: ServerServices,
+    catalog_updated_at: float,
+    kpi_map: Mapping[str, Kpi] | None = None,
+    municipality_groups: list[MunicipalityGroup] | None = None,
+    operating_areas_summary: list[dict[str, str | int]] | None = None,
+    operating_area_index: dict[str, list[str]] | None = None,
+    search_index: SearchIndex | None = None,
+    related_kpis: RelatedKpis | None = None,
+) -> LifespanContext:
+    # Decoded KPIs are packed into a record table, since the context keeps them for the
+    # life of the process; kpi_map is a view over the same table. Municipalities are few
+    # and looked up per row by the analysis tools, so they stay plain dicts.
+    if isinstance(kpi_list, list):
+        kpi_list = cast(Sequence[Kpi], RecordTable(kpi_list))
+    if kpi_map is None:
+        kpi_map = cast(Mapping[str, Kpi], cast(RecordTable, kpi_list).by_id())
 
     municipality_map: dict[str, Municipality] = {}
     for m in municipality_list:
@@ -86,34 +452,568 @@ async def app_lifespan(server: FastMCP) -> AsyncIterator[LifespanContext]:
         if mid:
             municipality_map[mid] = m
 
-    operating_areas_summary = get_operating_areas_summary(kpi_list)
-
-    simple_index = []
-    for k in kpi_list:
-        kid = k.get("id")
-        if not kid:
-            continue
-        simple_index.append(
-            {
-                "id": kid,
-                "title_lc": (k.get("title") or "").lower(),
-                "desc_lc": (k.get("description") or "").lower(),
-            }
-        )
+    if operating_areas_summary is None or operating_area_index is None:
+        grouped = group_operating_areas(kpi_list)
+        operating_areas_summary = summarize_operating_areas(grouped)
+        operating_area_index = index_operating_areas(grouped)
+    if search_index is None:
+        search_index = SearchIndex.build(kpi_list)
+    if related_kpis is None:
+        related_kpis = RelatedKpis.build(search_index, RELATED_KPI_COUNT)
+    municipality_groups = municipality_groups or []
+    value_store = ValueStore(municipality_map, VALUE_STORE_MEMORY_BUDGET)
 
-    ctx: LifespanContext = {
+    return {
+        **services,
         "kpi_cache": kpi_list,
         "kpi_map": kpi_map,
         "municipality_cache": municipality_list,
         "municipality_map": municipality_map,
+        "municipality_groups": municipality_groups,
+        "group_index": GroupIndex(
+            municipality_groups, value_store.row_index, GROUP_ROLLUP_CACHE_SIZE
+        ),
         "operating_areas_summary": operating_areas_summary,
-        "simple_search_index": simple_index,
+        "operating_area_index": operating_area_index,
+        "search_index": search_index,
+        "related_kpis": related_kpis,
+        # Parsed values are laid out by municipality row, so they follow the catalog.
+        "value_store": value_store,
+        "catalog_updated_at": catalog_updated_at,
+        "bootstrap_timings": {},
+        "catalog_diff": {},
     }
 
-    print("[Kolada MCP Lite] Initialization complete.", file=sys.stderr)
+
+def snapshot_sections(ctx: LifespanContext) -> dict[str, Any]:
+    # kpi_map and municipality_map are cheap to rebuild and would only duplicate records.
+    return {
+        "kpi_cache": cast(RecordTable, ctx["kpi_cache"]).to_sections(),
+        "municipality_cache": ctx["municipality_cache"],
+        "municipality_groups": ctx["municipality_groups"],
+        "operating_areas_summary": ctx["operating_areas_summary"],
+        "operating_area_index": ctx["operating_area_index"],
+        "search_index": ctx["search_index"].to_sections(),
+        "related_kpis": ctx["related_kpis"].to_sections(),
+    }
+
+
+def context_from_snapshot(
+    sections: dict[str, Any], services: ServerServices, created_at: float
+) -> LifespanContext:
+    search_index = SearchIndex.from_sections(sections["search_index"])
+    return build_context(
+        cast(Sequence[Kpi], RecordTable.from_sections(sections["kpi_cache"])),
+        cast(list[Municipality], sections["municipality_cache"]),
+        services,
+        created_at,
+        municipality_groups=sections["municipality_groups"],
+        operating_areas_summary=sections["operating_areas_summary"],
+        operating_area_index=sections["operating_area_index"],
+        search_index=search_index,
+        related_kpis=RelatedKpis.from_sections(sections["related_kpis"], search_index),
+    )
+
+
+def load_context_snapshot(services: ServerServices) -> LifespanContext | None:
+    if not CATALOG_SNAPSHOT_PATH:
+        return None
+    started = time.perf_counter()
     try:
+        sections, created_at = load_snapshot(CATALOG_SNAPSHOT_PATH, CATALOG_SNAPSHOT_MAX_AGE)
+        ctx = context_from_snapshot(sections, services, created_at)
+    except SnapshotError as e:
+        print(f"[Kolada MCP Lite] Ignoring catalog snapshot: {e}", file=sys.stderr)
+        return None
+    except (KeyError, TypeError, AttributeError) as e:
+        print(f"[Kolada MCP Lite] Ignoring malformed catalog snapshot: {e!r}", file=sys.stderr)
+        return None
+    print(
+        f"[Kolada MCP Lite] Loaded catalog snapshot ({len(ctx['kpi_cache'])} KPIs, "
+        f"{len(ctx['municipality_cache'])} municipalities) in "
+        f"{(time.perf_counter() - started) * 1000:.1f} ms.",
+        file=sys.stderr,
+    )
+    return ctx
+
+
+def swap_catalog(ctx: LifespanContext, fresh: LifespanContext) -> None:
+    """
+    Replaces the catalog in the shared context with `fresh` in one step. Nothing is
+    awaited in between, so no coroutine sees a mix of the two; tool calls copy the
+    context when they start and keep the catalog they started with. Parsed values are
+    kept when the municipality rows they are laid out by did not change.
+    """
+    if fresh["value_store"].municipality_ids == ctx["value_store"].municipality_ids:
+        # The fresh group index was built over the same rows, so it fits the kept store.
+        fresh["value_store"] = ctx["value_store"]
+    ctx.update(fresh)
+
+
+async def revalidate_catalog(ctx: LifespanContext) -> None:
+    print("[Kolada MCP Lite] Refreshing catalog in background...", file=sys.stderr)
+    previous = cast(LifespanContext, dict(ctx))
+    try:
+        fresh = await fetch_catalog(ctx, previous)
+    except (httpx.HTTPError, ValueError) as e:
+        CATALOG_REFRESHES.inc(result="failed")
+        print(f"[Kolada MCP Lite] Background catalog refresh failed: {e}", file=sys.stderr)
+        return
+    diff = fresh.get("catalog_diff", {})
+    for change, n in diff.items():
+        CATALOG_CHANGES.inc(n, change=change)
+    swap_catalog(ctx, fresh)
+    CATALOG_REFRESHES.inc(result="ok")
+    try_save_snapshot(CATALOG_SNAPSHOT_PATH, snapshot_sections(ctx), ctx["catalog_updated_at"])
+    print(
+        "[Kolada MCP Lite] Catalog refreshed: "
+        + ", ".join(f"{n} {change}" for change, n in diff.items())
+        + ".",
+        file=sys.stderr,
+    )
+
+
+async def refresh_catalog(ctx: LifespanContext, interval: float, immediately: bool) -> None:
+    """
+    Refreshes the catalog every `interval` seconds (never if it is 0), and once right
+    away when `immediately` is set, e.g. after starting from a snapshot.
+    """
+    if immediately:
+        await revalidate_catalog(ctx)
+    while interval > 0:
+        await asyncio.sleep(interval)
+        await revalidate_catalog(ctx)
+
+
+def context_from_map(catalog: CatalogMap, services: ServerServices) -> LifespanContext:
+    return build_context(
+        cast(Sequence[Kpi], catalog.kpis),
+        cast(list[Municipality], catalog.municipalities),
+        services,
+        catalog.created_at,
+        kpi_map=cast(Mapping[str, Kpi], catalog.kpi_map),
+        municipality_groups=cast(list[MunicipalityGroup], catalog.municipality_groups),
+        operating_areas_summary=catalog.operating_areas_summary,
+        operating_area_index=catalog.operating_area_index,
+        search_index=catalog.search_index,
+        related_kpis=catalog.related_kpis,
+    )
+
+
+def save_catalog_map(ctx: LifespanContext) -> None:
+    write_catalog_map(
+        SHARED_CATALOG_PATH,
+        ctx["kpi_cache"],
+        ctx["municipality_cache"],
+        ctx["municipality_groups"],
+        ctx["operating_areas_summary"],
+        ctx["operating_area_index"],
+        ctx["search_index"],
+        ctx["related_kpis"],
+        ctx["catalog_updated_at"],
+    )
+
+
+def open_catalog_map(max_age: float) -> CatalogMap | None:
+    try:
+        return CatalogMap(SHARED_CATALOG_PATH, max_age)
+    except CatalogMapError as e:
+        print(f"[Kolada MCP Lite] Not using shared catalog: {e}", file=sys.stderr)
+        return None
+
+
+async def load_shared_catalog(
+    services: ServerServices,
+    municipalities: (
+        Callable[[], Awaitable[tuple[list[Municipality], list[MunicipalityGroup]]]] | None
+    ) = None,
+    progress: dict[str, int] | None = None,
+) -> tuple[LifespanContext, CatalogMap | None]:
+    """
+    Maps the shared catalog file, building it first if it is missing or too old. Only
+    the worker holding the lock fetches from Kolada; the others wait and map its file.
+    `municipalities` fetches the municipality list and groups for fetch_catalog(), under
+    the lock like the rest; `progress` is passed on to it.
+    """
+    started = time.perf_counter()
+    catalog = open_catalog_map(CATALOG_SNAPSHOT_MAX_AGE)
+    if catalog is None:
+        lock = FileLock(f"{SHARED_CATALOG_PATH}.lock")
+        while not lock.acquire():
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            # Another worker may have written the file while this one was waiting.
+            catalog = open_catalog_map(CATALOG_SNAPSHOT_MAX_AGE)
+            if catalog is None:
+                fetched = await municipalities() if municipalities is not None else None
+                ctx = await fetch_catalog(services, None, fetched, progress)
+                try:
+                    save_catalog_map(ctx)
+                except OSError as e:
+                    print(
+                        f"[Kolada MCP Lite] Could not write shared catalog: {e}", file=sys.stderr
+                    )
+                    return ctx, None
+                catalog = open_catalog_map(-1)
+                if catalog is None:
+                    return ctx, None
+        finally:
+            lock.release()
+    print(
+        f"[Kolada MCP Lite] Mapped shared catalog ({len(catalog.kpis)} KPIs, "
+        f"{catalog.nbytes} bytes) in {(time.perf_counter() - started) * 1000:.1f} ms.",
+        file=sys.stderr,
+    )
+    return context_from_map(catalog, services), catalog
+
+
+async def watch_shared_catalog(
+    ctx: LifespanContext, identity: tuple[int, int, int] | None
+) -> None:
+    """
+    Remaps the shared catalog whenever the file is replaced. Once it is older than the
+    refresh age, whichever worker takes the lock first refetches and replaces it.
+    """
+    lock = FileLock(f"{SHARED_CATALOG_PATH}.lock")
+    while True:
+        await asyncio.sleep(SHARED_CATALOG_CHECK_INTERVAL)
+        stale = time.time() - ctx["catalog_updated_at"] > SHARED_CATALOG_REFRESH_AGE
+        if stale and file_identity(SHARED_CATALOG_PATH) == identity and lock.acquire():
+            try:
+                if file_identity(SHARED_CATALOG_PATH) == identity:
+                    print("[Kolada MCP Lite] Refreshing shared catalog...", file=sys.stderr)
+                    save_catalog_map(await fetch_catalog(ctx, cast(LifespanContext, dict(ctx))))
+            except (httpx.HTTPError, ValueError, OSError) as e:
+                print(f"[Kolada MCP Lite] Shared catalog refresh failed: {e}", file=sys.stderr)
+                continue
+            finally:
+                lock.release()
+        current = file_identity(SHARED_CATALOG_PATH)
+        if current is None or current == identity:
+            continue
+        catalog = open_catalog_map(-1)
+        if catalog is None:
+            continue
+        # The old mapping is released once no tool call holds its views any more.
+        swap_catalog(ctx, context_from_map(catalog, ctx))
+        identity = catalog.identity
+        print(
+            f"[Kolada MCP Lite] Remapped shared catalog ({len(catalog.kpis)} KPIs).",
+            file=sys.stderr,
+        )
+
+
+def context_families(ctx: LifespanContext) -> list[Family]:
+    """Cache, value store and catalog gauges for the metrics endpoint, read at scrape time."""
+    cache = ctx["data_cache"].stats()
+    store = ctx["value_store"].stats()
+    store_lookups = store["hits"] + store["misses"]
+    readiness = ctx["readiness"]
+    return [
+        (
+            "kolada_startup_ready",
+            "gauge",
+            "1 once a catalog part (municipalities, catalog) has loaded after startup.",
+            [({"resource": r}, float(readiness.is_ready(r))) for r in STARTUP_RESOURCES],
+        ),
+        (
+            "kolada_data_cache_lookups_total",
+            "counter",
+            "Data cache lookups by result.",
+            [
+                ({"result": "hit"}, cache["hits"]),
+                ({"result": "disk_hit"}, cache["disk_hits"]),
+                ({"result": "miss"}, cache["misses"]),
+                ({"result": "coalesced"}, cache["coalesced"]),
+            ],
+        ),
+        (
+            "kolada_data_cache_hit_ratio",
+            "gauge",
+            "Share of data cache lookups served from memory or disk.",
+            [({}, cache["hit_ratio"] or 0.0)],
+        ),
+        ("kolada_data_cache_entries", "gauge", "Entries in the data cache.", [({}, cache["entries"])]),
+        (
+            "kolada_value_store_hit_ratio",
+            "gauge",
+            "Share of parsed KPI frame lookups served from the value store.",
+            [({}, store["hits"] / store_lookups if store_lookups else 0.0)],
+        ),
+        ("kolada_value_store_bytes", "gauge", "Bytes held by parsed KPI frames.", [({}, store["bytes"])]),
+        ("kolada_value_store_frames", "gauge", "Parsed KPI frames held.", [({}, store["frames"])]),
+        (
+            "kolada_catalog_age_seconds",
+            "gauge",
+            "Seconds since the KPI catalog was fetched from Kolada.",
+            [({}, time.time() - ctx["catalog_updated_at"])],
+        ),
+        ("kolada_catalog_kpis", "gauge", "KPIs in the catalog.", [({}, len(ctx["kpi_cache"]))]),
+        (
+            "kolada_catalog_municipalities",
+            "gauge",
+            "Municipalities in the catalog.",
+            [({}, len(ctx["municipality_cache"]))],
+        ),
+        (
+            "kolada_catalog_municipality_groups",
+            "gauge",
+            "Municipality groups in the catalog.",
+            [({}, len(ctx["group_index"]))],
+        ),
+        (
+            "kolada_group_rollups_cached",
+            "gauge",
+            "Group rollups held for reuse.",
+            [({}, ctx["group_index"].stats()["cached_rollups"])],
+        ),
+        (
+            "kolada_popularity_tracked_slices",
+            "gauge",
+            "Data slices tracked for prefetching.",
+            [({}, len(ctx["popularity"]))],
+        ),
+    ]
+
+
+T = TypeVar("T")
+
+
+async def _load_until_done(
+    readiness: Readiness, resource: str, load: Callable[[], Awaitable[T]]
+) -> T:
+    # Startup loads are retried until they succeed; the last error shows in the readiness
+    # report meanwhile.
+    while True:
+        try:
+            return await load()
+        except (httpx.HTTPError, ValueError, OSError) as e:
+            readiness.errors[resource] = str(e) or type(e).__name__
+            print(
+                f"[Kolada MCP Lite] Loading the {STARTUP_RESOURCES[resource]} failed: {e}. "
+                f"Retrying in {STARTUP_RETRY_INTERVAL:g}s.",
+                file=sys.stderr,
+            )
+            await asyncio.sleep(STARTUP_RETRY_INTERVAL)
+
+
+async def _load_municipalities(
+    ctx: LifespanContext,
+) -> tuple[list[Municipality], list[MunicipalityGroup]]:
+    # Fetches the municipality list and groups into `ctx` and marks them ready, once.
+    readiness = ctx["readiness"]
+    if readiness.is_ready("municipalities"):
+        return ctx["municipality_cache"], ctx["municipality_groups"]
+    municipalities = await _load_until_done(
+        readiness,
+        "municipalities",
+        lambda: fetch_municipalities(ctx["http_client"], {}),
+    )
+    swap_catalog(
+        ctx,
+        build_context(
+            [], municipalities[0], ctx, time.time(), municipality_groups=municipalities[1]
+        ),
+    )
+    readiness.set_ready("municipalities")
+    print(
+        f"[Kolada MCP Lite] Municipalities ready ({len(municipalities[0])}, "
+        f"{len(municipalities[1])} groups); loading the KPI catalog...",
+        file=sys.stderr,
+    )
+    return municipalities
+
+
+async def load_catalog(ctx: LifespanContext) -> None:
+    """
+    Cold start in the background: fetches the municipality list and groups and swaps
+    them into `ctx`, then the KPI catalog and its indexes, marking each ready in turn.
+    With a shared catalog only the worker building the file fetches anything; the others
+    wait for the file and have municipalities and catalog ready at once. Afterwards it
+    keeps the catalog fresh like a warm start does.
+    """
+    readiness = ctx["readiness"]
+    if SHARED_CATALOG:
+        fresh, catalog = await _load_until_done(
+            readiness,
+            "catalog",
+            lambda: load_shared_catalog(
+                ctx, lambda: _load_municipalities(ctx), readiness.progress
+            ),
+        )
+    else:
+        municipalities = await _load_municipalities(ctx)
+        fresh = await _load_until_done(
+            readiness,
+            "catalog",
+            lambda: fetch_catalog(ctx, None, municipalities, readiness.progress),
+        )
+    swap_catalog(ctx, fresh)
+    readiness.set_ready("municipalities", "catalog")
+    print(
+        f"[Kolada MCP Lite] Catalog ready after {readiness.ready_after['catalog']:.2f}s.",
+        file=sys.stderr,
+    )
+    if SHARED_CATALOG:
+        await watch_shared_catalog(ctx, catalog.identity if catalog is not None else None)
+        return
+    try_save_snapshot(CATALOG_SNAPSHOT_PATH, snapshot_sections(ctx), ctx["catalog_updated_at"])
+    await refresh_catalog(ctx, CATALOG_REFRESH_INTERVAL, immediately=False)
+
+
+def startup_status() -> dict[str, Any] | None:
+    """Readiness report of the process-wide context; None before it is created."""
+    if _shared_ctx is None:
+        return None
+    return _shared_ctx["readiness"].status()
+
+
+# Process-wide context held by the HTTP app, see shared_context().
+_shared_ctx: LifespanContext | None = None
+
+
+@asynccontextmanager
+async def open_context(
+    http_client: httpx.AsyncClient | None = None,
+) -> AsyncIterator[LifespanContext]:
+    """
+    Creates the services and catalog, and tears them down on exit. `http_client`
+    replaces the default upstream client; it is closed on exit as well. A snapshot or
+    shared catalog file is loaded right away; without one, the context is yielded empty
+    and filled in by load_catalog() in the background (see its `readiness`).
+    """
+    print("[Kolada MCP Lite] Starting lifespan setup...", file=sys.stderr)
+
+    services: ServerServices = {
+        "http_client": http_client or create_http_client(),
+        "data_cache": ResponseCache(
+            DATA_CACHE_MAX_ENTRIES,
+            DATA_CACHE_TTL,
+            DATA_CACHE_DISK_PATH,
+            dumps=DataTable.to_json,
+            loads=decode_data_table,
+            disk_max_bytes=DATA_CACHE_DISK_MAX_BYTES,
+        ),
+        "popularity": PopularityTracker(POPULARITY_HALF_LIFE, POPULARITY_PATH),
+        "mirror": open_local_mirror(MIRROR_PATH, MIRROR_MAX_AGE) if LOCAL_FIRST else None,
+        "readiness": Readiness(),
+    }
+    services["popularity"].load()
+    revalidate_task: asyncio.Task[None] | None = None
+    prefetch_task: asyncio.Task[None] | None = None
+    try:
+        catalog = open_catalog_map(CATALOG_SNAPSHOT_MAX_AGE) if SHARED_CATALOG else None
+        loaded = None if SHARED_CATALOG else load_context_snapshot(services)
+        if catalog is not None:
+            ctx = context_from_map(catalog, services)
+            revalidate_task = asyncio.create_task(watch_shared_catalog(ctx, catalog.identity))
+        elif loaded is not None:
+            ctx = loaded
+            revalidate_task = asyncio.create_task(
+                refresh_catalog(ctx, CATALOG_REFRESH_INTERVAL, immediately=True)
+            )
+        else:
+            ctx = build_context([], [], services, time.time())
+            revalidate_task = asyncio.create_task(load_catalog(ctx))
+        if catalog is not None or loaded is not None:
+            services["readiness"].set_ready()
+
+        if PREFETCH_INTERVAL > 0:
+            # Imported here because tools depends on this module.
+            from tools import warm_data_slice
+
+            async def _prefetch() -> None:
+                # Prefetched slices are laid out by municipality row.
+                await services["readiness"].wait("municipalities")
+                await run_prefetcher(
+                    services["popularity"],
+                    services["data_cache"],
+                    lambda key, max_age: warm_data_slice(ctx, key, max_age),
+                    PREFETCH_INTERVAL,
+                    PREFETCH_TOP_N,
+                    PREFETCH_REQUEST_BUDGET,
+                )
+
+            prefetch_task = asyncio.create_task(_prefetch())
+
+        REGISTRY.add_collector("lifespan", lambda: context_families(ctx))
+        print("[Kolada MCP Lite] Initialization complete.", file=sys.stderr)
         yield ctx
     finally:
+        REGISTRY.remove_collector("lifespan")
+        for task in (revalidate_task, prefetch_task):
+            if task is not None and not task.done():
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        services["popularity"].save()
+        await services["http_client"].aclose()
+        print(
+            f"[Kolada MCP Lite] Data cache stats: {services['data_cache'].stats()}",
+            file=sys.stderr,
+        )
+        services["data_cache"].close()
+        if services["mirror"] is not None:
+            services["mirror"].close()
         print("[Kolada MCP Lite] Shutdown.", file=sys.stderr)
 
 
+async def sync_local_mirror(areas: list[str], full: bool = False) -> dict[str, int]:
+    """
+    Mirrors Kolada data for the KPIs of the given operating areas (all KPIs when empty)
+    into the local mirror, against a freshly fetched catalog so publication dates are
+    current.
+    """
+    mirror = DataMirror(MIRROR_PATH)
+    services: ServerServices = {
+        "http_client": create_http_client(),
+        "data_cache": ResponseCache(DATA_CACHE_MAX_ENTRIES, DATA_CACHE_TTL),
+        "popularity": PopularityTracker(POPULARITY_HALF_LIFE, ""),
+        "mirror": None,
+        "readiness": Readiness(),
+    }
+    try:
+        ctx = await fetch_catalog(services)
+        kpi_map = ctx["kpi_map"]
+        if areas:
+            kpi_ids: set[str] = set()
+            for area in areas:
+                in_area = ctx["operating_area_index"].get(normalize_operating_area(area))
+                if not in_area:
+                    print(f"[Kolada MCP Lite] Unknown operating area: {area}", file=sys.stderr)
+                kpi_ids.update(in_area or ())
+            kpis = [kpi_map[k] for k in sorted(kpi_ids) if k in kpi_map]
+        else:
+            kpis = list(ctx["kpi_cache"])
+        print(
+            f"[Kolada MCP Lite] Syncing {len(kpis)} KPIs into {MIRROR_PATH}...", file=sys.stderr
+        )
+        return await mirror.sync(services["http_client"], kpis, full)
+    finally:
+        await services["http_client"].aclose()
+        mirror.close()
+
+
+@asynccontextmanager
+async def shared_context() -> AsyncIterator[LifespanContext]:
+    """
+    Holds one context for the whole process. With stateless streamable HTTP the MCP
+    server enters its lifespan for every request; while this is active, those requests
+    reuse the shared context instead of rebuilding the catalog and caches.
+    """
+    global _shared_ctx
+    async with open_context() as ctx:
+        _shared_ctx = ctx
+        try:
+            yield ctx
+        finally:
+            _shared_ctx = None
+
+
+@asynccontextmanager
+async def app_lifespan(server: FastMCP) -> AsyncIterator[LifespanContext]:
+    if _shared_ctx is not None:
+        yield _shared_ctx
+        return
+    async with open_context() as ctx:
+        yield ctx
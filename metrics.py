@@ -0,0 +1,304 @@
+import functools
+import math
+import time
+from typing import Any, Awaitable, Callable, Iterable, TypeVar, cast
+
+import httpx
+
+# Minimal Prometheus text-format metrics, kept in-process without extra dependencies.
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+Labels = tuple[str, ...]
+# A collector returns (name, type, help, [(labels dict, value), ...]) families at scrape time.
+Family = tuple[str, str, str, list[tuple[dict[str, str], float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Labels = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labelnames), 0.0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Labels = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label set: (non-cumulative bucket counts incl. +Inf, sum, count).
+        self._values: dict[Labels, tuple[list[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        entry = self._values.get(key)
+        if entry is None:
+            entry = ([0] * (len(self.buckets) + 1), 0.0, 0)
+        counts, total, n = entry
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        counts[i] += 1
+        self._values[key] = (counts, total + value, n + 1)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, n) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, c in zip((*self.buckets, math.inf), counts):
+                cumulative += c
+                labels = _format_labels((*self.labelnames, "le"), (*key, _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            base = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{base} {_format_value(total)}")
+            lines.append(f"{self.name}_count{base} {n}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: list[Counter | Histogram] = []
+        self._collectors: dict[str, Callable[[], list[Family]]] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: Labels = ()) -> Counter:
+        metric = Counter(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, labelnames: Labels = ()) -> Histogram:
+        metric = Histogram(name, help_text, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, key: str, collect: Callable[[], list[Family]]) -> None:
+        """Registers (or replaces) a callback producing gauge-like families at scrape time."""
+        self._collectors[key] = collect
+
+    def remove_collector(self, key: str) -> None:
+        self._collectors.pop(key, None)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in list(self._collectors.values()):
+            for name, kind, help_text, samples in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(
+                        f"{name}{_format_labels(labels.keys(), labels.values())} "
+                        f"{_format_value(value)}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+TOOL_CALLS = REGISTRY.counter("kolada_tool_calls_total", "MCP tool invocations.", ("tool",))
+TOOL_ERRORS = REGISTRY.counter(
+    "kolada_tool_errors_total", "MCP tool calls that raised or returned an error.", ("tool",)
+)
+TOOL_LATENCY = REGISTRY.histogram(
+    "kolada_tool_duration_seconds", "MCP tool wall time in seconds.", ("tool",)
+)
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "kolada_upstream_requests_total", "Requests to the Kolada API.", ("endpoint", "status")
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "kolada_upstream_request_duration_seconds",
+    "Kolada API request time until the body is fully received, in seconds.",
+    ("endpoint",),
+)
+UPSTREAM_BYTES = REGISTRY.counter(
+    "kolada_upstream_received_bytes_total", "Response body bytes received from Kolada.", ("endpoint",)
+)
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "kolada_upstream_retries_total", "Kolada API requests retried after a failure.", ("endpoint",)
+)
+CATALOG_REFRESHES = REGISTRY.counter(
+    "kolada_catalog_refreshes_total", "Background catalog refreshes by result.", ("result",)
+)
+CATALOG_CHANGES = REGISTRY.counter(
+    "kolada_catalog_kpi_changes_total",
+    "KPIs added, removed or changed between catalog refreshes.",
+    ("change",),
+)
+UPSTREAM_HEDGES = REGISTRY.counter(
+    "kolada_upstream_hedges_total",
+    "Hedged Kolada requests by outcome (sent, won, skipped).",
+    ("endpoint", "outcome"),
+)
+UPSTREAM_QUEUE_WAIT = REGISTRY.histogram(
+    "kolada_upstream_queue_wait_seconds",
+    "Time requests waited for the upstream concurrency limit, in seconds.",
+)
+CIRCUIT_REJECTIONS = REGISTRY.counter(
+    "kolada_upstream_circuit_rejections_total",
+    "Kolada requests refused locally because the circuit breaker was open.",
+)
+STALE_SERVED = REGISTRY.counter(
+    "kolada_data_cache_stale_served_total",
+    "Expired data cache entries served while the Kolada API was unavailable.",
+)
+UPSTREAM_DECODE = REGISTRY.histogram(
+    "kolada_upstream_decode_duration_seconds",
+    "Time spent decoding Kolada JSON responses, in seconds.",
+    ("endpoint",),
+)
+ENCODE_LATENCY = REGISTRY.histogram(
+    "kolada_encode_duration_seconds",
+    "Time spent building tool responses and encoding JSON, in seconds.",
+    ("kind",),
+)
+LOCAL_READS = REGISTRY.counter(
+    "kolada_local_mirror_reads_total",
+    "Data reads from the local mirror by result (hit, or miss for KPIs not mirrored).",
+    ("result",),
+)
+LOCAL_READ_LATENCY = REGISTRY.histogram(
+    "kolada_local_mirror_read_duration_seconds",
+    "Time spent reading KPI data from the local mirror, in seconds.",
+)
+
+
+def endpoint_label(path: str) -> str:
+    """Maps a Kolada URL path to a low-cardinality endpoint name, e.g. /v2/data/kpi/N1 -> data."""
+    parts = [p for p in path.split("/") if p]
+    if parts and parts[0].startswith("v") and parts[0][1:].isdigit():
+        parts = parts[1:]
+    return parts[0] if parts else "root"
+
+
+def _has_error(result: Any) -> bool:
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, list) and len(result) == 1 and isinstance(result[0], dict):
+        return set(result[0]) == {"error"}
+    return False
+
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+def instrument_tool(fn: F) -> F:
+    """Wraps an async tool to record calls, errors and latency. The signature is kept for MCP."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        TOOL_CALLS.inc(tool=name)
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException:
+            TOOL_ERRORS.inc(tool=name)
+            raise
+        finally:
+            TOOL_LATENCY.observe(time.perf_counter() - start, tool=name)
+        if _has_error(result):
+            TOOL_ERRORS.inc(tool=name)
+        return result
+
+    return wrapper  # type: ignore[return-value]
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, endpoint: str, start: float) -> None:
+        self._stream = stream
+        self._endpoint = endpoint
+        self._start = start
+        self._done = False
+
+    async def __aiter__(self):  # type: ignore[override]
+        async for chunk in self._stream:
+            UPSTREAM_BYTES.inc(len(chunk), endpoint=self._endpoint)
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._done:
+            self._done = True
+            UPSTREAM_LATENCY.observe(time.perf_counter() - self._start, endpoint=self._endpoint)
+        await self._stream.aclose()
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """Transport wrapper recording per-endpoint request counts, latency and bytes received."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = endpoint_label(request.url.path)
+        start = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except Exception:
+            UPSTREAM_REQUESTS.inc(endpoint=endpoint, status="error")
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            raise
+        UPSTREAM_REQUESTS.inc(endpoint=endpoint, status=str(response.status_code))
+        try:
+            # Responses built in memory (e.g. by a mock transport) are already read.
+            body = response.content
+        except httpx.ResponseNotRead:
+            pass
+        else:
+            UPSTREAM_BYTES.inc(len(body), endpoint=endpoint)
+            UPSTREAM_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint)
+            return response
+        response.stream = _MeteredStream(
+            cast(httpx.AsyncByteStream, response.stream), endpoint, start
+        )
+        return response
+
+    def pool_usage(self) -> dict[str, int]:
+        """Connection pool occupancy, when the wrapped transport exposes an httpcore pool."""
+        pool = getattr(self._transport, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return {}
+        idle = sum(1 for c in connections if c.is_idle())
+        queued = sum(1 for r in getattr(pool, "_requests", ()) if r.is_queued())
+        return {"active": len(connections) - idle, "idle": idle, "queued": queued}
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from typing import Any, Iterable, Mapping
+
+import httpx
+
+from codec import DataTable
+from config import DATA_FETCH_CONCURRENCY
+from metrics import LOCAL_READ_LATENCY, LOCAL_READS
+from upstream import fetch_kpi_data
+
+# KPIs synced between progress lines on stderr.
+SYNC_LOG_EVERY: int = 100
+# Seconds between reloads of which KPIs are mirrored, to see syncs by other processes.
+SYNCED_RELOAD_INTERVAL: float = 60.0
+
+_intern = sys.intern
+
+
+def _period_param(year: str) -> int | str:
+    # Kolada periods are integers; years arrive from tool arguments as strings.
+    return int(year) if year.isdigit() else year
+
+
+def _json(values: list[Any]) -> str:
+    return json.dumps(values, separators=(",", ":"), ensure_ascii=False)
+
+
+def _strings(raw: str) -> list[Any]:
+    return [v if v is None else _intern(v) for v in json.loads(raw)]
+
+
+class DataMirror:
+    """
+    Local SQLite copy of Kolada /data. Each (kpi, period) is one row holding the
+    DataTable columns for every municipality, packed as binary arrays and JSON string
+    lists, so a slice is read with a few primary-key lookups and no per-value objects
+    from SQLite. A KPI is always mirrored with every municipality and year, so any slice
+    of it can be answered locally. Each KPI's publication date is kept, and a sync only
+    refetches KPIs whose date changed since they were last mirrored. Reads skip KPIs
+    synced more than `max_age` seconds ago (0 for no limit).
+    """
+
+    def __init__(self, path: str, max_age: float = 0.0) -> None:
+        self.path = path
+        self.max_age = max_age
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets running servers keep reading while a sync process writes.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS kpi_periods ("
+            "kpi TEXT NOT NULL, period NOT NULL, municipalities TEXT NOT NULL, "
+            "value_offsets BLOB NOT NULL, genders TEXT NOT NULL, vals BLOB NOT NULL, "
+            "kinds BLOB NOT NULL, counts TEXT NOT NULL, statuses TEXT NOT NULL, "
+            "PRIMARY KEY (kpi, period)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS synced_kpis ("
+            "kpi TEXT PRIMARY KEY, publication_date TEXT, synced_at REAL NOT NULL, "
+            "value_count INTEGER NOT NULL);"
+        )
+        self._conn.commit()
+        # When each mirrored KPI was synced, so reads of other KPIs skip the database.
+        self._synced_at = self.sync_times()
+        self._synced_loaded = time.monotonic()
+
+    def kpi_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM synced_kpis").fetchone()[0]
+
+    def sync_times(self) -> dict[str, float]:
+        with self._lock:
+            rows = self._conn.execute("SELECT kpi, synced_at FROM synced_kpis").fetchall()
+        return dict(rows)
+
+    def publication_dates(self) -> dict[str, str | None]:
+        with self._lock:
+            rows = self._conn.execute("SELECT kpi, publication_date FROM synced_kpis").fetchall()
+        return dict(rows)
+
+    def query(
+        self, kpi_id: str, municipality_ids: list[str] | None, years: list[str]
+    ) -> DataTable | None:
+        """
+        The mirrored values of a KPI for the municipalities (None for all) and years
+        ([] for all), or None when the KPI has not been mirrored.
+        """
+        sql = (
+            "SELECT period, municipalities, value_offsets, genders, vals, kinds, counts, "
+            "statuses FROM kpi_periods WHERE kpi = ?"
+        )
+        params: list[Any] = [kpi_id]
+        if years:
+            sql += f" AND period IN ({','.join('?' * len(years))})"
+            params.extend(_period_param(y) for y in years)
+        with self._lock:
+            synced = self._conn.execute(
+                "SELECT 1 FROM synced_kpis WHERE kpi = ?", (kpi_id,)
+            ).fetchone()
+            if synced is None:
+                return None
+            rows = self._conn.execute(sql + " ORDER BY period", params).fetchall()
+
+        wanted = set(municipality_ids) if municipality_ids is not None else None
+        kpi = _intern(kpi_id)
+        tables: list[DataTable] = []
+        for period, municipalities, offsets, genders, vals, kinds, counts, statuses in rows:
+            table = DataTable()
+            table.municipality = _strings(municipalities)
+            table.kpi = [kpi] * len(table.municipality)
+            table.period = [period] * len(table.municipality)
+            table.value_offsets = array("I")
+            table.value_offsets.frombytes(offsets)
+            table.gender = _strings(genders)
+            table.value.frombytes(vals)
+            table.kind = bytearray(kinds)
+            table.count = json.loads(counts)
+            table.status = _strings(statuses)
+            if wanted is not None:
+                table = table.take(
+                    [i for i, m in enumerate(table.municipality) if m in wanted]
+                )
+            tables.append(table)
+        return DataTable.concat(tables) if tables else DataTable()
+
+    def replace(self, kpi_id: str, publication_date: str | None, data: DataTable) -> int:
+        """Replaces everything mirrored for a KPI with `data`; returns the value count."""
+        by_period: dict[int | str, list[int]] = {}
+        for i, (kpi, municipality, period) in enumerate(
+            zip(data.kpi, data.municipality, data.period)
+        ):
+            if municipality and period is not None and kpi in ("", kpi_id):
+                by_period.setdefault(period, []).append(i)
+        rows = []
+        value_count = 0
+        for period, indexes in by_period.items():
+            part = data.take(indexes)
+            value_count += len(part.value)
+            rows.append(
+                (
+                    kpi_id,
+                    period,
+                    _json(part.municipality),
+                    part.value_offsets.tobytes(),
+                    _json(part.gender),
+                    part.value.tobytes(),
+                    bytes(part.kind),
+                    _json(part.count),
+                    _json(part.status),
+                )
+            )
+        synced_at = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM kpi_periods WHERE kpi = ?", (kpi_id,))
+            self._conn.executemany(
+                "INSERT INTO kpi_periods VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO synced_kpis VALUES (?, ?, ?, ?)",
+                (kpi_id, publication_date, synced_at, value_count),
+            )
+        self._synced_at[kpi_id] = synced_at
+        return value_count
+
+    def is_fresh(self, kpi_id: str) -> bool:
+        """Whether a KPI is mirrored, and synced within `max_age`."""
+        synced_at = self._synced_at.get(kpi_id)
+        if synced_at is None:
+            return False
+        return self.max_age <= 0 or time.time() - synced_at <= self.max_age
+
+    async def read(
+        self, kpi_id: str, municipality_ids: list[str] | None, years: list[str]
+    ) -> DataTable | None:
+        """
+        Like query(), off the event loop, for KPIs synced within `max_age`. Database
+        errors count as not mirrored.
+        """
+        if time.monotonic() - self._synced_loaded > SYNCED_RELOAD_INTERVAL:
+            self._synced_loaded = time.monotonic()
+            try:
+                self._synced_at = await asyncio.to_thread(self.sync_times)
+            except sqlite3.Error as e:
+                print(f"[Kolada MCP Lite] Local mirror reload failed: {e}", file=sys.stderr)
+        if not self.is_fresh(kpi_id):
+            LOCAL_READS.inc(result="miss")
+            return None
+        start = time.perf_counter()
+        try:
+            table = await asyncio.to_thread(self.query, kpi_id, municipality_ids, years)
+        except sqlite3.Error as e:
+            print(f"[Kolada MCP Lite] Local mirror read failed: {e}", file=sys.stderr)
+            table = None
+        LOCAL_READS.inc(result="miss" if table is None else "hit")
+        LOCAL_READ_LATENCY.observe(time.perf_counter() - start)
+        return table
+
+    async def sync(
+        self,
+        client: httpx.AsyncClient,
+        kpis: Iterable[Mapping[str, Any]],
+        full: bool = False,
+        concurrency: int = DATA_FETCH_CONCURRENCY,
+    ) -> dict[str, int]:
+        """
+        Mirrors the given catalog KPIs. Unless `full`, KPIs already mirrored with the same
+        publication date are skipped. A KPI that fails to fetch keeps its previous data.
+        """
+        known = await asyncio.to_thread(self.publication_dates)
+        kpis = [k for k in kpis if k.get("id")]
+        pending = [
+            k
+            for k in kpis
+            if full or k["id"] not in known or known[k["id"]] != k.get("publication_date")
+        ]
+        stats = {
+            "kpis": len(kpis),
+            "skipped": len(kpis) - len(pending),
+            "synced": 0,
+            "failed": 0,
+            "values": 0,
+        }
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def _sync_one(kpi: Mapping[str, Any]) -> None:
+            kpi_id = kpi["id"]
+            try:
+                data = await fetch_kpi_data(client, kpi_id, None, [], semaphore)
+            except (httpx.HTTPError, ValueError) as e:
+                stats["failed"] += 1
+                print(f"[Kolada MCP Lite] Could not sync {kpi_id}: {e}", file=sys.stderr)
+                return
+            values = await asyncio.to_thread(
+                self.replace, kpi_id, kpi.get("publication_date"), data
+            )
+            stats["values"] += values
+            stats["synced"] += 1
+            if stats["synced"] % SYNC_LOG_EVERY == 0:
+                print(
+                    f"[Kolada MCP Lite] Synced {stats['synced']} of {len(pending)} KPIs.",
+                    file=sys.stderr,
+                )
+
+        await asyncio.gather(*(_sync_one(k) for k in pending))
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_local_mirror(path: str, max_age: float = 0.0) -> DataMirror | None:
+    """The mirror at `path` for local-first reads, or None if there is none yet."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        mirror = DataMirror(path, max_age)
+        count = mirror.kpi_count()
+    except (OSError, sqlite3.Error) as e:
+        print(f"[Kolada MCP Lite] Local mirror disabled: {e}", file=sys.stderr)
+        return None
+    print(f"[Kolada MCP Lite] Local-first reads from {path} ({count} KPIs).", file=sys.stderr)
+    return mirror
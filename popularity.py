@@ -0,0 +1,159 @@
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable
+
+from cache import CacheKey, ResponseCache
+from upstream import build_data_urls
+
+# Slices below this decayed request count are not worth an upstream call.
+MIN_PREFETCH_SCORE: float = 2.0
+# Cached slices are refreshed once they are this far into the cache TTL.
+REFRESH_AFTER_FRACTION: float = 0.8
+# Upper bound on tracked slices; the coldest are dropped beyond it.
+MAX_TRACKED: int = 10000
+_PRUNE_SCORE: float = 0.01
+
+
+class PopularityTracker:
+    """
+    Exponentially decayed request counts per data slice (a normalized cache key). A
+    request adds 1 and every `half_life` seconds halves the count, so scores follow
+    recent demand. The tracked set can be persisted to survive restarts.
+    """
+
+    def __init__(self, half_life: float, path: str = "") -> None:
+        self.half_life = max(half_life, 1.0)
+        self.path = path
+        self._entries: dict[CacheKey, tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _decayed(self, score: float, updated_at: float, now: float) -> float:
+        return score * math.pow(0.5, max(0.0, now - updated_at) / self.half_life)
+
+    def record(self, key: CacheKey, weight: float = 1.0, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        entry = self._entries.get(key)
+        score = self._decayed(*entry, now) if entry is not None else 0.0
+        self._entries[key] = (score + weight, now)
+
+    def score(self, key: CacheKey, now: float | None = None) -> float:
+        entry = self._entries.get(key)
+        if entry is None:
+            return 0.0
+        return self._decayed(*entry, time.time() if now is None else now)
+
+    def hottest(self, n: int, now: float | None = None) -> list[tuple[CacheKey, float]]:
+        """Returns up to `n` (key, score) pairs, highest current score first."""
+        now = time.time() if now is None else now
+        scored = [(key, self._decayed(s, t, now)) for key, (s, t) in self._entries.items()]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[: max(0, n)]
+
+    def prune(self, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        scored = self.hottest(MAX_TRACKED, now)
+        self._entries = {
+            key: (score, now) for key, score in scored if score >= _PRUNE_SCORE
+        }
+
+    def load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                raw = json.load(f)
+            for kpi_id, municipality_ids, years, score, updated_at in raw["entries"]:
+                key = (str(kpi_id), tuple(municipality_ids), tuple(years))
+                self._entries[key] = (float(score), float(updated_at))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[Kolada MCP Lite] Ignoring popularity file: {e}", file=sys.stderr)
+            return
+        print(
+            f"[Kolada MCP Lite] Loaded {len(self._entries)} tracked data slices.",
+            file=sys.stderr,
+        )
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        self.prune()
+        entries = [
+            [kpi_id, list(municipality_ids), list(years), score, updated_at]
+            for (kpi_id, municipality_ids, years), (score, updated_at) in self._entries.items()
+        ]
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "entries": entries}, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"[Kolada MCP Lite] Could not write popularity file: {e}", file=sys.stderr)
+
+    def stats(self) -> dict[str, Any]:
+        return {"tracked": len(self._entries), "hottest": self.hottest(5)}
+
+
+def slice_cost(key: CacheKey) -> int:
+    """Number of upstream requests (excluding extra pages) needed to fetch a slice."""
+    kpi_id, municipality_ids, years = key
+    return len(build_data_urls(kpi_id, list(municipality_ids) or None, list(years)))
+
+
+async def prefetch_once(
+    tracker: PopularityTracker,
+    cache: ResponseCache,
+    warm: Callable[[CacheKey, float], Awaitable[None]],
+    top_n: int,
+    budget: int,
+    refresh_after: float,
+) -> int:
+    """
+    Warms the hottest slices that are missing from the data cache or due for a refresh,
+    spending at most `budget` upstream requests. Returns the requests spent.
+    """
+    spent = 0
+    for key, score in tracker.hottest(top_n):
+        if score < MIN_PREFETCH_SCORE:
+            break
+        age = cache.age(key)
+        cost = slice_cost(key) if age is None or age > refresh_after else 0
+        if spent + cost > budget:
+            continue
+        try:
+            await warm(key, refresh_after)
+        except Exception as e:
+            print(f"[Kolada MCP Lite] Prefetch of {key[0]} failed: {e}", file=sys.stderr)
+        spent += cost
+    return spent
+
+
+async def run_prefetcher(
+    tracker: PopularityTracker,
+    cache: ResponseCache,
+    warm: Callable[[CacheKey, float], Awaitable[None]],
+    interval: float,
+    top_n: int,
+    budget: int,
+) -> None:
+    """Background loop: warm popular slices, persist the hot set, sleep, repeat."""
+    refresh_after = cache.ttl * REFRESH_AFTER_FRACTION
+    while True:
+        spent = await prefetch_once(tracker, cache, warm, top_n, budget, refresh_after)
+        if spent:
+            print(
+                f"[Kolada MCP Lite] Prefetched popular data slices ({spent} requests).",
+                file=sys.stderr,
+            )
+        await asyncio.to_thread(tracker.save)
+        await asyncio.sleep(interval)
@@ -0,0 +1,227 @@
+from array import array
+from bisect import bisect_left
+from typing import Any, Iterable, Iterator, Mapping, Protocol, Sequence, overload
+
+# Fields that are unique per record and not worth interning.
+UNIQUE_FIELDS: frozenset[str] = frozenset({"id", "title"})
+# Long free-text fields, kept UTF-8 encoded in one buffer and decoded on access.
+PACKED_FIELDS: tuple[str, ...] = ("description",)
+
+# Stands in for a value held in the packed buffer. JSON never produces it and marshal
+# can store it, so rows go into the catalog snapshot unchanged.
+_PACKED = Ellipsis
+
+
+class RecordSource(Protocol):
+    """What a Record reads its values from: a RecordTable, or a mapped catalog's columns."""
+
+    def keys_of(self, row: int) -> Sequence[str]: ...
+
+    def value(self, row: int, key: str) -> Any: ...
+
+    def to_dict(self, row: int) -> dict[str, Any]: ...
+
+
+class RecordTable(Sequence["Record"]):
+    """
+    Catalog records held compactly instead of as one dict each: a tuple of values per
+    record, one shared key tuple per distinct record shape, repeated strings (operating
+    areas, types, dates) interned, and long text packed into a byte buffer. Items are
+    Record views that read like the original dicts.
+    """
+
+    def __init__(self, records: Iterable[Mapping[str, Any]]) -> None:
+        self._shapes: list[tuple[str, ...]] = []
+        self._positions: list[dict[str, int]] = []
+        shape_index: dict[tuple[str, ...], int] = {}
+        self._shape_ids = array("H")
+        self._rows: list[tuple[Any, ...]] = []
+        interned: dict[str, str] = {}
+        packed: dict[str, list[bytes]] = {f: [] for f in PACKED_FIELDS}
+        for record in records:
+            keys = tuple(record)
+            s = shape_index.get(keys)
+            if s is None:
+                s = shape_index[keys] = len(self._shapes)
+                self._shapes.append(keys)
+                self._positions.append({k: i for i, k in enumerate(keys)})
+            values: list[Any] = []
+            for key, value in record.items():
+                if key in packed and isinstance(value, str):
+                    packed[key].append(value.encode("utf-8"))
+                    value = _PACKED
+                elif key in packed:
+                    packed[key].append(b"")
+                elif isinstance(value, str) and key not in UNIQUE_FIELDS:
+                    value = interned.setdefault(value, value)
+                values.append(value)
+            for key, encoded in packed.items():
+                if key not in record:
+                    encoded.append(b"")
+            self._shape_ids.append(s)
+            self._rows.append(tuple(values))
+
+        self._packed: dict[str, tuple[array[int], bytes]] = {}
+        for key, encoded in packed.items():
+            offsets = array("Q", [0])
+            total = 0
+            for b in encoded:
+                total += len(b)
+                offsets.append(total)
+            self._packed[key] = (offsets, b"".join(encoded))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @overload
+    def __getitem__(self, i: int) -> "Record": ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list["Record"]: ...
+
+    def __getitem__(self, i: int | slice) -> "Record | list[Record]":
+        if isinstance(i, slice):
+            return [Record(self, j) for j in range(*i.indices(len(self)))]
+        n = len(self._rows)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("record index out of range")
+        return Record(self, i)
+
+    def keys_of(self, row: int) -> tuple[str, ...]:
+        return self._shapes[self._shape_ids[row]]
+
+    def value(self, row: int, key: str) -> Any:
+        """The value of `key` in record `row`; raises KeyError if the record lacks it."""
+        value = self._rows[row][self._positions[self._shape_ids[row]][key]]
+        if value is _PACKED:
+            offsets, blob = self._packed[key]
+            return blob[offsets[row] : offsets[row + 1]].decode("utf-8")
+        return value
+
+    def to_dict(self, row: int) -> dict[str, Any]:
+        record = dict(zip(self.keys_of(row), self._rows[row]))
+        for key in self._packed:
+            if record.get(key) is _PACKED:
+                record[key] = self.value(row, key)
+        return record
+
+    def by_id(self, key: str = "id") -> "RecordMap":
+        return RecordMap(self, key)
+
+    def to_sections(self) -> dict[str, Any]:
+        """Builtin-typed columns for the catalog snapshot."""
+        return {
+            "shapes": [list(s) for s in self._shapes],
+            "shape_ids": self._shape_ids.tobytes(),
+            "rows": [list(row) for row in self._rows],
+            "packed": {
+                k: (offsets.tobytes(), blob) for k, (offsets, blob) in self._packed.items()
+            },
+        }
+
+    @classmethod
+    def from_sections(cls, sections: dict[str, Any]) -> "RecordTable":
+        table = cls(())
+        table._shapes = [tuple(s) for s in sections["shapes"]]
+        table._positions = [{k: i for i, k in enumerate(s)} for s in table._shapes]
+        table._shape_ids = array("H")
+        table._shape_ids.frombytes(sections["shape_ids"])
+        table._packed = {}
+        for key, (raw_offsets, blob) in sections["packed"].items():
+            offsets = array("Q")
+            offsets.frombytes(raw_offsets)
+            table._packed[key] = (offsets, blob)
+        # marshal does not preserve string identity, so repeated values are interned again.
+        interned: dict[str, str] = {}
+        table._rows = [
+            tuple(
+                interned.setdefault(v, v) if isinstance(v, str) and k not in UNIQUE_FIELDS else v
+                for k, v in zip(table._shapes[s], row)
+            )
+            for s, row in zip(table._shape_ids, sections["rows"])
+        ]
+        return table
+
+
+class Record(Mapping[str, Any]):
+    """Read-only view of one record in a RecordTable that reads like the original dict."""
+
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: RecordSource, row: int) -> None:
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key: str) -> Any:
+        return self._table.value(self._row, key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._table.keys_of(self._row)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._table.keys_of(self._row))
+
+    def __len__(self) -> int:
+        return len(self._table.keys_of(self._row))
+
+    def to_dict(self) -> dict[str, Any]:
+        """The record as a plain dict; faster than dict(record)."""
+        return self._table.to_dict(self._row)
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class RecordMap(Mapping[str, Record]):
+    """
+    Records of a RecordTable by a key field, found by binary search over the sorted
+    keys; the last record wins when a key repeats. Iterates in table order.
+    """
+
+    def __init__(self, table: RecordTable, key: str = "id") -> None:
+        self._table = table
+        self._key = key
+        last_row: dict[str, int] = {}
+        for row in range(len(table)):
+            value = self._key_of(row)
+            if value:
+                last_row[value] = row
+        self._keys = sorted(last_row)
+        self._rows = array("I", [last_row[k] for k in self._keys])
+        self._order = array("I", sorted(last_row.values()))
+
+    def _key_of(self, row: int) -> str | None:
+        try:
+            value = self._table.value(row, self._key)
+        except KeyError:
+            return None
+        return value if isinstance(value, str) else None
+
+    def _find(self, key: object) -> int:
+        if not isinstance(key, str):
+            return -1
+        i = bisect_left(self._keys, key)
+        return self._rows[i] if i < len(self._keys) and self._keys[i] == key else -1
+
+    def __getitem__(self, key: str) -> Record:
+        row = self._find(key)
+        if row < 0:
+            raise KeyError(key)
+        return Record(self._table, row)
+
+    def __contains__(self, key: object) -> bool:
+        return self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for row in self._order:
+            yield self._table.value(row, self._key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def as_dict(record: Mapping[str, Any]) -> dict[str, Any]:
+    """A catalog record, compact or not, as a plain dict for tool output."""
+    return record.to_dict() if isinstance(record, Record) else dict(record)
@@ -0,0 +1,203 @@
+import math
+from collections import Counter
+from typing import Any, cast
+
+import numpy as np
+
+from search import PackedPostings, SearchIndex, tokenize
+
+# Bounds on one block of the neighbour computation: similarity cells held at once, and
+# (document, posting) pairs expanded at once.
+BLOCK_CELLS: int = 1 << 22
+BLOCK_PAIRS: int = 1 << 23
+# Memory for the dense (document, term) matrix of the most frequent terms.
+DENSE_TERM_BYTES: int = 32 << 20
+
+
+def _top_k(sims: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    # Column indices and values of each row's k largest positive cells, best first and
+    # ties by column; rows with fewer than k positive cells are padded with -1 and 0.
+    k = min(k, sims.shape[1])
+    if k == 0:
+        empty = np.zeros((sims.shape[0], 0))
+        return empty.astype(np.int32), empty.astype(np.float32)
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(sims, top, axis=1)
+    # argpartition picks any of the cells tied with the k-th value; where it left out a
+    # lower column, that row keeps the lowest tied columns instead.
+    kth = values.min(axis=1)
+    tied = np.count_nonzero(sims == kth[:, np.newaxis], axis=1)
+    picked = np.count_nonzero(values == kth[:, np.newaxis], axis=1)
+    rows = np.flatnonzero((tied > picked) & (kth > 0))
+    if rows.size:
+        block = sims[rows]
+        above = block > kth[rows, np.newaxis]
+        at = block == kth[rows, np.newaxis]
+        room = k - np.count_nonzero(above, axis=1)
+        keep = above | (at & (np.cumsum(at, axis=1) <= room[:, np.newaxis]))
+        top[rows] = np.nonzero(keep)[1].reshape(rows.size, k)
+        values[rows] = np.take_along_axis(block, top[rows], axis=1)
+    order = np.lexsort((top, -values), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    values = np.take_along_axis(values, order, axis=1)
+    top[values <= 0] = -1
+    values[values <= 0] = 0.0
+    return top.astype(np.int32), values.astype(np.float32)
+
+
+def _nearest(
+    offsets: np.ndarray, docs: np.ndarray, impacts: np.ndarray, n: int, k: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Document norms, and the k nearest documents of every document by cosine similarity
+    with their scores, from term-major postings. The most frequent terms, whose postings
+    would pair up most documents, go into a dense matrix and are multiplied out; the
+    postings of the rest are expanded to every document sharing a term and summed with
+    one bincount. Rows are computed in blocks to bound memory.
+    """
+    lengths = np.diff(offsets).astype(np.intp)
+    norms = np.sqrt(np.bincount(docs, impacts * impacts, minlength=n))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weights = np.nan_to_num(impacts / norms[docs])
+    term_of = np.repeat(np.arange(lengths.size), lengths)
+
+    n_dense = min(lengths.size, DENSE_TERM_BYTES // (4 * max(n, 1)))
+    dense_terms = np.argsort(-lengths, kind="stable")[:n_dense]
+    column = np.full(lengths.size, -1, dtype=np.intp)
+    column[dense_terms] = np.arange(n_dense)
+    in_dense = column[term_of] >= 0
+    dense = np.zeros((n, n_dense), dtype=np.float32)
+    dense[docs[in_dense], column[term_of[in_dense]]] = weights[in_dense]
+    sparse_lengths = np.where(column >= 0, 0, lengths)
+
+    # The sparse entries document-major: the remaining terms and weights of each document.
+    order = np.argsort(docs, kind="stable")
+    order = order[~in_dense[order]]
+    entry_terms = term_of[order]
+    entry_weights = weights[order]
+    doc_offsets = np.zeros(n + 1, dtype=np.intp)
+    np.cumsum(np.bincount(docs[order], minlength=n), out=doc_offsets[1:])
+    pair_offsets = np.zeros(n + 1, dtype=np.intp)
+    np.cumsum(
+        np.bincount(docs[order], sparse_lengths[entry_terms], minlength=n), out=pair_offsets[1:]
+    )
+
+    neighbours = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    max_rows = max(1, BLOCK_CELLS // max(n, 1))
+    start = 0
+    while start < n:
+        stop = int(np.searchsorted(pair_offsets, pair_offsets[start] + BLOCK_PAIRS, "right")) - 1
+        stop = min(n, start + max_rows, max(stop, start + 1))
+        lo, hi = doc_offsets[start], doc_offsets[stop]
+        terms = entry_terms[lo:hi]
+        counts = lengths[terms]
+        rows = np.repeat(np.arange(stop - start), np.diff(doc_offsets[start : stop + 1]))
+        # Posting positions of every (entry, document sharing its term) pair.
+        firsts = np.cumsum(counts) - counts
+        posting = np.repeat(offsets[terms].astype(np.intp) - firsts, counts)
+        posting += np.arange(posting.size)
+        sims = (dense[start:stop] @ dense.T).astype(np.float64)
+        sims += np.bincount(
+            np.repeat(rows, counts) * n + docs[posting],
+            np.repeat(entry_weights[lo:hi], counts) * weights[posting],
+            minlength=(stop - start) * n,
+        ).reshape(stop - start, n)
+        sims[np.arange(stop - start), np.arange(start, stop)] = 0.0
+        top, values = _top_k(sims, k)
+        neighbours[start:stop, : top.shape[1]] = top
+        scores[start:stop, : values.shape[1]] = values
+        start = stop
+    return norms, neighbours, scores
+
+
+class RelatedKpis:
+    """
+    KPI similarity over the search index: every KPI is its vector of BM25 term impacts
+    (TF-IDF with saturated, length-normalized term frequencies), compared by cosine
+    similarity. The nearest neighbours of every KPI are computed once per catalog, so
+    "more like this KPI" is a row lookup; free text is scored against the postings of
+    its terms.
+    """
+
+    def __init__(
+        self, index: SearchIndex, norms: np.ndarray, neighbours: np.ndarray, scores: np.ndarray
+    ) -> None:
+        self.index = index
+        self.norms = norms
+        self.neighbours = neighbours
+        self.scores = scores
+        self.position: dict[str, int] = {kid: i for i, kid in enumerate(index.doc_ids)}
+
+    @classmethod
+    def build(cls, index: SearchIndex, k: int) -> "RelatedKpis":
+        # Built next to the index, whose postings are packed then.
+        postings = cast(PackedPostings, index.postings)
+        norms, neighbours, scores = _nearest(
+            np.frombuffer(postings.offsets, dtype=np.uint64).astype(np.intp),
+            np.frombuffer(postings.docs, dtype=np.uint32),
+            np.frombuffer(postings.impacts, dtype=np.float64),
+            len(index.doc_ids),
+            max(0, k),
+        )
+        return cls(index, norms, neighbours, scores)
+
+    def to_sections(self) -> dict[str, Any]:
+        return {
+            "k": self.neighbours.shape[1],
+            "norms": self.norms.tobytes(),
+            "neighbours": self.neighbours.tobytes(),
+            "scores": self.scores.tobytes(),
+        }
+
+    @classmethod
+    def from_sections(cls, sections: dict[str, Any], index: SearchIndex) -> "RelatedKpis":
+        k = sections["k"]
+        return cls(
+            index,
+            np.frombuffer(sections["norms"], dtype=np.float64),
+            np.frombuffer(sections["neighbours"], dtype=np.int32).reshape(-1, k),
+            np.frombuffer(sections["scores"], dtype=np.float32).reshape(-1, k),
+        )
+
+    @property
+    def k(self) -> int:
+        return self.neighbours.shape[1]
+
+    def related(self, kpi_id: str, limit: int) -> list[tuple[str, float]] | None:
+        """Up to `limit` (kpi_id, similarity) pairs nearest to a KPI; None if unknown."""
+        doc = self.position.get(kpi_id)
+        if doc is None:
+            return None
+        return [
+            (self.index.doc_ids[d], float(s))
+            for d, s in zip(self.neighbours[doc, :limit].tolist(), self.scores[doc, :limit])
+            if d >= 0
+        ]
+
+    def similar(self, text: str, limit: int) -> list[tuple[str, float]]:
+        """Up to `limit` (kpi_id, similarity) pairs nearest to free text, best first."""
+        n = len(self.index.doc_ids)
+        if limit <= 0 or n == 0:
+            return []
+        sims = np.zeros(n)
+        query_norm = 0.0
+        for term, count in Counter(tokenize(text)).items():
+            if term not in self.index.postings:
+                continue
+            docs, impacts = self.index.postings[term]
+            df = len(docs)
+            # Query terms are weighted like the index weighs them: by BM25 idf.
+            weight = count * math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            sims[np.asarray(docs, dtype=np.intp)] += weight * np.asarray(impacts)
+            query_norm += weight * weight
+        if query_norm == 0.0:
+            return []
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sims = np.nan_to_num(sims / (self.norms * math.sqrt(query_norm)))
+        top, values = _top_k(sims[np.newaxis, :], limit)
+        return [
+            (self.index.doc_ids[d], float(s))
+            for d, s in zip(top[0].tolist(), values[0].tolist())
+            if d >= 0
+        ]
@@ -0,0 +1,323 @@
+import asyncio
+import random
+import time
+
+import httpx
+
+from metrics import (
+    CIRCUIT_REJECTIONS,
+    UPSTREAM_HEDGES,
+    UPSTREAM_QUEUE_WAIT,
+    UPSTREAM_RETRIES,
+    Family,
+    endpoint_label,
+)
+
+# Responses worth retrying: throttling and transient gateway or server failures.
+RETRY_STATUSES: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+# Responses that mean Kolada is overloaded and the concurrency limit should back off.
+OVERLOAD_STATUSES: frozenset[int] = frozenset({429, 503})
+IDEMPOTENT_METHODS: frozenset[str] = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class UpstreamUnavailable(httpx.TransportError):
+    """Raised instead of sending a request while the circuit breaker is open."""
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit. Each success raises the limit by 1 / limit (about one slot
+    per round of requests); throttling or a transport error (a timeout, a refused or
+    dropped connection) multiplies it by `backoff`, at most once per round so a burst
+    of failures from the same round only counts once.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, backoff: float) -> None:
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.backoff = min(max(backoff, 0.0), 1.0)
+        self.in_flight = 0
+        self._waiters: list[asyncio.Future[None]] = []
+        self._last_decrease = 0.0
+
+    def _has_slot(self) -> bool:
+        return self.in_flight < int(self.limit)
+
+    def try_acquire(self) -> bool:
+        if self._waiters or not self._has_slot():
+            return False
+        self.in_flight += 1
+        return True
+
+    async def acquire(self) -> None:
+        if self.try_acquire():
+            return
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif not waiter.cancelled():
+                # The slot was handed over just as the caller went away.
+                self.release()
+            raise
+
+    def release(self, started: float | None = None, overloaded: bool = False) -> None:
+        """Frees a slot. `started` is when the request was sent, for outcome feedback."""
+        self.in_flight -= 1
+        if started is not None:
+            if overloaded:
+                if started >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = time.monotonic()
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+        while self._waiters and self._has_slot():
+            waiter = self._waiters.pop(0)
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failed attempts. While open every request is
+    refused; after `reset_timeout` seconds one trial request is let through and its
+    outcome closes or reopens the circuit.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, threshold: int, reset_timeout: float) -> None:
+        self.threshold = max(1, threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._trial_in_flight = False
+        if self.state == self.HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_in_flight = False
+
+    def abandon(self) -> None:
+        """A request ended without an outcome (e.g. cancelled); a trial may be sent again."""
+        self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class UpstreamScheduler(httpx.AsyncBaseTransport):
+    """
+    Transport wrapper that every Kolada request goes through. It waits for a slot under
+    the adaptive concurrency limit, retries idempotent requests on transport errors and
+    retryable statuses with full-jitter exponential backoff (honouring Retry-After),
+    refuses requests while the circuit breaker is open and, when `hedge_delay` is set,
+    sends a second copy of a GET that has not answered by then and keeps the first
+    response. Bodies are read while the slot is held, so the limit covers transfers too.
+    With a `deadline`, a request with its retries takes at most that many seconds, and
+    no request is retried once the circuit has opened.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        limiter: AdaptiveLimiter,
+        breaker: CircuitBreaker,
+        retries: int,
+        retry_base_delay: float,
+        retry_max_delay: float,
+        hedge_delay: float = 0.0,
+        deadline: float = 0.0,
+    ) -> None:
+        self._transport = transport
+        self.limiter = limiter
+        self.breaker = breaker
+        self.retries = max(0, retries)
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.hedge_delay = hedge_delay
+        self.deadline = deadline
+
+    def _backoff(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), self.retry_max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0.0, min(self.retry_max_delay, self.retry_base_delay * 2**attempt))
+
+    def _may_retry(self, attempt: int, attempts: int, delay: float, deadline: float | None) -> bool:
+        # After a failed `attempt` (0-based): retry unless the attempts are used up, the
+        # circuit has opened, or the backoff would run past the deadline.
+        if attempt + 1 >= attempts or self.breaker.state == CircuitBreaker.OPEN:
+            return False
+        return deadline is None or time.monotonic() + delay < deadline
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = endpoint_label(request.url.path)
+        idempotent = request.method in IDEMPOTENT_METHODS
+        attempts = 1 + (self.retries if idempotent else 0)
+        deadline = time.monotonic() + self.deadline if self.deadline > 0 else None
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                CIRCUIT_REJECTIONS.inc()
+                raise UpstreamUnavailable(
+                    "Kolada API circuit breaker is open after repeated failures",
+                    request=request,
+                )
+            try:
+                response = await self._send_before(request, endpoint, idempotent, deadline)
+            except httpx.TransportError:
+                self.breaker.record_failure()
+                delay = self._backoff(attempt, None)
+                if not self._may_retry(attempt, attempts, delay, deadline):
+                    raise
+            except BaseException:
+                self.breaker.abandon()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                self.breaker.record_failure()
+                delay = self._backoff(attempt, response.headers.get("retry-after"))
+                if not self._may_retry(attempt, attempts, delay, deadline):
+                    return response
+                await response.aclose()
+            UPSTREAM_RETRIES.inc(endpoint=endpoint)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _attempt(self, request: httpx.Request, acquired: bool = False) -> httpx.Response:
+        """One request under the concurrency limit; `acquired` when the slot is already held."""
+        if not acquired:
+            queued = time.perf_counter()
+            await self.limiter.acquire()
+            UPSTREAM_QUEUE_WAIT.observe(time.perf_counter() - queued)
+        started = time.monotonic()
+        feedback: float | None = started
+        overloaded = False
+        response: httpx.Response | None = None
+        try:
+            response = await self._transport.handle_async_request(request)
+            await response.aread()
+            overloaded = response.status_code in OVERLOAD_STATUSES
+            return response
+        except BaseException as e:
+            if response is not None:
+                await response.aclose()
+            if isinstance(e, httpx.TransportError):
+                # Timed out, refused or dropped connections: Kolada is not keeping up.
+                overloaded = True
+            else:
+                # Cut off (a losing hedge copy, or the deadline) or failed on our side:
+                # no outcome to learn from.
+                feedback = None
+            raise
+        finally:
+            self.limiter.release(feedback, overloaded)
+
+    async def _send_before(
+        self, request: httpx.Request, endpoint: str, hedge: bool, deadline: float | None
+    ) -> httpx.Response:
+        # One attempt, cut off with a timeout error when the request's deadline passes.
+        if deadline is None:
+            return await self._send(request, endpoint, hedge)
+        try:
+            return await asyncio.wait_for(
+                self._send(request, endpoint, hedge), max(0.0, deadline - time.monotonic())
+            )
+        except TimeoutError as e:
+            raise httpx.TimeoutException(
+                f"Kolada request exceeded its {self.deadline:g}s deadline", request=request
+            ) from e
+
+    async def _send(self, request: httpx.Request, endpoint: str, hedge: bool) -> httpx.Response:
+        if not hedge or self.hedge_delay <= 0:
+            return await self._attempt(request)
+        primary = asyncio.ensure_future(self._attempt(request))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            if done:
+                return await primary
+            # Hedge only with a free slot, never by queueing behind other requests.
+            if not self.limiter.try_acquire():
+                UPSTREAM_HEDGES.inc(endpoint=endpoint, outcome="skipped")
+                return await primary
+            UPSTREAM_HEDGES.inc(endpoint=endpoint, outcome="sent")
+            hedged = asyncio.ensure_future(self._attempt(request, acquired=True))
+            tasks.append(hedged)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedged:
+                            UPSTREAM_HEDGES.inc(endpoint=endpoint, outcome="won")
+                        return task.result()
+            # Both copies failed: report the primary's error.
+            return await primary
+        finally:
+            await _discard([t for t in tasks if not t.done()])
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def families(self) -> list[Family]:
+        state = {
+            CircuitBreaker.CLOSED: 0.0,
+            CircuitBreaker.HALF_OPEN: 1.0,
+            CircuitBreaker.OPEN: 2.0,
+        }
+        return [
+            (
+                "kolada_upstream_concurrency_limit",
+                "gauge",
+                "Current adaptive limit on concurrent Kolada requests.",
+                [({}, float(int(self.limiter.limit)))],
+            ),
+            (
+                "kolada_upstream_in_flight",
+                "gauge",
+                "Kolada requests currently holding a concurrency slot.",
+                [({}, float(self.limiter.in_flight))],
+            ),
+            (
+                "kolada_upstream_circuit_state",
+                "gauge",
+                "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+                [({}, state[self.breaker.state])],
+            ),
+        ]
+
+
+async def _discard(tasks: list[asyncio.Future[httpx.Response]]) -> None:
+    # Cancels the copies still running; any that completed anyway has its response closed.
+    for task in tasks:
+        task.cancel()
+    for result in await asyncio.gather(*tasks, return_exceptions=True):
+        if isinstance(result, httpx.Response):
+            await result.aclose()
@@ -0,0 +1,331 @@
+import heapq
+import math
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, Mapping, Sequence, cast
+
+import numpy as np
+
+# BM25 parameters. Title terms count TITLE_WEIGHT times towards term frequency.
+BM25_K1: float = 1.2
+BM25_B: float = 0.75
+TITLE_WEIGHT: int = 3
+# KPI fields that are indexed; a KPI only needs re-indexing when one of them changes.
+SEARCH_FIELDS: tuple[str, ...] = ("title", "description")
+# Prefix matches score lower than exact term matches and expand to a bounded number of terms.
+PREFIX_WEIGHT: float = 0.4
+MIN_PREFIX_LENGTH: int = 3
+MAX_PREFIX_EXPANSIONS: int = 64
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+# Common Swedish inflectional suffixes, longest first.
+_SUFFIXES: tuple[str, ...] = tuple(
+    sorted(
+        (
+            "heterna", "hetens", "arnas", "ernas", "ornas", "andes", "andet", "arens",
+            "heten", "heter", "arna", "erna", "orna", "ande", "ende", "aste", "ares",
+            "ades", "ens", "ets", "het", "ade", "are", "ast", "or", "ar", "er", "en",
+            "et", "at", "es", "as", "a", "e", "s",
+        ),
+        key=len,
+        reverse=True,
+    )
+)
+_MIN_STEM_LENGTH: int = 3
+
+
+def normalize(text: str) -> str:
+    """Lowercases, folds å/ä/ö and strips remaining diacritics."""
+    text = text.lower().replace("å", "a").replace("ä", "a").replace("ö", "o")
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+@lru_cache(maxsize=1 << 16)
+def stem(token: str) -> str:
+    if token.isdigit():
+        return token
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= _MIN_STEM_LENGTH:
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    return [stem(t) for t in _TOKEN_RE.findall(normalize(text))]
+
+
+Postings = Mapping[str, tuple[Sequence[int], Sequence[float]]]
+
+
+class PackedPostings(Mapping[str, tuple[Sequence[int], Sequence[float]]]):
+    """
+    Posting lists of all terms back to back in two flat arrays, one machine word per
+    entry instead of a Python int and float each. Terms are sorted; term i owns the
+    entries offsets[i]:offsets[i + 1]. `tfs` holds the weighted term frequency of each
+    entry, so the index can be rebuilt without tokenizing unchanged documents again.
+    """
+
+    def __init__(
+        self,
+        terms: list[str],
+        offsets: "array[int]",
+        docs: "array[int]",
+        impacts: "array[float]",
+        tfs: "array[int] | None" = None,
+    ) -> None:
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.impacts = impacts
+        self.tfs = tfs
+
+    def _find(self, term: object) -> int:
+        if not isinstance(term, str):
+            return -1
+        i = bisect_left(self.terms, term)
+        return i if i < len(self.terms) and self.terms[i] == term else -1
+
+    def __getitem__(self, term: str) -> tuple[Sequence[int], Sequence[float]]:
+        i = self._find(term)
+        if i < 0:
+            raise KeyError(term)
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.docs[start:stop], self.impacts[start:stop]
+
+    def __contains__(self, term: object) -> bool:
+        return self._find(term) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.terms)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+
+class SearchIndex:
+    """
+    Inverted index over KPI titles and descriptions with BM25 ranking. Each posting
+    list holds parallel (doc, impact) sequences where the impact is the precomputed
+    BM25 contribution of the term to the document, so a query is a sum over postings.
+    Built indexes keep their postings packed; a mapped catalog passes read-only
+    sequences over the mapped file and its already sorted vocabulary instead.
+    """
+
+    def __init__(
+        self,
+        doc_ids: Sequence[str],
+        postings: Postings,
+        vocabulary: Sequence[str] | None = None,
+        doc_lengths: "array[int] | None" = None,
+    ) -> None:
+        self.doc_ids = doc_ids
+        self.postings = postings
+        # Weighted token count per document; with the postings' tfs, what a rebuild reuses.
+        self.doc_lengths = doc_lengths
+        if vocabulary is None:
+            packed = isinstance(postings, PackedPostings)
+            vocabulary = postings.terms if packed else sorted(postings)
+        self.vocabulary = vocabulary
+
+    @classmethod
+    def build(cls, kpis: Iterable[Mapping[str, Any]]) -> "SearchIndex":
+        builder = SearchIndexBuilder()
+        for k in kpis:
+            builder.add(k)
+        return builder.build()
+
+    def to_sections(self) -> dict[str, Any]:
+        # Only built indexes are written to the snapshot, and those are packed.
+        postings = cast(PackedPostings, self.postings)
+        return {
+            "doc_ids": list(self.doc_ids),
+            "terms": postings.terms,
+            "offsets": postings.offsets.tobytes(),
+            "docs": postings.docs.tobytes(),
+            "impacts": postings.impacts.tobytes(),
+            "tfs": postings.tfs.tobytes() if postings.tfs is not None else None,
+            "doc_lengths": self.doc_lengths.tobytes() if self.doc_lengths is not None else None,
+        }
+
+    @classmethod
+    def from_sections(cls, sections: dict[str, Any]) -> "SearchIndex":
+        offsets, docs, impacts = array("Q"), array("I"), array("d")
+        offsets.frombytes(sections["offsets"])
+        docs.frombytes(sections["docs"])
+        impacts.frombytes(sections["impacts"])
+        tfs: "array[int] | None" = None
+        doc_lengths: "array[int] | None" = None
+        if sections.get("tfs") is not None and sections.get("doc_lengths") is not None:
+            tfs, doc_lengths = array("H"), array("I")
+            tfs.frombytes(sections["tfs"])
+            doc_lengths.frombytes(sections["doc_lengths"])
+        return cls(
+            sections["doc_ids"],
+            PackedPostings(sections["terms"], offsets, docs, impacts, tfs),
+            doc_lengths=doc_lengths,
+        )
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def _expand(self, token: str) -> list[tuple[str, float]]:
+        terms: list[tuple[str, float]] = []
+        if token in self.postings:
+            terms.append((token, 1.0))
+        if len(token) < MIN_PREFIX_LENGTH:
+            return terms
+        start = bisect_left(self.vocabulary, token)
+        for term in self.vocabulary[start : start + MAX_PREFIX_EXPANSIONS + 1]:
+            if not term.startswith(token):
+                break
+            if term != token:
+                terms.append((term, PREFIX_WEIGHT))
+        return terms
+
+    def search(self, query: str, limit: int) -> list[tuple[str, float]]:
+        """Returns up to `limit` (kpi_id, score) pairs, best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or limit <= 0 or not self.doc_ids:
+            return []
+        scores: dict[int, float] = {}
+        for token in tokens:
+            variants = self._expand(token)
+            if len(variants) == 1:
+                term, weight = variants[0]
+                docs, impacts = self.postings[term]
+                for doc, impact in zip(docs, impacts):
+                    scores[doc] = scores.get(doc, 0.0) + impact * weight
+                continue
+            # A query token contributes its best matching variant per document.
+            best: dict[int, float] = {}
+            for term, weight in variants:
+                docs, impacts = self.postings[term]
+                for doc, impact in zip(docs, impacts):
+                    score = impact * weight
+                    if score > best.get(doc, 0.0):
+                        best[doc] = score
+            for doc, score in best.items():
+                scores[doc] = scores.get(doc, 0.0) + score
+        top = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.doc_ids[doc], score) for doc, score in top]
+
+
+class SearchIndexBuilder:
+    """
+    Collects term frequencies document by document and computes BM25 impacts in build().
+    With a `base` index that kept its term frequencies, reuse() takes a document's counts
+    from it instead of tokenizing the KPI again; build() then carries them over.
+    """
+
+    def __init__(self, base: SearchIndex | None = None) -> None:
+        self.doc_ids: list[str] = []
+        self.doc_lengths: list[int] = []
+        self.term_freqs: dict[str, tuple[list[int], list[int]]] = {}
+        self._base: PackedPostings | None = None
+        self._base_lengths: "array[int]" = array("I")
+        self._base_docs: dict[str, int] = {}
+        # New document number of each reused base document, -1 if not reused.
+        self._reused = array("i")
+        if (
+            base is not None
+            and base.doc_lengths is not None
+            and isinstance(base.postings, PackedPostings)
+            and base.postings.tfs is not None
+        ):
+            self._base = base.postings
+            self._base_lengths = base.doc_lengths
+            self._base_docs = {kid: i for i, kid in enumerate(base.doc_ids)}
+            self._reused = array("i", [-1]) * len(base.doc_ids)
+
+    def reuse(self, kid: str) -> bool:
+        """Adds `kid` with its counts from the base index; False if the base lacks it."""
+        base_doc = self._base_docs.get(kid)
+        if base_doc is None or self._reused[base_doc] >= 0:
+            return False
+        self._reused[base_doc] = len(self.doc_ids)
+        self.doc_ids.append(kid)
+        self.doc_lengths.append(self._base_lengths[base_doc])
+        return True
+
+    def add(self, kpi: Mapping[str, Any]) -> None:
+        kid = kpi.get("id")
+        if not kid:
+            return
+        doc = len(self.doc_ids)
+        counts: dict[str, int] = {}
+        title_tokens = tokenize(kpi.get("title") or "")
+        desc_tokens = tokenize(kpi.get("description") or "")
+        for t in title_tokens:
+            counts[t] = counts.get(t, 0) + TITLE_WEIGHT
+        for t in desc_tokens:
+            counts[t] = counts.get(t, 0) + 1
+        for term, tf in counts.items():
+            entry = self.term_freqs.get(term)
+            if entry is None:
+                self.term_freqs[term] = ([doc], [tf])
+            else:
+                entry[0].append(doc)
+                entry[1].append(tf)
+        self.doc_ids.append(kid)
+        self.doc_lengths.append(TITLE_WEIGHT * len(title_tokens) + len(desc_tokens))
+
+    def _carry_over(self) -> None:
+        if self._base is None or max(self._reused, default=-1) < 0:
+            return
+        postings = self._base
+        # Renumber every base posting at once, drop those of documents not reused and
+        # split what is left back into per-term lists.
+        docs = np.frombuffer(postings.docs, dtype=np.uint32)
+        tfs = np.frombuffer(cast("array[int]", postings.tfs), dtype=np.uint16)
+        lengths = np.diff(np.frombuffer(postings.offsets, dtype=np.uint64)).astype(np.intp)
+        new_docs = np.frombuffer(self._reused, dtype=np.int32)[docs]
+        keep = new_docs >= 0
+        term_of = np.repeat(np.arange(len(postings.terms)), lengths)[keep]
+        kept_docs = new_docs[keep].tolist()
+        kept_tfs = tfs[keep].tolist()
+        bounds = np.searchsorted(term_of, np.arange(len(postings.terms) + 1)).tolist()
+        for i, term in enumerate(postings.terms):
+            start, stop = bounds[i], bounds[i + 1]
+            if start == stop:
+                continue
+            entry = self.term_freqs.get(term)
+            if entry is None:
+                self.term_freqs[term] = (kept_docs[start:stop], kept_tfs[start:stop])
+            else:
+                entry[0].extend(kept_docs[start:stop])
+                entry[1].extend(kept_tfs[start:stop])
+
+    def build(self) -> SearchIndex:
+        self._carry_over()
+        n = len(self.doc_ids)
+        avg_length = (sum(self.doc_lengths) / n) if n else 1.0
+        # Per-document BM25 length normalization, shared by all terms.
+        norms = [
+            BM25_K1 * (1.0 - BM25_B + BM25_B * length / (avg_length or 1.0))
+            for length in self.doc_lengths
+        ]
+        terms = sorted(self.term_freqs)
+        offsets = array("Q", [0])
+        packed_docs = array("I")
+        packed_tfs = array("H")
+        impacts = array("d")
+        for term in terms:
+            docs, tfs = self.term_freqs[term]
+            idf = math.log(1.0 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            packed_docs.extend(docs)
+            packed_tfs.extend(min(tf, 0xFFFF) for tf in tfs)
+            impacts.extend(
+                idf * tf * (BM25_K1 + 1.0) / (tf + norms[doc]) for doc, tf in zip(docs, tfs)
+            )
+            offsets.append(len(packed_docs))
+        return SearchIndex(
+            self.doc_ids,
+            PackedPostings(terms, offsets, packed_docs, impacts, packed_tfs),
+            doc_lengths=array("I", self.doc_lengths),
+        )
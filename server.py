@@ -1,17 +1,34 @@
+import argparse
+import asyncio
 import sys
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
+import uvicorn
 from mcp.server.fastmcp import FastMCP
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
 
+from config import LIVENESS_PATH, METRICS_ENABLED, METRICS_PATH, READINESS_PATH, WORKERS
 from entry_prompt import kolada_entry_point
-from lifespan import app_lifespan
+from lifespan import app_lifespan, shared_context, startup_status, sync_local_mirror
+from metrics import REGISTRY, instrument_tool
 from tools import (
     analyze_kpi_across_municipalities,
+    analyze_kpi_by_municipality_group,
+    analyze_kpi_trends,
+    analyze_multiple_kpis,
     compare_kpis,
+    correlate_kpis,
     fetch_kolada_data,
+    fetch_kolada_data_bulk,
     filter_municipalities_by_kpi,
+    find_related_kpis,
     get_kpi_metadata,
     get_kpis_by_operating_area,
     list_municipalities,
+    list_municipality_groups,
     list_operating_areas,
     search_kpis,
 )
@@ -20,23 +37,101 @@ mcp: FastMCP = FastMCP(
     "KoladaServerLite", lifespan=app_lifespan, port=8001, host="0.0.0.0", stateless_http=True
 )
 
-mcp.tool()(list_operating_areas)  # type: ignore[Context]
-mcp.tool()(get_kpis_by_operating_area)  # type: ignore[Context]
-mcp.tool()(get_kpi_metadata)  # type: ignore[Context]
-mcp.tool()(search_kpis)  # type: ignore[Context]
-mcp.tool()(fetch_kolada_data)  # type: ignore[Context]
-mcp.tool()(analyze_kpi_across_municipalities)  # type: ignore[Context]
-mcp.tool()(compare_kpis)  # type: ignore[Context]
-mcp.tool()(list_municipalities)  # type: ignore[Context]
-mcp.tool()(filter_municipalities_by_kpi)  # type: ignore[Context]
+mcp.tool()(instrument_tool(list_operating_areas))  # type: ignore[Context]
+mcp.tool()(instrument_tool(get_kpis_by_operating_area))  # type: ignore[Context]
+mcp.tool()(instrument_tool(get_kpi_metadata))  # type: ignore[Context]
+mcp.tool()(instrument_tool(search_kpis))  # type: ignore[Context]
+mcp.tool()(instrument_tool(find_related_kpis))  # type: ignore[Context]
+mcp.tool()(instrument_tool(fetch_kolada_data))  # type: ignore[Context]
+mcp.tool()(instrument_tool(fetch_kolada_data_bulk))  # type: ignore[Context]
+mcp.tool()(instrument_tool(analyze_kpi_across_municipalities))  # type: ignore[Context]
+mcp.tool()(instrument_tool(analyze_multiple_kpis))  # type: ignore[Context]
+mcp.tool()(instrument_tool(analyze_kpi_trends))  # type: ignore[Context]
+mcp.tool()(instrument_tool(compare_kpis))  # type: ignore[Context]
+mcp.tool()(instrument_tool(correlate_kpis))  # type: ignore[Context]
+mcp.tool()(instrument_tool(list_municipalities))  # type: ignore[Context]
+mcp.tool()(instrument_tool(list_municipality_groups))  # type: ignore[Context]
+mcp.tool()(instrument_tool(analyze_kpi_by_municipality_group))  # type: ignore[Context]
+mcp.tool()(instrument_tool(filter_municipalities_by_kpi))  # type: ignore[Context]
 
 mcp.prompt()(kolada_entry_point)
 
 
+@mcp.custom_route(LIVENESS_PATH, methods=["GET"])
+async def liveness(request: Request) -> JSONResponse:
+    # The process serves requests; the catalog may still be loading.
+    return JSONResponse({"status": "alive"})
+
+
+@mcp.custom_route(READINESS_PATH, methods=["GET"])
+async def readiness(request: Request) -> JSONResponse:
+    # 200 once the whole catalog is loaded, 503 with the startup progress until then.
+    status = startup_status()
+    if status is None:
+        return JSONResponse({"ready": False, "resources": {}}, status_code=503)
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+if METRICS_ENABLED:
+
+    @mcp.custom_route(METRICS_PATH, methods=["GET"])
+    async def metrics(request: Request) -> PlainTextResponse:
+        return PlainTextResponse(
+            REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+def create_app() -> Starlette:
+    """The streamable-http app, owning the shared lifespan context for all requests."""
+    app = mcp.streamable_http_app()
+    session_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        async with shared_context(), session_lifespan(app):
+            yield
+
+    app.router.lifespan_context = lifespan
+    return app
+
+
 def main():
     print("[Kolada MCP Lite] Starting server on streamable-http...", file=sys.stderr)
-    mcp.run("streamable-http")
+    # Worker processes import the app themselves, so it is passed as a factory path.
+    app: Starlette | str = create_app() if WORKERS <= 1 else "server:create_app"
+    uvicorn.run(
+        app,
+        factory=WORKERS > 1,
+        workers=WORKERS if WORKERS > 1 else None,
+        host=mcp.settings.host,
+        port=mcp.settings.port,
+        log_level=mcp.settings.log_level.lower(),
+    )
+
+
+def sync(argv: list[str] | None = None) -> None:
+    """`python server.py sync`: mirrors Kolada data into the local store for local-first reads."""
+    parser = argparse.ArgumentParser(
+        prog="server.py sync", description="Mirror Kolada data into the local SQLite store."
+    )
+    parser.add_argument(
+        "--area",
+        action="append",
+        default=[],
+        help="Operating area to mirror; repeat for several. Default: every area.",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Refetch every KPI instead of only those published since the last sync.",
+    )
+    args = parser.parse_args(argv)
+    stats = asyncio.run(sync_local_mirror(args.area, args.full))
+    print(f"[Kolada MCP Lite] Mirror sync finished: {stats}", file=sys.stderr)
 
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:2] == ["sync"]:
+        sync(sys.argv[2:])
+    else:
+        main()
@@ -0,0 +1,423 @@
+import json
+import mmap
+import os
+import struct
+import time
+from bisect import bisect_left
+from typing import Any, Iterator, Mapping, Sequence, cast, overload
+
+import numpy as np
+
+from records import Record
+from related import RelatedKpis
+from search import PackedPostings, SearchIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, every worker may fetch.
+    fcntl = None  # type: ignore[assignment]
+
+# Read-only catalog file shared by worker processes through mmap. Records and postings
+# are laid out as flat arrays and string tables so every worker reads them in place:
+#   header: magic, format version, created_at (unix seconds), section count
+#   section table: (name, offset, length) per section, sections 8-byte aligned
+CATALOG_MAP_MAGIC: bytes = b"KMCPSHMC"
+CATALOG_MAP_VERSION: int = 4
+_HEADER = struct.Struct("<8sHHdI4x")
+_SECTION = struct.Struct("<16sQQ")
+_ALIGN = 8
+# Seconds between attempts to take the lock while another worker builds the file.
+LOCK_POLL_INTERVAL: float = 0.1
+# Kind of each KPI field value, stored per record next to the field's string table.
+_ABSENT, _NULL, _STR, _FALSE, _TRUE, _JSON = range(6)
+
+
+class CatalogMapError(Exception):
+    pass
+
+
+class StringTable(Sequence[str]):
+    """UTF-8 strings stored back to back, addressed by an offsets array of length n + 1."""
+
+    def __init__(self, offsets: np.ndarray, blob: memoryview) -> None:
+        # A memoryview indexes to Python ints, much faster per access than numpy scalars.
+        self._offsets = memoryview(offsets).cast("B").cast("Q")
+        self._len = max(0, int(offsets.size) - 1)
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return self._len
+
+    @overload
+    def __getitem__(self, i: int) -> str: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[str]: ...
+
+    def __getitem__(self, i: int | slice) -> str | list[str]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError("string table index out of range")
+        return str(self._blob[self._offsets[i] : self._offsets[i + 1]], "utf-8")
+
+    def find(self, value: str) -> int:
+        """Position of `value` in a sorted table, or -1."""
+        i = bisect_left(self, value)
+        return i if i < len(self) and self[i] == value else -1
+
+
+class MappedRecords:
+    """
+    KPI records stored by field: for every field a kind per record and a string table
+    holding the record's value, so a Record view reads one field of one record in place
+    without decoding the rest.
+    """
+
+    def __init__(self, fields: list[str], columns: list[tuple[np.ndarray, StringTable]]) -> None:
+        self.fields = fields
+        self._columns = {
+            field: (memoryview(kinds), strings) for field, (kinds, strings) in zip(fields, columns)
+        }
+
+    def __len__(self) -> int:
+        return len(self._columns[self.fields[0]][0]) if self.fields else 0
+
+    def keys_of(self, row: int) -> list[str]:
+        return [f for f in self.fields if self._columns[f][0][row] != _ABSENT]
+
+    def value(self, row: int, key: str) -> Any:
+        kinds, strings = self._columns[key]
+        kind = kinds[row]
+        if kind == _STR:
+            return strings[row]
+        if kind == _ABSENT:
+            raise KeyError(key)
+        if kind == _JSON:
+            return json.loads(strings[row])
+        return None if kind == _NULL else kind == _TRUE
+
+    def to_dict(self, row: int) -> dict[str, Any]:
+        return {f: self.value(row, f) for f in self.keys_of(row)}
+
+
+class MappedKpiList(Sequence[Mapping[str, Any]]):
+    """KPI records in catalog order, as Record views over the mapped columns."""
+
+    def __init__(self, records: MappedRecords) -> None:
+        self._records = records
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @overload
+    def __getitem__(self, i: int) -> Record: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> list[Record]: ...
+
+    def __getitem__(self, i: int | slice) -> Record | list[Record]:
+        if isinstance(i, slice):
+            return [Record(self._records, j) for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("record index out of range")
+        return Record(self._records, i)
+
+
+class MappedKpiMap(Mapping[str, Mapping[str, Any]]):
+    """KPI records by ID: binary search over the sorted IDs for a view of the record."""
+
+    def __init__(self, ids: StringTable, positions: np.ndarray, records: MappedRecords) -> None:
+        self._ids = ids
+        self._positions = positions
+        self._records = records
+
+    def __getitem__(self, kpi_id: str) -> Record:
+        i = self._ids.find(kpi_id) if isinstance(kpi_id, str) else -1
+        if i < 0:
+            raise KeyError(kpi_id)
+        return Record(self._records, int(self._positions[i]))
+
+    def __contains__(self, kpi_id: object) -> bool:
+        return isinstance(kpi_id, str) and self._ids.find(kpi_id) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class MappedPostings(PackedPostings):
+    """
+    Packed postings over the mapped arrays, term frequencies included, so a catalog
+    refresh can reuse them like a built index's. Posting lists are returned as lists.
+    """
+
+    def __init__(
+        self,
+        terms: StringTable,
+        offsets: np.ndarray,
+        docs: np.ndarray,
+        impacts: np.ndarray,
+        tfs: np.ndarray | None,
+    ) -> None:
+        # The mapped arrays slice and expose buffers like the packed arrays do.
+        super().__init__(
+            cast(list[str], terms), cast(Any, offsets), cast(Any, docs), cast(Any, impacts), tfs
+        )
+
+    def __getitem__(self, term: str) -> tuple[list[int], list[float]]:
+        i = self._find(term)
+        if i < 0:
+            raise KeyError(term)
+        start, stop = int(self.offsets[i]), int(self.offsets[i + 1])
+        return (
+            cast(np.ndarray, self.docs)[start:stop].tolist(),
+            cast(np.ndarray, self.impacts)[start:stop].tolist(),
+        )
+
+
+def _string_sections(name: str, strings: Sequence[str]) -> dict[str, bytes]:
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return {f"{name}.off": offsets.tobytes(), name: b"".join(encoded)}
+
+
+def write_catalog_map(
+    path: str,
+    kpi_list: Sequence[Mapping[str, Any]],
+    municipality_list: Sequence[Mapping[str, Any]],
+    municipality_groups: Sequence[Mapping[str, Any]],
+    operating_areas_summary: list[dict[str, str | int]],
+    operating_area_index: dict[str, list[str]],
+    search_index: SearchIndex,
+    related_kpis: RelatedKpis,
+    created_at: float,
+) -> None:
+    """Writes the catalog to `path` atomically; readers keep their old mapping until they remap."""
+    fields = list(dict.fromkeys(f for k in kpi_list for f in k))
+    record_sections: dict[str, bytes] = {}
+    for i, field in enumerate(fields):
+        kinds = np.zeros(len(kpi_list), dtype=np.uint8)
+        strings: list[str] = []
+        for row, k in enumerate(kpi_list):
+            text = ""
+            if field in k:
+                value = k[field]
+                if isinstance(value, str):
+                    kinds[row], text = _STR, value
+                elif value is None:
+                    kinds[row] = _NULL
+                elif isinstance(value, bool):
+                    kinds[row] = _TRUE if value else _FALSE
+                else:
+                    kinds[row] = _JSON
+                    text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+            strings.append(text)
+        record_sections[f"kf{i}.kind"] = kinds.tobytes()
+        record_sections.update(_string_sections(f"kf{i}", strings))
+    # Like the in-memory kpi_map, the last record wins when an ID repeats.
+    last_position: dict[str, int] = {}
+    for i, k in enumerate(kpi_list):
+        kid = k.get("id")
+        if kid:
+            last_position[kid] = i
+    map_ids = sorted(last_position)
+    # Only built indexes are written, and those are packed with their term frequencies.
+    postings = cast(PackedPostings, search_index.postings)
+    search_sections: dict[str, bytes] = {
+        **_string_sections("terms", list(postings.terms)),
+        "post.off": bytes(postings.offsets),
+        "post_docs": bytes(postings.docs),
+        "post_impacts": bytes(postings.impacts),
+    }
+    if postings.tfs is not None and search_index.doc_lengths is not None:
+        search_sections["post_tfs"] = bytes(postings.tfs)
+        search_sections["doc_lengths"] = bytes(search_index.doc_lengths)
+    meta = {
+        "municipality_cache": [dict(m) for m in municipality_list],
+        "municipality_groups": [dict(g) for g in municipality_groups],
+        "operating_areas_summary": operating_areas_summary,
+        "operating_area_index": operating_area_index,
+        "related_kpis": related_kpis.k,
+        "kpi_fields": fields,
+    }
+    sections: dict[str, bytes] = {
+        **record_sections,
+        **_string_sections("kpi_ids", map_ids),
+        "kpi_positions": np.array(
+            [last_position[k] for k in map_ids], dtype=np.uint32
+        ).tobytes(),
+        **_string_sections("doc_ids", list(search_index.doc_ids)),
+        **search_sections,
+        "related_norms": related_kpis.norms.tobytes(),
+        "related_docs": related_kpis.neighbours.tobytes(),
+        "related_scores": related_kpis.scores.tobytes(),
+        "meta": json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    }
+
+    table_end = _HEADER.size + _SECTION.size * len(sections)
+    offset = -(-table_end // _ALIGN) * _ALIGN
+    entries: list[tuple[bytes, int, int]] = []
+    for name, payload in sections.items():
+        entries.append((name.encode("ascii"), offset, len(payload)))
+        offset = -(-(offset + len(payload)) // _ALIGN) * _ALIGN
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(CATALOG_MAP_MAGIC, CATALOG_MAP_VERSION, 0, created_at, len(entries)))
+        for name, start, length in entries:
+            f.write(_SECTION.pack(name, start, length))
+        for (_, start, _), payload in zip(entries, sections.values()):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(payload)
+    # Replacing the file gives it a new identity, which is what workers watch for.
+    os.replace(tmp_path, path)
+
+
+def file_identity(path: str) -> tuple[int, int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class CatalogMap:
+    """
+    A mapped catalog file. Arrays are views into the mapping, so the pages are shared
+    with every other process mapping the same file; the mapping stays open for as long
+    as any of them is referenced.
+    """
+
+    def __init__(self, path: str, max_age: float = -1) -> None:
+        self.path = path
+        try:
+            with open(path, "rb") as f:
+                self.identity = file_identity(path)
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise CatalogMapError(f"cannot map catalog: {e}") from e
+        if len(self._mm) < _HEADER.size:
+            raise CatalogMapError("catalog map is truncated")
+        magic, version, _, created_at, count = _HEADER.unpack_from(self._mm)
+        if magic != CATALOG_MAP_MAGIC:
+            raise CatalogMapError("not a catalog map")
+        if version != CATALOG_MAP_VERSION:
+            raise CatalogMapError(f"incompatible catalog map version {version}")
+        age = time.time() - created_at
+        if max_age >= 0 and age > max_age:
+            raise CatalogMapError(f"catalog map is {age:.0f}s old (max {max_age:.0f}s)")
+        self.created_at: float = created_at
+        self._sections: dict[str, tuple[int, int]] = {}
+        for i in range(count):
+            name, start, length = _SECTION.unpack_from(self._mm, _HEADER.size + i * _SECTION.size)
+            if start + length > len(self._mm):
+                raise CatalogMapError("catalog map is truncated")
+            self._sections[name.rstrip(b"\0").decode("ascii")] = (start, length)
+
+        try:
+            start, length = self._sections["meta"]
+            meta = json.loads(self._mm[start : start + length])
+            fields: list[str] = meta["kpi_fields"]
+            records = MappedRecords(
+                fields,
+                [
+                    (self._array(f"kf{i}.kind", np.uint8), self._strings(f"kf{i}"))
+                    for i in range(len(fields))
+                ],
+            )
+            terms = self._strings("terms")
+            self.kpis = MappedKpiList(records)
+            self.kpi_map = MappedKpiMap(
+                self._strings("kpi_ids"), self._array("kpi_positions", np.uint32), records
+            )
+            with_tfs = "post_tfs" in self._sections
+            self.search_index = SearchIndex(
+                self._strings("doc_ids"),
+                MappedPostings(
+                    terms,
+                    self._array("post.off", np.uint64),
+                    self._array("post_docs", np.uint32),
+                    self._array("post_impacts", np.float64),
+                    self._array("post_tfs", np.uint16) if with_tfs else None,
+                ),
+                vocabulary=terms,
+                doc_lengths=(
+                    cast(Any, self._array("doc_lengths", np.uint32)) if with_tfs else None
+                ),
+            )
+            self.municipalities: list[dict[str, Any]] = meta["municipality_cache"]
+            self.municipality_groups: list[dict[str, Any]] = meta["municipality_groups"]
+            self.operating_areas_summary: list[dict[str, str | int]] = meta[
+                "operating_areas_summary"
+            ]
+            self.operating_area_index: dict[str, list[str]] = meta["operating_area_index"]
+            k = meta["related_kpis"]
+            self.related_kpis = RelatedKpis(
+                self.search_index,
+                self._array("related_norms", np.float64),
+                self._array("related_docs", np.int32).reshape(-1, k),
+                self._array("related_scores", np.float32).reshape(-1, k),
+            )
+        except (KeyError, ValueError) as e:
+            raise CatalogMapError(f"catalog map is corrupt: {e!r}") from e
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mm)
+
+    def _array(self, name: str, dtype: type[np.generic]) -> np.ndarray:
+        start, length = self._sections[name]
+        itemsize = np.dtype(dtype).itemsize
+        return np.frombuffer(self._mm, dtype=dtype, count=length // itemsize, offset=start)
+
+    def _strings(self, name: str) -> StringTable:
+        start, length = self._sections[name]
+        return StringTable(
+            self._array(f"{name}.off", np.uint64), memoryview(self._mm)[start : start + length]
+        )
+
+
+class FileLock:
+    """Exclusive advisory lock on `path`, held by at most one process at a time."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file: Any = None
+
+    def acquire(self) -> bool:
+        """Tries to take the lock without waiting. Always succeeds where flock is unavailable."""
+        if self._file is not None:
+            return True
+        if fcntl is None:
+            self._file = True
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        f = open(self.path, "a+b")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self) -> None:
+        f, self._file = self._file, None
+        if f is None or f is True:
+            return
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
@@ -0,0 +1,78 @@
+import marshal
+import os
+import struct
+import sys
+import time
+import zlib
+from typing import Any
+
+# Header: magic, snapshot format version, marshal version, created_at (unix seconds).
+SNAPSHOT_MAGIC: bytes = b"KMCPSNAP"
+SNAPSHOT_VERSION: int = 7
+_HEADER = struct.Struct("<8sHHd")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def save_snapshot(path: str, sections: dict[str, Any], created_at: float | None = None) -> None:
+    """
+    Writes the catalog sections to `path` atomically. Sections must only contain
+    builtin types (dict, list, tuple, str, bytes, int, float, None, ...) since they are
+    encoded with marshal.
+    """
+    header = _HEADER.pack(
+        SNAPSHOT_MAGIC,
+        SNAPSHOT_VERSION,
+        marshal.version,
+        created_at if created_at is not None else time.time(),
+    )
+    payload = zlib.compress(marshal.dumps(sections), 1)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path: str, max_age: float) -> tuple[dict[str, Any], float]:
+    """
+    Returns the stored sections and their creation time. Raises SnapshotError if the
+    file is missing, too old, written by an incompatible version or corrupt.
+    """
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError as e:
+        raise SnapshotError(f"cannot read snapshot: {e}") from e
+    if len(raw) < _HEADER.size:
+        raise SnapshotError("snapshot is truncated")
+    magic, version, marshal_version, created_at = _HEADER.unpack_from(raw)
+    if magic != SNAPSHOT_MAGIC:
+        raise SnapshotError("not a catalog snapshot")
+    if version != SNAPSHOT_VERSION or marshal_version != marshal.version:
+        raise SnapshotError(f"incompatible snapshot version {version}/{marshal_version}")
+    age = time.time() - created_at
+    if max_age >= 0 and age > max_age:
+        raise SnapshotError(f"snapshot is {age:.0f}s old (max {max_age:.0f}s)")
+    try:
+        sections = marshal.loads(zlib.decompress(raw[_HEADER.size :]))
+    except (zlib.error, EOFError, ValueError, TypeError) as e:
+        raise SnapshotError(f"snapshot is corrupt: {e}") from e
+    if not isinstance(sections, dict):
+        raise SnapshotError("snapshot payload has unexpected shape")
+    return sections, created_at
+
+
+def try_save_snapshot(path: str, sections: dict[str, Any], created_at: float) -> None:
+    if not path:
+        return
+    try:
+        save_snapshot(path, sections, created_at)
+        print(f"[Kolada MCP Lite] Wrote catalog snapshot to {path}.", file=sys.stderr)
+    except OSError as e:
+        print(f"[Kolada MCP Lite] Could not write catalog snapshot: {e}", file=sys.stderr)
@@ -0,0 +1,348 @@
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, Mapping
+
+import numpy as np
+
+from codec import NULL, DataTable
+
+GENDERS: tuple[str, ...] = ("T", "K", "M")
+GENDER_INDEX: dict[str, int] = {g: i for i, g in enumerate(GENDERS)}
+
+
+class KpiFrame:
+    """
+    Dense values for one KPI as a float64 array of shape (municipality, period, gender).
+    Missing values are NaN. Rows follow the owning store's municipality order and
+    periods are sorted ascending.
+    """
+
+    def __init__(
+        self,
+        kpi_id: str,
+        periods: list[str],
+        values: np.ndarray,
+        covered_years: frozenset[str] | None,
+        loaded_at: float | None = None,
+    ) -> None:
+        self.kpi_id = kpi_id
+        self.periods = periods
+        self.period_index = {p: i for i, p in enumerate(periods)}
+        self.values = values
+        # None means every period Kolada has was fetched.
+        self.covered_years = covered_years
+        # When the oldest data in the frame was fetched from Kolada.
+        self.loaded_at = loaded_at if loaded_at is not None else time.time()
+        self._value_indexes: dict[tuple[str, str, tuple[int, ...] | None], ValueIndex] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.values.nbytes)
+
+    def covers(self, years: Iterable[str]) -> bool:
+        years = list(years)
+        if self.covered_years is None:
+            return True
+        return bool(years) and self.covered_years.issuperset(years)
+
+    def series(self, gender: str) -> np.ndarray | None:
+        """Returns a (municipality, period) view for `gender`, or None if unknown."""
+        g = GENDER_INDEX.get(gender)
+        if g is None:
+            return None
+        return self.values[:, :, g]
+
+    def period_positions(self, years: Iterable[str] | None = None) -> list[int]:
+        """Column positions of the requested years that have a period, ascending."""
+        if not years:
+            return list(range(len(self.periods)))
+        return sorted({self.period_index[y] for y in years if y in self.period_index})
+
+    def edges(
+        self, gender: str, rows: np.ndarray, positions: list[int] | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        For each row, the earliest and latest non-missing values among the period
+        `positions`, the period positions they came from and the number of non-missing
+        periods: (first_values, first_pos, last_values, last_pos, counts). Rows without
+        a value get NaN and -1.
+        """
+        series = self.series(gender)
+        cols = np.asarray(
+            positions if positions is not None else self.period_positions(), dtype=np.intp
+        )
+        if series is None or cols.size == 0 or rows.size == 0:
+            missing = np.full(rows.size, np.nan)
+            no_pos = np.full(rows.size, -1, dtype=np.intp)
+            return missing, no_pos, missing.copy(), no_pos.copy(), np.zeros(rows.size, np.intp)
+        sub = series[np.ix_(rows, cols)]
+        present = ~np.isnan(sub)
+        counts = present.sum(axis=1)
+        has_value = counts > 0
+        first = np.argmax(present, axis=1)
+        last = cols.size - 1 - np.argmax(present[:, ::-1], axis=1)
+        index = np.arange(rows.size)
+        return (
+            np.where(has_value, sub[index, first], np.nan),
+            np.where(has_value, cols[first], -1),
+            np.where(has_value, sub[index, last], np.nan),
+            np.where(has_value, cols[last], -1),
+            counts,
+        )
+
+    def latest(
+        self, gender: str, rows: np.ndarray, positions: list[int] | None = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the latest non-missing value per row among the period `positions` and
+        the period position it came from. Rows without a value get NaN and -1.
+        """
+        _, _, values, period_pos, _ = self.edges(gender, rows, positions)
+        return values, period_pos
+
+    def value_index(
+        self,
+        gender: str,
+        rows_key: str,
+        rows: np.ndarray,
+        positions: list[int] | None = None,
+    ) -> "ValueIndex":
+        """
+        Sorted index over each row's latest value among `positions`, cached per
+        (gender, rows_key, positions). `rows_key` must identify `rows`, e.g. the
+        municipality type they were selected by.
+        """
+        key = (gender, rows_key, tuple(positions) if positions is not None else None)
+        index = self._value_indexes.get(key)
+        if index is None:
+            values, period_pos = self.latest(gender, rows, positions)
+            index = ValueIndex(values, period_pos)
+            self._value_indexes[key] = index
+        return index
+
+    def to_grouped(
+        self,
+        municipality_ids: list[str],
+        gender: str,
+        rows: Iterable[int] | None = None,
+        years: Iterable[str] | None = None,
+    ) -> dict[str, dict[str, float]]:
+        """Returns {municipality_id: {period: value}} for the non-missing values."""
+        series = self.series(gender)
+        if series is None:
+            return {}
+        cols = np.asarray(self.period_positions(years), dtype=np.intp)
+        periods = [self.periods[p] for p in cols.tolist()]
+        grouped: dict[str, dict[str, float]] = {}
+        row_ids = range(series.shape[0]) if rows is None else rows
+        for r in row_ids:
+            row = series[r, cols]
+            present = np.flatnonzero(~np.isnan(row))
+            if present.size:
+                grouped[municipality_ids[r]] = {
+                    periods[p]: float(row[p]) for p in present.tolist()
+                }
+        return grouped
+
+
+class ValueIndex:
+    """
+    Latest values of a row selection sorted ascending, so threshold and percentile
+    queries are binary searches. Positions refer to the row selection the index was
+    built from; rows without a value are left out.
+    """
+
+    def __init__(self, values: np.ndarray, period_pos: np.ndarray) -> None:
+        present = np.flatnonzero(~np.isnan(values))
+        order = present[np.argsort(values[present], kind="stable")]
+        self.order = order
+        self.sorted_values = values[order]
+        self.values = values
+        self.period_pos = period_pos
+
+    def __len__(self) -> int:
+        return int(self.order.size)
+
+    def above(self, cutoff: float) -> np.ndarray:
+        return self.order[np.searchsorted(self.sorted_values, cutoff, side="right") :]
+
+    def below(self, cutoff: float) -> np.ndarray:
+        return self.order[: np.searchsorted(self.sorted_values, cutoff, side="left")]
+
+    def between(self, lower: float, upper: float) -> np.ndarray:
+        """Positions with lower <= value <= upper."""
+        start = np.searchsorted(self.sorted_values, lower, side="left")
+        stop = np.searchsorted(self.sorted_values, upper, side="right")
+        return self.order[start:stop]
+
+    def top_percent(self, percent: float) -> np.ndarray:
+        """The highest `percent` % of values, including every value tied with the last one."""
+        k = self._percent_count(percent)
+        if k == 0:
+            return self.order[:0]
+        threshold = self.sorted_values[len(self) - k]
+        return self.order[np.searchsorted(self.sorted_values, threshold, side="left") :]
+
+    def bottom_percent(self, percent: float) -> np.ndarray:
+        """The lowest `percent` % of values, including every value tied with the last one."""
+        k = self._percent_count(percent)
+        if k == 0:
+            return self.order[:0]
+        threshold = self.sorted_values[k - 1]
+        return self.order[: np.searchsorted(self.sorted_values, threshold, side="right")]
+
+    def _percent_count(self, percent: float) -> int:
+        percent = min(max(percent, 0.0), 100.0)
+        return int(np.ceil(len(self) * percent / 100.0 - 1e-9))
+
+
+class ValueStore:
+    """
+    Holds parsed KPI data as KpiFrames, one per KPI, evicting the least recently used
+    frames once their total size exceeds the memory budget.
+    """
+
+    def __init__(self, municipalities: Mapping[str, Mapping[str, Any]], memory_budget: int) -> None:
+        self.municipality_ids: list[str] = list(municipalities)
+        self.row_index: dict[str, int] = {m: i for i, m in enumerate(self.municipality_ids)}
+        # Position of each row when municipality IDs are sorted, used to break ties.
+        self.id_rank = np.argsort(np.argsort(np.array(self.municipality_ids, dtype=object)))
+        self.municipality_types = np.array(
+            [str(municipalities[m].get("type") or "") for m in self.municipality_ids]
+        )
+        self.memory_budget = memory_budget
+        self._frames: OrderedDict[str, KpiFrame] = OrderedDict()
+        self._type_rows: dict[str, np.ndarray] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(f.nbytes for f in self._frames.values())
+
+    def rows_of_type(self, municipality_type: str | None) -> np.ndarray:
+        """Row indices for a municipality type; all rows when the type is empty."""
+        key = municipality_type or ""
+        rows = self._type_rows.get(key)
+        if rows is None:
+            if key:
+                rows = np.flatnonzero(self.municipality_types == key)
+            else:
+                rows = np.arange(len(self.municipality_ids))
+            self._type_rows[key] = rows
+        return rows
+
+    def rows_for(self, municipality_ids: Iterable[str]) -> np.ndarray:
+        return np.array(
+            [self.row_index[m] for m in municipality_ids if m in self.row_index], dtype=np.intp
+        )
+
+    def get(self, kpi_id: str, years: list[str], max_age: float | None = None) -> KpiFrame | None:
+        """
+        The frame for a KPI if it covers `years`. A frame whose data is older than
+        `max_age` seconds is dropped, so the next ingest starts from fresh data only.
+        """
+        frame = self._frames.get(kpi_id)
+        if frame is not None and max_age is not None and time.time() - frame.loaded_at > max_age:
+            del self._frames[kpi_id]
+            self.expirations += 1
+            frame = None
+        if frame is None or not frame.covers(years):
+            self.misses += 1
+            return None
+        self._frames.move_to_end(kpi_id)
+        self.hits += 1
+        return frame
+
+    def ingest(
+        self, kpi_id: str, data: DataTable, years: list[str], fetched_at: float | None = None
+    ) -> KpiFrame:
+        """
+        Loads a decoded Kolada /data response for one KPI into a frame and merges it with
+        any frame already held for the KPI. `years` is what was requested ([] for all),
+        `fetched_at` when the response came from Kolada (now if not given).
+        """
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        # Row-level columns first, then expanded to one entry per value and masked.
+        n = len(data)
+        row_of = np.fromiter(
+            (self.row_index.get(m, -1) for m in data.municipality), dtype=np.intp, count=n
+        )
+        keep = (row_of >= 0) & np.fromiter(
+            ((not k or k == kpi_id) and p is not None for k, p in zip(data.kpi, data.period)),
+            dtype=bool,
+            count=n,
+        )
+        value_row = np.repeat(
+            np.arange(n), np.diff(np.frombuffer(data.value_offsets, dtype=np.uint32))
+        )
+        genders = np.fromiter(
+            (GENDER_INDEX.get(g, -1) for g in data.gender),  # type: ignore[arg-type]
+            dtype=np.intp,
+            count=len(data.gender),
+        )
+        mask = keep[value_row] & (genders >= 0) & (np.frombuffer(data.kind, dtype=np.uint8) != NULL)
+        value_row = value_row[mask]
+        row_periods = [str(p) for p in data.period]
+        period_names = {row_periods[r] for r in np.unique(value_row).tolist()}
+
+        previous = self._frames.get(kpi_id)
+        periods = period_names | set(years)
+        if previous is not None:
+            periods |= set(previous.periods)
+        sorted_periods = sorted(periods)
+        period_pos = {p: i for i, p in enumerate(sorted_periods)}
+        array = np.full(
+            (len(self.municipality_ids), len(sorted_periods), len(GENDERS)), np.nan
+        )
+        covered: frozenset[str] | None = frozenset(years) if years else None
+        if previous is not None:
+            old_pos = [period_pos[p] for p in previous.periods]
+            array[:, old_pos, :] = previous.values
+            if covered is not None and previous.covered_years is not None:
+                covered = covered | previous.covered_years
+            elif previous.covered_years is None:
+                covered = None
+        # Newly fetched periods replace whatever was held for them before.
+        fetched = [period_pos[p] for p in (years or sorted(period_names))]
+        array[:, fetched, :] = np.nan
+        if value_row.size:
+            row_period_pos = np.array([period_pos.get(p, 0) for p in row_periods], dtype=np.intp)
+            array[row_of[value_row], row_period_pos[value_row], genders[mask]] = np.frombuffer(
+                data.value, dtype=np.float64
+            )[mask]
+
+        # A merged frame is as old as the oldest data it keeps from the previous one.
+        loaded_at = fetched_at
+        if previous is not None and years and not set(years).issuperset(previous.periods):
+            loaded_at = min(loaded_at, previous.loaded_at)
+        frame = KpiFrame(kpi_id, sorted_periods, array, covered, loaded_at)
+        self._frames[kpi_id] = frame
+        self._frames.move_to_end(kpi_id)
+        self._evict(keep=kpi_id)
+        return frame
+
+    def _evict(self, keep: str) -> None:
+        total = self.nbytes
+        while total > self.memory_budget and len(self._frames) > 1:
+            oldest = next(iter(self._frames))
+            if oldest == keep:
+                break
+            total -= self._frames.pop(oldest).nbytes
+            self.evictions += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "frames": len(self._frames),
+            "bytes": self.nbytes,
+            "memory_budget": self.memory_budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def clear(self) -> None:
+        self._frames.clear()
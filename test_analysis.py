@@ -0,0 +1,166 @@
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+from analysis import (
+    ordered_window,
+    pairwise_correlation,
+    rank_slices,
+    rowwise_correlation,
+    trend_metrics,
+)
+
+
+def _old_rank_slice(
+    values: list[float], ids: list[str], order: str, limit: int
+) -> tuple[list[str], list[str], list[str]]:
+    # The sort-based slicing analyze_kpi_across_municipalities used before rank_slices.
+    is_desc = order.lower() == "desc"
+    sorted_data = sorted(zip(values, ids), reverse=is_desc)
+    n = len(sorted_data)
+    if n == 0:
+        return [], [], []
+    safe_limit = max(1, min(limit, n))
+    top_list = sorted_data[:safe_limit]
+    bottom_list = list(reversed(sorted_data[-safe_limit:]))
+    median_start = max(0, (n - 1) // 2 - (safe_limit // 2))
+    median_start = min(median_start, n - safe_limit)
+    median_list = sorted_data[median_start : median_start + safe_limit]
+    return tuple([m for _, m in part] for part in (top_list, bottom_list, median_list))
+
+
+@pytest.mark.parametrize("order", ["desc", "asc"])
+@pytest.mark.parametrize("n", [0, 1, 2, 7, 50, 290])
+@pytest.mark.parametrize("limit", [0, 1, 3, 10, 400])
+def test_rank_slices_match_old_sort(order: str, n: int, limit: int) -> None:
+    rng = np.random.default_rng(n * 1000 + limit)
+    # Few distinct values, so most of the ordering comes down to the tiebreak.
+    values = rng.integers(0, 4, n).astype(float)
+    ids = [f"{i:04d}" for i in rng.permutation(n)]
+    id_rank = np.argsort(np.argsort(ids)) if n else np.array([], dtype=np.intp)
+
+    slices = rank_slices(values, id_rank, order, limit)
+    expected = _old_rank_slice(values.tolist(), ids, order, limit)
+    assert tuple([ids[i] for i in part] for part in slices) == expected
+
+
+def test_ordered_window_takes_ties_at_the_edges() -> None:
+    values = np.array([2.0, 1.0, 2.0, 2.0, 0.0, 2.0])
+    tiebreak = np.array([5, 0, 3, 1, 4, 2])
+    assert ordered_window(values, tiebreak, 1, 4).tolist() == [1, 3, 5]
+    assert ordered_window(values, tiebreak, 4, 10).tolist() == [2, 0]
+    assert ordered_window(values, tiebreak, 3, 3).tolist() == []
+
+
+# Columns with gaps: a and b overlap on four rows, c on only one row with a and on none
+# with d, and e is constant.
+FRAME = np.array(
+    [
+        # a, b, c, d, e
+        [1.0, 2.0, 7.0, np.nan, 5.0],
+        [2.0, 1.5, np.nan, 4.0, 5.0],
+        [4.0, np.nan, np.nan, 1.0, 5.0],
+        [np.nan, 9.0, np.nan, 2.0, 5.0],
+        [3.0, 6.0, np.nan, np.nan, 5.0],
+        [8.0, 3.0, np.nan, 3.0, 5.0],
+    ]
+)
+
+
+def _overlap(x: np.ndarray, y: np.ndarray) -> tuple[list[float], list[float]]:
+    both = ~np.isnan(x) & ~np.isnan(y)
+    return x[both].tolist(), y[both].tolist()
+
+
+def test_pairwise_correlation_matches_statistics() -> None:
+    r, n = pairwise_correlation(FRAME)
+    for i in range(FRAME.shape[1]):
+        for j in range(FRAME.shape[1]):
+            x, y = _overlap(FRAME[:, i], FRAME[:, j])
+            assert n[i, j] == len(x)
+            try:
+                expected = statistics.correlation(x, y)
+            except statistics.StatisticsError:
+                # Fewer than two shared rows, or a constant series.
+                assert math.isnan(r[i, j]), (i, j)
+            else:
+                assert r[i, j] == pytest.approx(expected), (i, j)
+    assert n[2, 3] == 0 and n[0, 2] == 1
+    assert np.isnan(r[:, 4]).all() and np.isnan(r[4, :]).all()
+
+
+def test_spearman_correlates_ranks() -> None:
+    full = FRAME[[0, 1, 4, 5]][:, [0, 1]]
+    r, n = pairwise_correlation(full, "spearman")
+    ranks = [np.argsort(np.argsort(column)) + 1.0 for column in full.T]
+    assert n[0, 1] == 4
+    assert r[0, 1] == pytest.approx(statistics.correlation(*(list(c) for c in ranks)))
+    # Monotonic but not linear: exactly 1 by rank.
+    r, _ = pairwise_correlation(np.array([[1.0, 1.0], [2.0, 8.0], [3.0, 27.0]]), "spearman")
+    assert r[0, 1] == pytest.approx(1.0)
+
+
+def test_rowwise_correlation_matches_statistics() -> None:
+    a = FRAME.T
+    b = FRAME[:, [1, 0, 3, 2, 0]].T
+    r, n = rowwise_correlation(a, b)
+    for i in range(a.shape[0]):
+        x, y = _overlap(a[i], b[i])
+        assert n[i] == len(x)
+        if len(x) >= 2 and len(set(x)) > 1 and len(set(y)) > 1:
+            assert r[i] == pytest.approx(statistics.correlation(x, y))
+        else:
+            assert math.isnan(r[i])
+    # a with b (four shared rows) is defined; c with d (none) and e (constant) are not.
+    assert not np.isnan(r[0]) and np.isnan(r[2]) and np.isnan(r[4])
+
+
+YEARS = np.array([2018.0, 2019.0, 2020.0, 2021.0, 2022.0])
+SERIES = np.array(
+    [
+        [100.0, np.nan, 121.0, np.nan, 146.41],  # 10 % a year, with gaps
+        [0.0, 2.0, 1.0, 3.0, 5.0],  # zero start
+        [-4.0, -2.0, np.nan, 1.0, 2.0],  # negative start
+        [np.nan, np.nan, 7.0, np.nan, np.nan],  # a single year
+        [np.nan] * 5,  # no data
+        [5.0, 3.0, np.nan, 3.0, 6.0],  # down, flat across the gap, up
+    ]
+)
+
+
+def test_trend_slope_matches_statistics_across_gaps() -> None:
+    trends = trend_metrics(SERIES, YEARS)
+    for i, row in enumerate(SERIES):
+        present = ~np.isnan(row)
+        assert trends["observations"][i] == present.sum()
+        if present.sum() < 2:
+            assert np.isnan(trends["slope"][i])
+            continue
+        fit = statistics.linear_regression(YEARS[present].tolist(), row[present].tolist())
+        assert trends["slope"][i] == pytest.approx(fit.slope)
+    assert trends["first"].tolist() == [0, 0, 0, 2, -1, 0]
+    assert trends["last"].tolist() == [4, 4, 4, 2, -1, 4]
+
+
+def test_trend_cagr_needs_positive_ends() -> None:
+    cagr = trend_metrics(SERIES, YEARS)["cagr"]
+    # Four years apart, however many are missing between them.
+    assert cagr[0] == pytest.approx(0.10)
+    assert cagr[5] == pytest.approx((6.0 / 5.0) ** 0.25 - 1.0)
+    assert np.isnan(cagr[[1, 2, 3, 4]]).all()
+
+
+def test_trend_changes_are_per_year_across_gaps() -> None:
+    trends = trend_metrics(SERIES, YEARS)
+    # Row 0 grows by 21 over two years and 25.41 over the next two.
+    assert trends["volatility"][0] == pytest.approx(statistics.stdev([10.5, 12.705]))
+    assert trends["trend_breaks"][0] == 0
+    # Row 5: -2, then 0 over two years (no direction), then +3: one reversal.
+    assert trends["volatility"][5] == pytest.approx(statistics.stdev([-2.0, 0.0, 3.0]))
+    assert trends["trend_breaks"][5] == 1
+    assert trends["trend_breaks"][1] == 2
+    for key in ("slope", "cagr", "volatility", "trend_breaks"):
+        assert np.isnan(trends[key][[3, 4]]).all(), key
+    assert trends["first_values"][3] == trends["last_values"][3] == 7.0
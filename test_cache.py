@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any
+
+import pytest
+
+import cache
+from cache import ResponseCache, make_data_key
+
+
+def _fetch(value: Any):
+    async def fetch() -> Any:
+        return value
+
+    return fetch
+
+
+def test_disk_store_drops_the_oldest_over_its_size(tmp_path: Any) -> None:
+    path = os.path.join(tmp_path, "cache.sqlite")
+    body = {"values": ["x" * 100]}
+    size = len(json.dumps(body, separators=(",", ":")))
+    store = cache._DiskStore(path, max_bytes=3 * size)
+    for i in range(5):
+        store.put(f"k{i}", 1000.0 + i, body)
+
+    assert store.nbytes == 3 * size
+    assert store.evictions == 2
+    assert store.get("k0") is None and store.get("k1") is None
+    assert store.get("k4") == (1004.0, body)
+    # Replacing an entry counts only its new size.
+    store.put("k4", 1005.0, {"values": []})
+    assert store.nbytes == 2 * size + len('{"values":[]}')
+    store.close()
+
+
+@pytest.mark.parametrize("error", [KeyError, TypeError, UnicodeDecodeError])
+def test_unreadable_disk_entries_are_misses(tmp_path: Any, error: type[Exception]) -> None:
+    def loads(raw: bytes) -> Any:
+        if error is UnicodeDecodeError:
+            raw.decode("ascii")
+        raise error("stale layout")
+
+    path = os.path.join(tmp_path, "cache.sqlite")
+    key = make_data_key("N1", ["0114"], ["2022"])
+
+    async def scenario() -> None:
+        writer = ResponseCache(10, 60.0, disk_path=path)
+        await writer.get_or_fetch(key, _fetch({"values": ["ö"]}))
+        writer.close()
+
+        reader = ResponseCache(10, 60.0, disk_path=path, loads=loads)
+        assert await reader.get_or_fetch(key, _fetch({"values": []})) == {"values": []}
+        assert reader.stats()["disk_hits"] == 0
+        reader.close()
+
+    asyncio.run(scenario())
+    # The unreadable row was deleted and replaced by the refetched one.
+    store = cache._DiskStore(path)
+    assert store.get(cache._encode_key(key))[1] == {"values": []}
+    store.close()
+
+
+def test_expired_disk_entries_are_purged_while_running(
+    tmp_path: Any, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(cache, "DISK_PURGE_INTERVAL", 0.0)
+    path = os.path.join(tmp_path, "cache.sqlite")
+    responses = ResponseCache(10, 60.0, disk_path=path)
+    assert responses._disk is not None
+    responses._disk.put("old", time.time() - 120, {"values": []})
+
+    asyncio.run(responses.get_or_fetch(make_data_key("N1", None, None), _fetch({"values": []})))
+    assert responses._disk.get("old") is None
+    assert responses.stats()["disk_bytes"] == len('{"values":[]}')
+    responses.close()
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import codec
+from codec import FLOAT, INT, NULL, DataTable, decode_data_page, decode_data_table
+
+PAGE = {
+    "values": [
+        {
+            "kpi": "N00001",
+            "municipality": "0114",
+            "period": 2022,
+            "values": [
+                {"gender": "T", "value": 12.5, "count": 1, "status": ""},
+                {"gender": "K", "value": 7, "count": 1, "status": None},
+                {"gender": "M", "value": None, "count": 0, "status": "Saknas"},
+            ],
+        },
+        {"kpi": "N00001", "municipality": "0115", "period": 2023, "values": []},
+    ],
+    "next_page": "https://api.kolada.se/v2/data/kpi/N00001?page=2",
+}
+
+
+@pytest.fixture(params=["msgspec", "json"])
+def decoder(request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch) -> str:
+    # Every test runs with msgspec, when installed, and with the stdlib fallback.
+    if request.param == "json":
+        monkeypatch.setattr(codec, "msgspec", None)
+    elif codec.msgspec is None:
+        pytest.skip("msgspec is not installed")
+    assert codec.decoder_name() == request.param
+    return request.param
+
+
+def test_data_page_round_trip(decoder: str) -> None:
+    table, next_page = decode_data_page(json.dumps(PAGE).encode())
+    assert next_page == PAGE["next_page"]
+    assert len(table) == 2
+    names = {"0114": {"title": "Upplands Väsby"}}
+    response = table.to_response(names)
+    assert [item["municipality_name"] for item in response["values"]] == [
+        "Upplands Väsby",
+        "Kommun 0115",
+    ]
+    assert table.to_response(names) is response
+    # Integers and nulls come back out as they went in, and the response left them alone.
+    assert json.loads(table.to_json()) == {"count": 2, "values": PAGE["values"]}
+
+    assert list(table.value_offsets) == [0, 3, 3]
+    assert list(table.kind) == [FLOAT, INT, NULL]
+    assert table.gender == ["T", "K", "M"] and table.period == [2022, 2023]
+    # Built from the columns now, and the same as before.
+    assert json.loads(table.to_json()) == {"count": 2, "values": PAGE["values"]}
+    assert table.to_response({})["values"][0] == dict(
+        PAGE["values"][0], municipality_name="Kommun 0114"
+    )
+
+
+def test_take_and_concat_keep_value_entries(decoder: str) -> None:
+    table = decode_data_table(json.dumps(PAGE).encode())
+    swapped = table.take([1, 0])
+    assert swapped.municipality == ["0115", "0114"]
+    assert list(swapped.value_offsets) == [0, 0, 3]
+    joined = DataTable.concat([table, swapped])
+    assert len(joined) == 4
+    items = json.loads(joined.to_json())["values"]
+    assert items == PAGE["values"] + PAGE["values"][::-1]
+
+
+def test_malformed_page(decoder: str) -> None:
+    for raw in (b"[1, 2]", b"{not json", b'{"values": {"kpi": "N1"}}', b'{"values": [1]}'):
+        with pytest.raises(ValueError, match="malformed"):
+            decode_data_page(raw)
+
+
+def test_loose_fields(decoder: str) -> None:
+    page = {
+        "values": [
+            {
+                "kpi": "N1",
+                "period": [2022],
+                "values": [{"gender": "T", "value": "1.5"}, "x", {"value": "n/a"}],
+            },
+            {"kpi": "N1", "municipality": "0114", "values": None},
+        ]
+    }
+    table, next_page = decode_data_page(json.dumps(page).encode())
+    assert next_page is None
+    assert table.municipality == ["", "0114"] and table.period == [None, None]
+    # Entries that are not objects are left out of the columns.
+    assert list(table.value_offsets) == [0, 2, 2]
+    assert list(table.value) == [1.5, 0.0] and list(table.kind) == [FLOAT, NULL]
+    assert table.gender == ["T", None] and table.count == [None, None]
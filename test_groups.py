@@ -0,0 +1,122 @@
+import json
+import math
+import statistics
+
+import numpy as np
+import pytest
+
+from analysis import group_stats
+from codec import DataTable, decode_data_table
+from groups import GroupIndex
+from store import ValueStore
+
+MUNICIPALITIES = {m: {"type": "K"} for m in ("0114", "0115", "0117", "0120", "0123")}
+GROUPS = [
+    {"id": "G1", "members": ["0114", "0115", "0117"]},
+    {"id": "G2", "members": ["0117", "0120", "0123"]},
+    # Members the store does not know, and no members at all.
+    {"id": "G3", "members": ["9999"]},
+    {"id": "G4", "members": []},
+]
+
+
+def _table(kpi_id: str, values: dict[str, float]) -> DataTable:
+    # A decoded Kolada /data response for 2022, gender T, from {municipality: value}.
+    rows = [
+        {
+            "kpi": kpi_id,
+            "municipality": m,
+            "period": 2022,
+            "values": [{"gender": "T", "value": v, "count": 1, "status": ""}],
+        }
+        for m, v in values.items()
+    ]
+    return decode_data_table(json.dumps({"values": rows}).encode())
+
+
+def test_group_stats_match_statistics() -> None:
+    membership = np.array(
+        [
+            [True, True, True, True, False],
+            [False, True, False, True, True],
+            [False, False, False, False, True],
+            [False, False, False, False, False],
+        ]
+    )
+    values = np.array([4.0, 1.0, 7.0, 2.0, np.nan])
+    weights = np.array([1.0, 3.0, np.nan, 0.0, 5.0])
+    stats = group_stats(membership, values, weights)
+
+    assert stats["count"].tolist() == [4, 2, 0, 0]
+    members = [4.0, 1.0, 7.0, 2.0]
+    assert stats["mean"][0] == pytest.approx(statistics.fmean(members))
+    assert stats["std"][0] == pytest.approx(statistics.stdev(members))
+    assert (stats["min"][0], stats["max"][0]) == (1.0, 7.0)
+    p25, p50, p75 = statistics.quantiles(members, n=4, method="inclusive")
+    assert [stats[p][0] for p in ("p25", "p50", "p75")] == pytest.approx([p25, p50, p75])
+    assert stats["p50"][1] == pytest.approx(1.5)
+
+    # Only members with a positive weight count towards the weighted mean: 0114 and 0115.
+    assert stats["weighted_mean"][0] == pytest.approx((4.0 * 1.0 + 1.0 * 3.0) / 4.0)
+    assert stats["weight"].tolist()[:2] == [4.0, 3.0]
+    assert stats["weighted_mean"][1] == pytest.approx(1.0)
+
+    # Group 2's only member has no value, group 3 has no members.
+    for g in (2, 3):
+        for key in ("mean", "std", "min", "max", "p25", "p50", "p75", "weighted_mean"):
+            assert math.isnan(stats[key][g]), (g, key)
+        assert stats["weight"][g] == 0.0
+
+
+def test_group_stats_without_weights() -> None:
+    stats = group_stats(np.array([[True, True]]), np.array([3.0, 5.0]))
+    assert "weighted_mean" not in stats and "weight" not in stats
+    assert stats["mean"][0] == 4.0
+    # A single value has no sample standard deviation.
+    assert math.isnan(group_stats(np.array([[True]]), np.array([3.0]))["std"][0])
+
+
+def test_rollup_is_reused_until_the_frame_is_replaced() -> None:
+    store = ValueStore(MUNICIPALITIES, 1 << 20)
+    groups = GroupIndex(GROUPS, store.row_index, cache_size=4)
+    values = {"0114": 1.0, "0115": 2.0, "0117": 3.0, "0120": 4.0, "0123": 5.0}
+    frame = store.ingest("N1", _table("N1", values), ["2022"])
+    positions = frame.period_positions(["2022"])
+
+    stats = groups.rollup(frame, "T", positions)
+    assert stats["mean"].tolist()[:2] == [2.0, 4.0]
+    assert stats["count"].tolist()[2:] == [0, 0]
+    assert groups.rollup(frame, "T", positions) is stats
+    assert (groups.hits, groups.misses) == (1, 1)
+
+    # Refetching replaces the store's frame; the cached rollup is of the old one.
+    fresh = store.ingest("N1", _table("N1", {**values, "0114": 10.0}), ["2022"])
+    assert store.get("N1", ["2022"]) is fresh
+    updated = groups.rollup(fresh, "T", positions)
+    assert updated is not stats
+    assert updated["mean"][0] == pytest.approx(5.0)
+    assert (groups.hits, groups.misses) == (1, 2)
+
+    # So does replacing the weighting frame.
+    population = store.ingest("N2", _table("N2", dict.fromkeys(values, 1.0)), ["2022"])
+    weighted = groups.rollup(fresh, "T", positions, population, positions)
+    assert weighted["weighted_mean"][0] == pytest.approx(5.0)
+    assert groups.rollup(fresh, "T", positions, population, positions) is weighted
+    population = store.ingest("N2", _table("N2", {**values, "0114": 0.0}), ["2022"])
+    reweighted = groups.rollup(fresh, "T", positions, population, positions)
+    # 0114 now weighs nothing: (2 * 2 + 3 * 3) / 5.
+    assert reweighted["weighted_mean"][0] == pytest.approx(13.0 / 5.0)
+    assert groups.stats()["cached_rollups"] == 2
+
+
+def test_rollup_cache_drops_the_least_recently_used() -> None:
+    store = ValueStore(MUNICIPALITIES, 1 << 20)
+    groups = GroupIndex(GROUPS, store.row_index, cache_size=1)
+    first = store.ingest("N1", _table("N1", {"0114": 1.0}), ["2022"])
+    second = store.ingest("N2", _table("N2", {"0114": 2.0}), ["2022"])
+    positions = first.period_positions()
+    groups.rollup(first, "T", positions)
+    groups.rollup(second, "T", positions)
+    groups.rollup(first, "T", positions)
+    assert (groups.hits, groups.misses) == (0, 3)
+    assert groups.stats()["cached_rollups"] == 1
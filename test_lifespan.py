@@ -0,0 +1,60 @@
+import asyncio
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import pytest
+
+import lifespan
+from benchmarks.fake_kolada import FakeKolada
+from cache import ResponseCache
+from lifespan import LifespanContext, Readiness, ServerServices, build_context, load_catalog
+from popularity import PopularityTracker
+from upstream import create_http_client
+
+
+def _empty_context(handle: httpx.MockTransport) -> LifespanContext:
+    # A worker's context at a cold start, before load_catalog() has run.
+    services: ServerServices = {
+        "http_client": create_http_client(handle),
+        "data_cache": ResponseCache(100, 600),
+        "popularity": PopularityTracker(3600),
+        "mirror": None,
+        "readiness": Readiness(),
+    }
+    return build_context([], [], services, time.time())
+
+
+def test_shared_catalog_is_fetched_by_one_worker(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(lifespan, "SHARED_CATALOG", True)
+    monkeypatch.setattr(lifespan, "SHARED_CATALOG_PATH", str(tmp_path / "catalog.map"))
+    fake = FakeKolada(n_kpis=50, n_municipalities=30, n_regions=3)
+    paths: Counter[str] = Counter()
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        paths[request.url.path] += 1
+        # Slow enough that both workers start while the first one is fetching.
+        await asyncio.sleep(0.05)
+        return await fake.handle(request)
+
+    async def run() -> None:
+        workers = [_empty_context(httpx.MockTransport(handle)) for _ in range(2)]
+        tasks = [asyncio.create_task(load_catalog(ctx)) for ctx in workers]
+        try:
+            for ctx in workers:
+                assert await ctx["readiness"].wait("catalog", timeout=10)
+                assert ctx["readiness"].is_ready()
+                assert len(ctx["kpi_map"]) == 50 and len(ctx["municipality_map"]) == 33
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for ctx in workers:
+                await ctx["http_client"].aclose()
+
+    asyncio.run(run())
+    assert paths["/v2/municipality"] == 1
+    assert paths["/v2/municipality_groups"] == 1
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+import mirror
+from codec import DataTable, decode_data_table
+from mirror import DataMirror
+
+
+def _table(kpi_id: str) -> DataTable:
+    rows = [
+        {
+            "kpi": kpi_id,
+            "municipality": m,
+            "period": 2022,
+            "values": [{"gender": "T", "value": 1.5, "count": 1, "status": ""}],
+        }
+        for m in ("0114", "0115")
+    ]
+    return decode_data_table(json.dumps({"values": rows}).encode())
+
+
+def test_reads_skip_unmirrored_and_expired_kpis(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    local = DataMirror(str(tmp_path / "mirror.sqlite3"), max_age=60)
+    local.replace("N1", "2024-01-01", _table("N1"))
+
+    def no_query(*args: object) -> None:
+        raise AssertionError("the database was queried")
+
+    async def run() -> None:
+        table = await local.read("N1", ["0114"], ["2022"])
+        assert table is not None and table.municipality == ["0114"]
+        # Not mirrored: answered from memory, without a database query.
+        monkeypatch.setattr(local, "query", no_query)
+        assert await local.read("N2", None, []) is None
+        # Synced longer ago than max_age.
+        local._synced_at["N1"] = time.time() - 120
+        assert await local.read("N1", None, []) is None
+
+    try:
+        asyncio.run(run())
+    finally:
+        local.close()
+
+
+def test_reads_see_syncs_by_other_processes(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = str(tmp_path / "mirror.sqlite3")
+    reader = DataMirror(path)
+    writer = DataMirror(path)
+    writer.replace("N1", None, _table("N1"))
+
+    async def run() -> None:
+        assert await reader.read("N1", None, []) is None
+        monkeypatch.setattr(mirror, "SYNCED_RELOAD_INTERVAL", 0.0)
+        table = await reader.read("N1", None, [])
+        assert table is not None and len(table) == 2
+
+    try:
+        asyncio.run(run())
+    finally:
+        reader.close()
+        writer.close()
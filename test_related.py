@@ -0,0 +1,77 @@
+import random
+from typing import Any, cast
+
+import numpy as np
+import pytest
+
+import related
+from related import RelatedKpis
+from search import PackedPostings, SearchIndex
+
+WORDS = ["kostnad", "elever", "boende", "invånare", "skola", "omsorg", "andel", "antal"]
+
+
+def _kpis(n: int) -> list[dict[str, Any]]:
+    rng = random.Random(n)
+    kpis = []
+    for i in range(n):
+        # A small vocabulary, so many KPIs share terms and some are identical.
+        title = " ".join(rng.sample(WORDS, rng.randint(1, 2)))
+        kpis.append({"id": f"N{i:05d}", "title": title, "description": ""})
+    kpis.append({"id": "N99999", "title": "", "description": ""})
+    return kpis
+
+
+def _brute_force(index: SearchIndex, k: int) -> tuple[np.ndarray, np.ndarray]:
+    # Neighbours and scores from the full cosine similarity matrix, best first, ties by column.
+    postings = cast(PackedPostings, index.postings)
+    n = len(index.doc_ids)
+    vectors = np.zeros((n, len(index.vocabulary)))
+    for j, term in enumerate(index.vocabulary):
+        docs, impacts = postings[term]
+        vectors[list(docs), j] = impacts
+    norms = np.linalg.norm(vectors, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        unit = np.nan_to_num(vectors / norms[:, np.newaxis])
+    sims = unit @ unit.T
+    np.fill_diagonal(sims, 0.0)
+    neighbours = np.full((n, k), -1)
+    scores = np.zeros((n, k))
+    for i in range(n):
+        ranked = sorted(range(n), key=lambda j: (-round(sims[i, j], 6), j))
+        ranked = [j for j in ranked if sims[i, j] > 1e-9][:k]
+        neighbours[i, : len(ranked)] = ranked
+        scores[i, : len(ranked)] = sims[i, ranked]
+    return neighbours, scores
+
+
+@pytest.mark.parametrize("dense_bytes", [0, 1 << 20])
+def test_neighbours_match_brute_force(
+    monkeypatch: pytest.MonkeyPatch, dense_bytes: int
+) -> None:
+    # All terms multiplied out densely, or all expanded sparsely in small blocks.
+    monkeypatch.setattr(related, "DENSE_TERM_BYTES", dense_bytes)
+    monkeypatch.setattr(related, "BLOCK_CELLS", 200)
+    monkeypatch.setattr(related, "BLOCK_PAIRS", 50)
+    index = SearchIndex.build(_kpis(60))
+    built = RelatedKpis.build(index, 5)
+    neighbours, scores = _brute_force(index, 5)
+
+    assert built.neighbours.tolist() == neighbours.tolist()
+    np.testing.assert_allclose(built.scores, scores, atol=1e-5)
+    # A KPI without terms has no neighbours.
+    assert built.related("N99999", 5) == []
+    assert built.related("N00000", 2) == [
+        (index.doc_ids[d], pytest.approx(float(s), abs=1e-5))
+        for d, s in zip(neighbours[0, :2], scores[0, :2])
+        if d >= 0
+    ]
+    assert built.related("N77777", 5) is None
+
+
+def test_more_neighbours_than_documents() -> None:
+    index = SearchIndex.build(_kpis(3))
+    built = RelatedKpis.build(index, 10)
+    neighbours, scores = _brute_force(index, 10)
+    assert built.neighbours.tolist() == neighbours.tolist()
+    np.testing.assert_allclose(built.scores, scores, atol=1e-5)
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from scheduler import AdaptiveLimiter, CircuitBreaker, UpstreamScheduler
+
+
+def _client(
+    statuses: list[int],
+    latency: float = 0.0,
+    retries: int = 3,
+    threshold: int = 10,
+    deadline: float = 0.0,
+) -> tuple[httpx.AsyncClient, list[float]]:
+    # A client whose upstream answers with `statuses` in turn (the last one repeating),
+    # and the times the requests reached it.
+    calls: list[float] = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        calls.append(time.monotonic())
+        await asyncio.sleep(latency)
+        return httpx.Response(statuses[min(len(calls), len(statuses)) - 1])
+
+    scheduler = UpstreamScheduler(
+        httpx.MockTransport(handle),
+        AdaptiveLimiter(4, 1, 8, 0.5),
+        CircuitBreaker(threshold, 60.0),
+        retries,
+        0.001,
+        0.001,
+        deadline=deadline,
+    )
+    return httpx.AsyncClient(transport=scheduler, base_url="http://kolada.test"), calls
+
+
+def test_breaker_state_transitions() -> None:
+    breaker = CircuitBreaker(threshold=2, reset_timeout=0.05)
+    assert breaker.allow() and breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    # One trial request once the reset timeout has passed; its failure reopens at once.
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    # A trial that ends without an outcome frees the way for another one.
+    breaker.abandon()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+    assert breaker.allow()
+
+
+def test_retries_until_success() -> None:
+    async def run() -> None:
+        client, calls = _client([503, 502, 200])
+        async with client:
+            response = await client.get("/v2/kpi")
+        assert response.status_code == 200
+        assert len(calls) == 3
+
+    asyncio.run(run())
+
+
+def test_retries_stop_when_circuit_opens() -> None:
+    async def run() -> None:
+        client, calls = _client([503], retries=5, threshold=2)
+        async with client:
+            response = await client.get("/v2/kpi")
+            assert response.status_code == 503
+            assert len(calls) == 2
+            with pytest.raises(httpx.TransportError, match="circuit breaker is open"):
+                await client.get("/v2/kpi")
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+def test_deadline_bounds_retries() -> None:
+    async def run() -> None:
+        client, calls = _client([503], latency=0.2, retries=5, deadline=0.3)
+        async with client:
+            started = time.monotonic()
+            with pytest.raises(httpx.TimeoutException, match="deadline"):
+                await client.get("/v2/kpi")
+            assert time.monotonic() - started < 0.45
+        assert len(calls) == 2
+
+    asyncio.run(run())
+
+
+def test_connection_errors_back_off() -> None:
+    async def refuse(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("Connection refused", request=request)
+
+    limiter = AdaptiveLimiter(4, 1, 8, 0.5)
+    scheduler = UpstreamScheduler(
+        httpx.MockTransport(refuse), limiter, CircuitBreaker(10, 60.0), 2, 0.001, 0.001
+    )
+
+    async def run() -> None:
+        async with httpx.AsyncClient(transport=scheduler, base_url="http://kolada.test") as client:
+            with pytest.raises(httpx.ConnectError):
+                await client.get("/v2/kpi")
+
+    asyncio.run(run())
+    # Every attempt came after the previous decrease, so each one halved the limit.
+    assert limiter.limit == 1.0
+    assert limiter.in_flight == 0
@@ -0,0 +1,81 @@
+from typing import Any, cast
+
+import pytest
+
+from search import PackedPostings, SearchIndex, SearchIndexBuilder
+
+KPIS: list[dict[str, Any]] = [
+    {"id": "N00001", "title": "Kostnad för äldreomsorg", "description": "Kostnad per invånare."},
+    {"id": "N00002", "title": "Andel elever med behörighet", "description": "Elever i årskurs 9."},
+    {"id": "N00003", "title": "Väntetid till särskilt boende", "description": "Antal dagar."},
+    {"id": "N00004", "title": "Invånare totalt", "description": "Antal invånare 31 december."},
+    {"id": "N00005", "title": "Kostnad för grundskola", "description": ""},
+]
+
+
+def _postings(index: SearchIndex) -> dict[str, dict[str, tuple[int, float]]]:
+    # Postings keyed by KPI ID rather than document number, with term frequencies.
+    postings = cast(PackedPostings, index.postings)
+    result: dict[str, dict[str, tuple[int, float]]] = {}
+    for position, term in enumerate(index.vocabulary):
+        start = postings.offsets[position]
+        docs, impacts = postings[term]
+        result[term] = {
+            index.doc_ids[doc]: (postings.tfs[start + i], impact)
+            for i, (doc, impact) in enumerate(zip(docs, impacts))
+        }
+    return result
+
+
+def test_search_ranks_title_matches_first() -> None:
+    index = SearchIndex.build(KPIS)
+    ids = [kid for kid, _ in index.search("kostnad", 10)]
+    assert ids == ["N00001", "N00005"]
+    # Title terms outweigh description terms.
+    assert [kid for kid, _ in index.search("invånare", 10)] == ["N00004", "N00001"]
+    # Prefixes expand to the terms they start.
+    assert {kid for kid, _ in index.search("grundsk", 10)} == {"N00005"}
+    assert index.search("", 10) == [] and index.search("kostnad", 0) == []
+
+
+def test_incremental_reindex_matches_full_rebuild() -> None:
+    base = SearchIndex.build(KPIS)
+    # One KPI dropped, one changed, one added and the rest reordered.
+    changed = [
+        KPIS[3],
+        dict(KPIS[0], description="Nettokostnad för hemtjänst."),
+        {"id": "N00006", "title": "Elever i grundskola", "description": ""},
+        KPIS[1],
+        KPIS[4],
+    ]
+    builder = SearchIndexBuilder(base)
+    for kpi in changed:
+        if kpi["id"] == "N00001" or not builder.reuse(kpi["id"]):
+            builder.add(kpi)
+    incremental = builder.build()
+    full = SearchIndex.build(changed)
+
+    assert list(incremental.doc_ids) == list(full.doc_ids)
+    assert list(incremental.doc_lengths) == list(full.doc_lengths)
+    assert list(incremental.vocabulary) == list(full.vocabulary)
+    expected = _postings(full)
+    for term, postings in _postings(incremental).items():
+        assert postings.keys() == expected[term].keys()
+        for kid, (tf, impact) in postings.items():
+            assert tf == expected[term][kid][0]
+            assert impact == pytest.approx(expected[term][kid][1])
+    assert incremental.search("grundskola elever", 3) == pytest.approx(
+        full.search("grundskola elever", 3)
+    )
+
+
+def test_reuse_needs_term_frequencies() -> None:
+    base = SearchIndex.build(KPIS)
+    restored = SearchIndex.from_sections(base.to_sections())
+    assert SearchIndexBuilder(restored).reuse("N00001")
+    # An index without term frequencies, e.g. from an older snapshot, cannot be reused.
+    sections = dict(base.to_sections(), tfs=None, doc_lengths=None)
+    builder = SearchIndexBuilder(SearchIndex.from_sections(sections))
+    assert not builder.reuse("N00001")
+    builder.add(KPIS[0])
+    assert not builder.reuse("N00001")
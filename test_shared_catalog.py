@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+from typing import Any
+
+from records import Record, as_dict
+from related import RelatedKpis
+from search import SearchIndex, SearchIndexBuilder
+from shared_catalog import CatalogMap, write_catalog_map
+
+KPIS: list[dict[str, Any]] = [
+    {
+        "id": "N00001",
+        "title": "Kostnad för äldreomsorg",
+        "description": "Nettokostnad för äldreomsorg per invånare.",
+        "operating_area": "Äldreomsorg",
+        "is_divided_by_gender": False,
+        "has_ou_data": True,
+        "publication_date": None,
+    },
+    {
+        "id": "N00002",
+        "title": "Andel elever med behörighet",
+        "description": "Elever i årskurs 9 som är behöriga till gymnasiet.",
+        "operating_area": "Grundskola",
+        "is_divided_by_gender": True,
+        "ou_publication_date": "2024-03-01",
+        "prel_publication_date": 2024,
+    },
+    {"id": "N00003", "title": "Väntetid till särskilt boende", "perspective": ["Kvalitet"]},
+]
+
+
+def _write(path: Path, kpis: list[dict[str, Any]]) -> CatalogMap:
+    index = SearchIndex.build(kpis)
+    write_catalog_map(
+        str(path), kpis, [], [], [], {}, index, RelatedKpis.build(index, 2), 1700000000.0
+    )
+    return CatalogMap(str(path))
+
+
+def test_records_round_trip_in_place(tmp_path: Path) -> None:
+    catalog = _write(tmp_path / "catalog.map", KPIS)
+    assert [as_dict(k) for k in catalog.kpis] == KPIS
+    for kpi in KPIS:
+        record = catalog.kpi_map[kpi["id"]]
+        assert isinstance(record, Record)
+        assert list(record) == list(kpi)
+        assert as_dict(record) == kpi
+        # Values are plain Python objects, ready for tool output.
+        assert json.loads(json.dumps(as_dict(record))) == kpi
+    assert catalog.kpi_map["N00003"].get("description") is None
+    assert "N00004" not in catalog.kpi_map
+
+
+def test_mapped_index_supports_incremental_reindex(tmp_path: Path) -> None:
+    catalog = _write(tmp_path / "catalog.map", KPIS)
+    changed = [dict(KPIS[0], title="Kostnad för hemtjänst"), KPIS[1], KPIS[2]]
+
+    builder = SearchIndexBuilder(catalog.search_index)
+    builder.add(changed[0])
+    assert builder.reuse("N00002") and builder.reuse("N00003")
+    incremental = builder.build()
+    full = SearchIndex.build(changed)
+
+    assert list(incremental.doc_ids) == list(full.doc_ids)
+    assert list(incremental.vocabulary) == list(full.vocabulary)
+    for term in full.vocabulary:
+        assert dict(zip(*incremental.postings[term])) == dict(zip(*full.postings[term]))
@@ -0,0 +1,93 @@
+import json
+import time
+
+import numpy as np
+
+from codec import DataTable, decode_data_table
+from store import ValueIndex, ValueStore
+
+MUNICIPALITIES = {m: {"type": "K"} for m in ("0114", "0115", "0117", "0120")}
+
+
+def _table(kpi_id: str, values: dict[tuple[str, str], float]) -> DataTable:
+    # A decoded Kolada /data response, from {(municipality, year): value} for gender T.
+    rows = [
+        {
+            "kpi": kpi_id,
+            "municipality": m,
+            "period": int(year),
+            "values": [{"gender": "T", "value": v, "count": 1, "status": ""}],
+        }
+        for (m, year), v in values.items()
+    ]
+    return decode_data_table(json.dumps({"values": rows}).encode())
+
+
+def test_frames_expire_after_max_age() -> None:
+    store = ValueStore(MUNICIPALITIES, 1 << 20)
+    store.ingest("N1", _table("N1", {("0114", "2022"): 1.0}), ["2022"])
+    assert store.get("N1", ["2022"], max_age=60) is not None
+
+    stale = store.ingest(
+        "N1", _table("N1", {("0114", "2022"): 2.0}), ["2022"], fetched_at=time.time() - 120
+    )
+    assert store.get("N1", ["2022"]) is stale
+    assert store.get("N1", ["2022"], max_age=60) is None
+    assert store.stats()["expirations"] == 1
+    # The expired frame is gone, so nothing of it is merged into the next ingest.
+    fresh = store.ingest("N1", _table("N1", {("0114", "2023"): 3.0}), ["2023"])
+    assert fresh.periods == ["2023"]
+
+
+def test_merged_frame_keeps_oldest_fetch_time() -> None:
+    store = ValueStore(MUNICIPALITIES, 1 << 20)
+    old = time.time() - 100
+    store.ingest("N1", _table("N1", {("0114", "2022"): 1.0}), ["2022"], fetched_at=old)
+    merged = store.ingest("N1", _table("N1", {("0114", "2023"): 2.0}), ["2023"])
+    assert merged.periods == ["2022", "2023"]
+    assert merged.loaded_at == old
+    # Refetching every period the frame holds replaces it entirely.
+    replaced = store.ingest(
+        "N1", _table("N1", {("0114", "2022"): 1.0, ("0114", "2023"): 2.0}), ["2022", "2023"]
+    )
+    assert replaced.loaded_at > old
+
+
+def _index(values: list[float]) -> ValueIndex:
+    return ValueIndex(np.array(values), np.zeros(len(values), dtype=np.intp))
+
+
+def test_value_index_between_is_inclusive() -> None:
+    index = _index([3.0, np.nan, 1.0, 2.0, 2.0, 5.0])
+    assert len(index) == 5
+    assert sorted(index.between(2.0, 3.0).tolist()) == [0, 3, 4]
+    assert sorted(index.between(2.0, 2.0).tolist()) == [3, 4]
+    assert index.between(3.0, 2.0).tolist() == []
+    assert index.between(6.0, 9.0).tolist() == []
+    assert sorted(index.between(-np.inf, np.inf).tolist()) == [0, 2, 3, 4, 5]
+    assert sorted(index.above(2.0).tolist()) == [0, 5]
+    assert sorted(index.below(2.0).tolist()) == [2]
+
+
+def test_value_index_percent_edges() -> None:
+    index = _index([float(v) for v in range(10)] + [np.nan])
+    assert index.top_percent(0).tolist() == []
+    assert index.top_percent(-5).tolist() == []
+    assert sorted(index.top_percent(100).tolist()) == list(range(10))
+    assert sorted(index.top_percent(250).tolist()) == list(range(10))
+    # 30 % of ten values is exactly three, despite floating point.
+    assert sorted(index.top_percent(30).tolist()) == [7, 8, 9]
+    assert sorted(index.bottom_percent(30).tolist()) == [0, 1, 2]
+    # Any positive share selects at least one value.
+    assert index.top_percent(0.1).tolist() == [9]
+    assert index.bottom_percent(0.1).tolist() == [0]
+
+
+def test_value_index_percent_keeps_ties() -> None:
+    index = _index([1.0, 4.0, 4.0, 4.0, 2.0, 0.0])
+    assert sorted(index.top_percent(20).tolist()) == [1, 2, 3]
+    assert sorted(index.bottom_percent(50).tolist()) == [0, 4, 5]
+    assert sorted(index.bottom_percent(60).tolist()) == [0, 1, 2, 3, 4, 5]
+    empty = _index([np.nan, np.nan])
+    assert len(empty) == 0
+    assert empty.top_percent(50).tolist() == [] and empty.between(0.0, 1.0).tolist() == []
@@ -0,0 +1,178 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+import pytest
+
+import tools
+from benchmarks.fake_kolada import FakeKolada
+from cache import ResponseCache
+from codec import DataTable, decode_data_table
+from lifespan import LifespanContext, Readiness, ServerServices, build_context, fetch_municipalities
+from popularity import PopularityTracker
+from upstream import create_http_client
+
+
+class _Ctx:
+    # The part of the MCP request context that tools read the lifespan context from.
+    class _Request:
+        def __init__(self, lifespan_context: LifespanContext) -> None:
+            self.lifespan_context = lifespan_context
+
+    def __init__(self, lifespan_context: LifespanContext) -> None:
+        self.request_context = self._Request(lifespan_context)
+
+
+async def _cold_context(fake: FakeKolada) -> LifespanContext:
+    # A context mid cold start: municipalities loaded, the KPI catalog never arrives.
+    async def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/kpi"):
+            await asyncio.Event().wait()
+        return await fake.handle(request)
+
+    services: ServerServices = {
+        "http_client": create_http_client(httpx.MockTransport(handle)),
+        "data_cache": ResponseCache(
+            100, 600, dumps=DataTable.to_json, loads=decode_data_table
+        ),
+        "popularity": PopularityTracker(3600),
+        "mirror": None,
+        "readiness": Readiness(),
+    }
+    municipalities, groups = await fetch_municipalities(services["http_client"], {})
+    ctx = build_context([], municipalities, services, time.time(), municipality_groups=groups)
+    ctx["readiness"].set_ready("municipalities")
+    return ctx
+
+
+def test_analysis_does_not_wait_for_kpi_catalog(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tools, "STARTUP_WAIT_TIMEOUT", 30.0)
+
+    async def run() -> None:
+        ctx = await _cold_context(FakeKolada(n_kpis=20, n_municipalities=30, n_regions=3))
+        try:
+            assert not ctx["readiness"].is_ready("catalog")
+            result = await asyncio.wait_for(
+                tools.analyze_kpi_across_municipalities("N00001", _Ctx(ctx), "2021,2022"),
+                timeout=5,
+            )
+            assert "error" not in result
+            assert result["kpi_info"] == {
+                "id": "N00001",
+                "title": "",
+                "description": "",
+                "operating_area": "",
+            }
+            assert result["municipalities_count"] > 0
+
+            groups = await asyncio.wait_for(
+                tools.analyze_kpi_by_municipality_group("N00001", _Ctx(ctx), "2021"), timeout=5
+            )
+            assert "error" not in groups
+            assert groups["kpi_info"] == {"id": "N00001", "title": ""}
+        finally:
+            await ctx["http_client"].aclose()
+
+    asyncio.run(run())
+
+
+def test_catalog_tool_reports_loading(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tools, "STARTUP_WAIT_TIMEOUT", 0.01)
+
+    async def run() -> None:
+        ctx = await _cold_context(FakeKolada(n_kpis=20, n_municipalities=30, n_regions=3))
+        try:
+            result = await tools.get_kpi_metadata("N00001", _Ctx(ctx))
+            assert "still loading" in result["error"]
+        finally:
+            await ctx["http_client"].aclose()
+
+    asyncio.run(run())
+
+
+def test_correlate_kpis_matches_statistics(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tools, "STARTUP_WAIT_TIMEOUT", 30.0)
+    fake = FakeKolada(n_kpis=20, n_municipalities=30, n_regions=3)
+    kommuner = [m["id"] for m in fake.municipalities if m["type"] == "K"]
+
+    def expected(kpi1: str, kpi2: str, year: int) -> tuple[float, int]:
+        pairs = [(fake.value(kpi1, m, year, "T"), fake.value(kpi2, m, year, "T")) for m in kommuner]
+        x, y = zip(*[(a, b) for a, b in pairs if a is not None and b is not None], strict=True)
+        return statistics.correlation(x, y), len(x)
+
+    async def run() -> None:
+        ctx = await _cold_context(fake)
+        try:
+            result = await tools.correlate_kpis("N00002,N00003", "2021,2022", _Ctx(ctx), "N00001")
+            assert "error" not in result
+            assert result["cross_sectional_year"] == "2022"
+            assert [e["kpi2_id"] for e in result["correlations"]] == sorted(
+                ["N00002", "N00003"], key=lambda k: -abs(expected("N00001", k, 2022)[0])
+            )
+            for entry in result["correlations"]:
+                r, n = expected("N00001", entry["kpi2_id"], 2022)
+                assert entry["correlation"] == pytest.approx(r)
+                assert entry["n_municipalities"] == n
+
+            # Over two years, a municipality with both KPIs changing between them has a
+            # correlation of 1 or -1 (the sign of the changes); any other has none.
+            for entry in result["correlations"]:
+                signs = []
+                for m in kommuner:
+                    a1, a2, b1, b2 = (
+                        fake.value(k, m, y, "T")
+                        for k in ("N00001", entry["kpi2_id"])
+                        for y in (2021, 2022)
+                    )
+                    if None not in (a1, a2, b1, b2) and a1 != a2 and b1 != b2:
+                        signs.append(1.0 if (a2 - a1) * (b2 - b1) > 0 else -1.0)
+                assert entry["n_municipality_correlations"] == len(signs)
+                assert entry["mean_municipality_correlation"] == pytest.approx(
+                    statistics.fmean(signs)
+                )
+        finally:
+            await ctx["http_client"].aclose()
+
+    asyncio.run(run())
+
+
+def test_analyze_kpi_trends_matches_statistics(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tools, "STARTUP_WAIT_TIMEOUT", 30.0)
+    fake = FakeKolada(n_kpis=20, n_municipalities=30, n_regions=3)
+    years = [2018, 2019, 2020, 2021, 2022]
+
+    async def run() -> None:
+        ctx = await _cold_context(fake)
+        try:
+            result = await tools.analyze_kpi_trends(
+                "N00001", _Ctx(ctx), ",".join(map(str, years)), limit=30, min_years=5
+            )
+            trends = result["results"][0]
+            assert trends["years_in_data"] == [str(y) for y in years]
+            slopes = [e["slope"] for e in trends["top_municipalities"]]
+            assert slopes == sorted(slopes, reverse=True)
+            for entry in trends["top_municipalities"]:
+                values = [fake.value("N00001", entry["municipality_id"], y, "T") for y in years]
+                assert None not in values and entry["observations"] == 5
+                fit = statistics.linear_regression(years, values)
+                assert entry["slope"] == pytest.approx(fit.slope)
+                assert entry["cagr"] == pytest.approx((values[-1] / values[0]) ** 0.25 - 1.0)
+            # Municipalities missing a year fall below min_years.
+            complete = [
+                m["id"]
+                for m in fake.municipalities
+                if m["type"] == "K"
+                and None not in (fake.value("N00001", m["id"], y, "T") for y in years)
+            ]
+            assert trends["municipalities_count"] == len(complete)
+            assert len(trends["top_municipalities"]) == len(complete) > 0
+
+            # A single year has no trend for anyone.
+            single = await tools.analyze_kpi_trends("N00001", _Ctx(ctx), "2022", min_years=1)
+            assert single["results"][0]["municipalities_count"] == 0
+            assert single["results"][0]["top_municipalities"] == []
+        finally:
+            await ctx["http_client"].aclose()
+
+    asyncio.run(run())
@@ -1,10 +1,28 @@
+import asyncio
 import sys
-from typing import Any
+from typing import Any, Callable, Mapping, cast
 
+import httpx
+import numpy as np
 from mcp.server.fastmcp.server import Context
 
-from config import BASE_URL
-from lifespan import LifespanContext
+from analysis import (
+    pairwise_correlation,
+    rank_columns,
+    rank_slices,
+    rowwise_correlation,
+    summary_stats,
+    trend_metrics,
+)
+from cache import CacheKey, make_data_key
+from codec import DataTable
+from config import DATA_CACHE_TTL, DATA_FETCH_CONCURRENCY, STARTUP_WAIT_TIMEOUT
+from lifespan import STARTUP_RESOURCES, LifespanContext, Readiness, normalize_operating_area
+from metrics import STALE_SERVED
+from records import as_dict
+from scheduler import UpstreamUnavailable
+from store import GENDER_INDEX, KpiFrame, ValueIndex
+from upstream import fetch_kpi_data
 
 
 def _safe_ctx(ctx: Context) -> LifespanContext | None:  # type: ignore[Context]
@@ -17,10 +35,30 @@ def _safe_ctx(ctx: Context) -> LifespanContext | None:  # type: ignore[Context]
     ):
         print("[Kolada MCP Lite] Invalid or incomplete context structure.", file=sys.stderr)
         return None
-    return ctx.request_context.lifespan_context  # type: ignore[Context]
+    # A shallow copy: catalog refreshes swap the shared context's keys, and the call keeps
+    # a consistent view of the catalog it started with, without any locking.
+    shared = ctx.request_context.lifespan_context  # type: ignore[Context]
+    return cast(LifespanContext, dict(shared))
+
+
+async def _wait_for(ctx: Context, resource: str) -> str | None:  # type: ignore[Context]
+    # On a cold start the catalog loads in the background, municipalities first. Waits
+    # for the part a tool needs; returns an error message if it is not ready in time.
+    shared = getattr(getattr(ctx, "request_context", None), "lifespan_context", None)
+    readiness: Readiness | None = shared.get("readiness") if shared else None
+    if readiness is None or readiness.is_ready(resource):
+        return None
+    if await readiness.wait(resource, STARTUP_WAIT_TIMEOUT):
+        return None
+    message = f"The {STARTUP_RESOURCES[resource]} is still loading. Try again shortly."
+    error = readiness.errors.get(resource)
+    return f"{message} Last load error: {error}" if error else message
 
 
 async def list_operating_areas(ctx: Context) -> list[dict[str, str | int]]:  # type: ignore[Context]
+    waiting = await _wait_for(ctx, "catalog")
+    if waiting:
+        return [{"error": waiting}]
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
         return []
@@ -30,32 +68,63 @@ async def list_operating_areas(ctx: Context) -> list[dict[str, str | int]]:  # t
 async def get_kpis_by_operating_area(
     operating_area: str,
     ctx: Context,  # type: ignore[Context]
-) -> list[dict[str, Any]]:
+    fields: str = "id,title",
+    offset: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+) -> dict[str, Any]:
+    waiting = await _wait_for(ctx, "catalog")
+    if waiting:
+        return {"error": waiting}
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
-        return []
-    kpi_list = lifespan_ctx.get("kpi_cache", [])
-    target = operating_area.lower().strip()
-    results: list[dict[str, Any]] = []
-    for k in kpi_list:
-        field = (k.get("operating_area") or "").lower()
-        areas = {a.strip() for a in field.split(",")}
-        if target in areas:
-            results.append(k)
-    return results
+        return {"error": "Server context structure invalid or incomplete."}
+    kpi_ids = lifespan_ctx.get("operating_area_index", {}).get(
+        normalize_operating_area(operating_area), []
+    )
+    if cursor:
+        try:
+            offset = int(cursor)
+        except ValueError:
+            return {"error": f"Invalid cursor: {cursor}"}
+    offset = max(0, offset)
+    limit = max(1, limit)
+    kpi_map = lifespan_ctx.get("kpi_map", {})
+    projection = [f.strip() for f in fields.split(",") if f.strip()] if fields else []
+    page: list[dict[str, Any]] = []
+    for kid in kpi_ids[offset : offset + limit]:
+        k = kpi_map.get(kid)
+        if not k:
+            continue
+        if projection and "all" not in projection:
+            page.append({f: k[f] for f in projection if f in k})
+        else:
+            page.append(as_dict(k))
+    next_offset = offset + limit
+    return {
+        "operating_area": operating_area,
+        "total": len(kpi_ids),
+        "offset": offset,
+        "count": len(page),
+        "kpis": page,
+        "next_cursor": str(next_offset) if next_offset < len(kpi_ids) else None,
+    }
 
 
 async def get_kpi_metadata(
     kpi_id: str,
     ctx: Context,  # type: ignore[Context]
 ) -> dict[str, Any]:
+    waiting = await _wait_for(ctx, "catalog")
+    if waiting:
+        return {"error": waiting}
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
         return {"error": "Server context structure invalid or incomplete."}
     k = lifespan_ctx.get("kpi_map", {}).get(kpi_id)
     if not k:
         return {"error": f"No KPI metadata found in cache for ID: {kpi_id}"}
-    return k
+    return as_dict(k)
 
 
 async def search_kpis(
@@ -63,41 +132,64 @@ async def search_kpis(
     ctx: Context,  # type: ignore[Context]
     limit: int = 20,
 ) -> list[dict[str, Any]]:
+    waiting = await _wait_for(ctx, "catalog")
+    if waiting:
+        return [{"error": waiting}]
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
         return []
-    query = (keyword or "").lower().strip()
-    if not query:
-        return []
-    tokens = [t for t in query.split() if t]
-    simple_index = lifespan_ctx.get("simple_search_index", [])
     kpi_map = lifespan_ctx.get("kpi_map", {})
-    scored: list[tuple[float, str]] = []
-    for entry in simple_index:
-        kid = entry.get("id")
-        title_lc = entry.get("title_lc", "")
-        desc_lc = entry.get("desc_lc", "")
-        score = 0.0
-        if query in title_lc:
-            score += 5.0
-        if query in desc_lc:
-            score += 2.0
-        for tok in tokens:
-            if tok in title_lc:
-                score += 1.0
-            elif tok in desc_lc:
-                score += 0.5
-        if score > 0 and kid:
-            scored.append((score, kid))
-    scored.sort(key=lambda x: x[0], reverse=True)
+    search_index = lifespan_ctx.get("search_index")
+    if search_index is None:
+        return []
     results: list[dict[str, Any]] = []
-    for _, kid in scored[:limit]:
+    for kid, _ in search_index.search(keyword or "", limit):
         k = kpi_map.get(kid)
         if k:
-            results.append(k)
+            results.append(as_dict(k))
     return results
 
 
+async def find_related_kpis(
+    ctx: Context,  # type: ignore[Context]
+    kpi_id: str = "",
+    text: str = "",
+    limit: int = 10,
+) -> dict[str, Any]:
+    # KPIs most similar to a KPI (precomputed neighbours, at most KOLADA_RELATED_KPIS) or
+    # to free text, by cosine similarity of their title and description terms.
+    kpi_id = kpi_id.strip()
+    if not kpi_id and not text.strip():
+        return {"error": "Provide a kpi_id or a text to find related KPIs."}
+    waiting = await _wait_for(ctx, "catalog")
+    if waiting:
+        return {"error": waiting}
+    lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
+    if not lifespan_ctx:
+        return {"error": "Server context structure invalid or incomplete."}
+    related_kpis = lifespan_ctx["related_kpis"]
+    if kpi_id:
+        matches = related_kpis.related(kpi_id, limit)
+        if matches is None:
+            return {"error": f"KPI '{kpi_id}' not found in catalog."}
+    else:
+        matches = related_kpis.similar(text, limit)
+    kpi_map = lifespan_ctx.get("kpi_map", {})
+    results: list[dict[str, Any]] = []
+    for kid, similarity in matches:
+        k = kpi_map.get(kid)
+        if k:
+            results.append(
+                {
+                    "id": kid,
+                    "title": k.get("title", ""),
+                    "operating_area": k.get("operating_area", ""),
+                    "similarity": round(similarity, 4),
+                }
+            )
+    return {"kpi_id": kpi_id, "text": text, "results": results}
+
+
 async def fetch_kolada_data(
     kpi_id: str,
     municipality_id: str,
@@ -105,37 +197,199 @@ async def fetch_kolada_data(
     year: str | None = None,
     municipality_type: str = "K",
 ) -> dict[str, Any]:
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return {"error": waiting}
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
         return {"error": "Server context structure invalid or incomplete."}
     municipality_map = lifespan_ctx.get("municipality_map", {})
     muni_ids = [mid.strip() for mid in municipality_id.split(",") if mid.strip()]
+    error = _validate_municipality_ids(municipality_map, muni_ids, municipality_type)
+    if error:
+        return {"error": error}
+    year_list = _parse_years(year or "")
+    lifespan_ctx["popularity"].record(make_data_key(kpi_id, muni_ids, year_list))
+    data = await _fetch_data(lifespan_ctx, kpi_id, muni_ids, year_list)
+    if isinstance(data, dict):
+        return data
+    return data.to_response(municipality_map)
+
+
+async def fetch_kolada_data_bulk(
+    kpi_ids: str,
+    municipality_ids: str,
+    ctx: Context,  # type: ignore[Context]
+    year: str | None = None,
+    municipality_type: str = "K",
+) -> dict[str, Any]:
+    # One validation pass and one upstream concurrency limit for every KPI in the batch.
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return {"error": waiting}
+    lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
+    if not lifespan_ctx:
+        return {"error": "Server context structure invalid or incomplete."}
+    kpi_list = list(dict.fromkeys(k.strip() for k in kpi_ids.split(",") if k.strip()))
+    if not kpi_list:
+        return {"error": "No valid KPI ID provided."}
+    muni_ids = list(dict.fromkeys(m.strip() for m in municipality_ids.split(",") if m.strip()))
+    error = _validate_municipality_ids(
+        lifespan_ctx.get("municipality_map", {}), muni_ids, municipality_type
+    )
+    if error:
+        return {"error": error}
+    year_list = sorted(set(_parse_years(year or "")))
+    semaphore = asyncio.Semaphore(DATA_FETCH_CONCURRENCY)
+    municipality_map = lifespan_ctx.get("municipality_map", {})
+
+    popularity = lifespan_ctx["popularity"]
+    for kpi_id in kpi_list:
+        popularity.record(make_data_key(kpi_id, muni_ids, year_list))
+
+    async def _fetch_one(kpi_id: str) -> tuple[str, dict[str, Any]]:
+        data = await _fetch_data(lifespan_ctx, kpi_id, muni_ids, year_list, semaphore)
+        if isinstance(data, dict):
+            return kpi_id, data
+        return kpi_id, data.to_response(municipality_map)
+
+    results: dict[str, dict[str, Any]] = {}
+    await _report_progress(ctx, 0, len(kpi_list), "Fetching KPI data")
+    for finished in asyncio.as_completed([_fetch_one(k) for k in kpi_list]):
+        kpi_id, data = await finished
+        results[kpi_id] = data
+        if "error" in data:
+            message = f"{kpi_id}: {data['error']}"
+        else:
+            message = f"{kpi_id}: {data.get('count', 0)} values"
+        await _report_progress(ctx, len(results), len(kpi_list), message)
+
+    failed = [k for k in kpi_list if "error" in results[k]]
+    return {
+        "kpi_ids": kpi_list,
+        "municipality_ids": muni_ids,
+        "selected_years": year_list,
+        "succeeded": len(kpi_list) - len(failed),
+        "failed": failed,
+        "results": {k: results[k] for k in kpi_list},
+    }
+
+
+async def _report_progress(
+    ctx: Context, progress: float, total: float, message: str  # type: ignore[Context]
+) -> None:
+    # Progress is best effort: clients that sent no progress token get nothing.
+    report = getattr(ctx, "report_progress", None)
+    if report is None:
+        return
+    try:
+        await report(progress, total, message)
+    except Exception as e:
+        print(f"[Kolada MCP Lite] Could not send progress notification: {e}", file=sys.stderr)
+
+
+def _parse_years(year_str: str) -> list[str]:
+    if not year_str:
+        return []
+    return [y.strip() for y in year_str.split(",") if y.strip()]
+
+
+def _validate_municipality_ids(
+    municipality_map: Mapping[str, Any], muni_ids: list[str], municipality_type: str
+) -> str | None:
     if not muni_ids:
-        return {"error": "No valid municipality ID provided."}
+        return "No valid municipality ID provided."
     for mid in muni_ids:
         if mid not in municipality_map:
-            return {"error": f"Municipality ID '{mid}' not found in system."}
+            return f"Municipality ID '{mid}' not found in system."
         if municipality_type and municipality_map[mid].get("type") != municipality_type:
-            return {"error": f"Municipality '{mid}' is not type '{municipality_type}'."}
-    muni_ids_clean = ",".join(muni_ids)
-    url: str = f"{BASE_URL}/data/kpi/{kpi_id}/municipality/{muni_ids_clean}"
-    if year:
-        url += f"/year/{year}"
+            return f"Municipality '{mid}' is not type '{municipality_type}'."
+    return None
+
 
-    import httpx
+async def _load_frame(
+    lifespan_ctx: LifespanContext, kpi_id: str, years: list[str]
+) -> KpiFrame | dict[str, Any]:
+    # Parsed values for all municipalities, from the value store or fetched and ingested.
+    # Frames expire with the data cache, so both serve data of the same age.
+    key = make_data_key(kpi_id, None, years)
+    lifespan_ctx["popularity"].record(key)
+    store = lifespan_ctx["value_store"]
+    frame = store.get(kpi_id, years, DATA_CACHE_TTL)
+    if frame is not None:
+        return frame
+    data = await _fetch_data(lifespan_ctx, kpi_id, None, years)
+    if isinstance(data, dict):
+        return data
+    return store.ingest(kpi_id, data, years, lifespan_ctx["data_cache"].stored_at(key))
 
+
+async def warm_data_slice(lifespan_ctx: LifespanContext, key: CacheKey, max_age: float) -> None:
+    # Used by the background prefetcher: refresh a popular slice in the data cache and,
+    # for all-municipality slices, make sure the value store holds it too.
+    kpi_id, municipality_ids, years = key
+    data = await _fetch_data(
+        lifespan_ctx, kpi_id, list(municipality_ids) or None, list(years), max_age=max_age
+    )
+    if isinstance(data, dict):
+        raise RuntimeError(data["error"])
+    if municipality_ids:
+        return
+    store = lifespan_ctx["value_store"]
+    stored_at = lifespan_ctx["data_cache"].stored_at(key)
+    frame = store.get(kpi_id, list(years), DATA_CACHE_TTL)
+    # Re-ingest when the store has no frame or one older than the cached response.
+    if frame is None or stored_at is None or frame.loaded_at < stored_at:
+        store.ingest(kpi_id, data, list(years), stored_at)
+
+
+def _select_rows(
+    lifespan_ctx: LifespanContext, municipality_ids: str | None, municipality_type: str
+) -> np.ndarray | str:
+    # Store rows for explicit municipality IDs (validated) or for all of a type.
+    store = lifespan_ctx["value_store"]
+    if not municipality_ids:
+        return store.rows_of_type(municipality_type)
+    muni_ids = [mid.strip() for mid in municipality_ids.split(",") if mid.strip()]
+    error = _validate_municipality_ids(
+        lifespan_ctx.get("municipality_map", {}), muni_ids, municipality_type
+    )
+    if error:
+        return error
+    return store.rows_for(muni_ids)
+
+
+async def _fetch_data(
+    lifespan_ctx: LifespanContext,
+    kpi_id: str,
+    municipality_ids: list[str] | None,
+    years: list[str],
+    semaphore: asyncio.Semaphore | None = None,
+    max_age: float | None = None,
+) -> DataTable | dict[str, Any]:
+    # municipality_ids=None fetches all municipalities; callers filter by type themselves.
+    # Returns the decoded table, or an error dict. KPIs freshly synced to the local mirror
+    # are answered from it; the rest go through the data cache to Kolada.
+    mirror = lifespan_ctx.get("mirror")
+    if mirror is not None:
+        local = await mirror.read(kpi_id, municipality_ids, years)
+        if local is not None:
+            return local
+    client = lifespan_ctx["http_client"]
+
+    async def _fetch() -> DataTable:
+        return await fetch_kpi_data(client, kpi_id, municipality_ids, years, semaphore)
+
+    cache_key = make_data_key(kpi_id, municipality_ids, years)
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, timeout=180.0)
-            resp.raise_for_status()
-            data: dict[str, Any] = resp.json()
-            values_list: list[dict[str, Any]] = data.get("values", [])
-            for item in values_list:
-                m_id: str = item.get("municipality", "Unknown")
-                item["municipality_name"] = municipality_map.get(m_id, {}).get(
-                    "title", f"Kommun {m_id}"
-                )
-            return data
+        return await lifespan_ctx["data_cache"].get_or_fetch(cache_key, _fetch, max_age)
+    except UpstreamUnavailable as e:
+        stale = await lifespan_ctx["data_cache"].get_stale(cache_key)
+        if stale is not None:
+            STALE_SERVED.inc()
+            print(f"[Kolada MCP Lite] Serving stale data for {kpi_id}: {e}", file=sys.stderr)
+            return stale
+        return {"error": f"Kolada API is unavailable: {str(e)}"}
     except httpx.HTTPStatusError as e:
         return {
             "error": f"HTTP error {e.response.status_code} fetching KPI data: {str(e.response.text)[:200]}"
@@ -159,87 +413,32 @@ async def analyze_kpi_across_municipalities(
     municipality_type: str = "K",
     municipality_ids: str | None = None,
 ) -> dict[str, Any]:
-    from tools import get_kpi_metadata as _get_meta
-
-    kpi_metadata_result: dict[str, Any] | dict[str, str] = await _get_meta(kpi_id, ctx)
-    kpi_metadata: dict[str, Any] = {
-        "id": kpi_id,
-        "title": kpi_metadata_result.get("title", ""),
-        "description": kpi_metadata_result.get("description", ""),
-        "operating_area": kpi_metadata_result.get("operating_area", ""),
-    }
-
-    from tools import fetch_kolada_data as _fetch
-
-    # Build URL like original util
-    def _parse_years(year_str: str) -> list[str]:
-        if not year_str:
-            return []
-        return [y.strip() for y in year_str.split(",") if y.strip()]
-
     year_list: list[str] = _parse_years(year)
 
-    def _group(data: dict[str, Any], gender: str) -> dict[str, dict[str, float]]:
-        raw_rows: list[dict[str, Any]] = []
-        for item in data.get("values", []):
-            municipality_id: str | None = item.get("municipality")
-            raw_period: int | str | None = item.get("period")
-            if not municipality_id or raw_period is None:
-                continue
-            period_str: str = str(raw_period)
-            for subval in item.get("values", []):
-                if subval.get("gender") != gender:
-                    continue
-                val = subval.get("value")
-                raw_rows.append(
-                    {
-                        "municipality": municipality_id,
-                        "period": period_str,
-                        "value": val,
-                    }
-                )
-        muni: dict[str, dict[str, float]] = {}
-        for r in raw_rows:
-            m_id = r["municipality"]
-            p = r["period"]
-            try:
-                v = float(r["value"]) if r["value"] is not None else None
-            except (TypeError, ValueError):
-                v = None
-            if v is None:
-                continue
-            muni.setdefault(m_id, {})[p] = v
-        return muni
-
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return {"error": waiting}
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
         return {"error": "Server context structure invalid or incomplete."}
+    # Metadata is read without waiting for the KPI catalog: until it has loaded, only
+    # the id is known.
+    kpi = lifespan_ctx.get("kpi_map", {}).get(kpi_id, {})
+    kpi_metadata: dict[str, Any] = {
+        "id": kpi_id,
+        "title": kpi.get("title", ""),
+        "description": kpi.get("description", ""),
+        "operating_area": kpi.get("operating_area", ""),
+    }
     municipality_map = lifespan_ctx.get("municipality_map", {})
+    store = lifespan_ctx["value_store"]
 
-    # Fetch live data
-    muni_ids = None if not municipality_ids else municipality_ids
-    if muni_ids:
-        url = f"{BASE_URL}/data/kpi/{kpi_id}/municipality/{muni_ids}"
-        if year:
-            url += f"/year/{year}"
-    else:
-        if year:
-            url = f"{BASE_URL}/data/kpi/{kpi_id}/year/{year}"
-        else:
-            url = f"{BASE_URL}/data/kpi/{kpi_id}"
-    data = await _fetch(kpi_id, municipality_ids or ",".join(municipality_map.keys()), ctx, year)
-    if "error" in data:
-        return {"error": data["error"], "kpi_info": kpi_metadata}
-
-    municipality_data = _group(data, gender)
-
-    # Filter by type
-    filtered: dict[str, dict[str, float]] = {}
-    for m_id, vals in municipality_data.items():
-        if m_id in municipality_map:
-            actual_type = municipality_map[m_id].get("type", "")
-            if not municipality_type or actual_type == municipality_type:
-                filtered[m_id] = vals
+    rows = _select_rows(lifespan_ctx, municipality_ids, municipality_type)
+    if isinstance(rows, str):
+        return {"error": rows, "kpi_info": kpi_metadata}
+    frame = await _load_frame(lifespan_ctx, kpi_id, year_list)
+    if isinstance(frame, dict):
+        return {"error": frame["error"], "kpi_info": kpi_metadata}
 
     # If municipality_ids supplied: return flat list with deltas
     def _build_flat_with_delta(municipality_data: dict[str, dict[str, float]], years: list[str]):
@@ -265,6 +464,7 @@ async def analyze_kpi_across_municipalities(
         return flat_list
 
     if municipality_ids:
+        filtered = frame.to_grouped(store.municipality_ids, gender, rows.tolist(), year_list)
         result_list = _build_flat_with_delta(filtered, year_list)
         return {
             "kpi_info": kpi_metadata,
@@ -274,92 +474,68 @@ async def analyze_kpi_across_municipalities(
             "municipalities_data": result_list,
         }
 
-    # Build ranking lists
-    latest_values: list[float] = []
-    full_list: list[dict[str, Any]] = []
-    delta_list: list[dict[str, Any]] = []
-    delta_values: list[float] = []
+    # Build ranking arrays: one slot per municipality with data in the selected years
+    positions = frame.period_positions(year_list) if year_list else []
+    first_vals, first_pos, last_vals, last_pos, counts = frame.edges(gender, rows, positions)
+    latest_idx = np.flatnonzero(counts > 0)
+    latest_values = last_vals[latest_idx]
+    delta_idx = np.flatnonzero(counts >= 2)
+    delta_values = last_vals[delta_idx] - first_vals[delta_idx]
+    series = frame.series(gender)
 
-    sorted_years = sorted(year_list)
-    for m_id, year_vals in filtered.items():
-        available_years = [y for y in sorted_years if y in year_vals]
-        if not available_years:
-            continue
-        earliest = available_years[0]
-        latest = available_years[-1]
-        earliest_val = year_vals[earliest]
-        latest_val = year_vals[latest]
+    def _name(row: int) -> str:
+        m_id = store.municipality_ids[row]
+        return municipality_map.get(m_id, {}).get("title", f"Kommun {m_id}")
 
-        full_list.append(
-            {
-                "municipality_id": m_id,
-                "municipality_name": municipality_map.get(m_id, {}).get("title", f"Kommun {m_id}"),
-                "latest_year": latest,
-                "latest_value": latest_val,
-                "years_in_data": available_years,
-            }
-        )
-        latest_values.append(latest_val)
-
-        if len(available_years) >= 2:
-            delta_value = latest_val - earliest_val
-            delta_entry = {
-                "municipality_id": m_id,
-                "municipality_name": municipality_map.get(m_id, {}).get("title", f"Kommun {m_id}"),
-                "earliest_year": earliest,
-                "earliest_value": earliest_val,
-                "latest_year": latest,
-                "latest_value": latest_val,
-                "delta_value": delta_value,
-            }
-            delta_list.append(delta_entry)
-            delta_values.append(delta_value)
-
-    def _summary_stats(values: list[float]) -> dict[str, Any]:
-        import statistics
+    def _latest_entry(i: int) -> dict[str, Any]:
+        row = int(rows[i])
+        row_values = series[row] if series is not None else np.array([])
+        return {
+            "municipality_id": store.municipality_ids[row],
+            "municipality_name": _name(row),
+            "latest_year": frame.periods[last_pos[i]],
+            "latest_value": float(last_vals[i]),
+            "years_in_data": [frame.periods[p] for p in positions if not np.isnan(row_values[p])],
+        }
 
-        if not values:
-            return {"min": None, "max": None, "mean": None, "median": None, "count": 0}
+    def _delta_entry(i: int) -> dict[str, Any]:
+        row = int(rows[i])
         return {
-            "min": min(values),
-            "max": max(values),
-            "mean": statistics.mean(values),
-            "median": statistics.median(values),
-            "count": len(values),
+            "municipality_id": store.municipality_ids[row],
+            "municipality_name": _name(row),
+            "earliest_year": frame.periods[first_pos[i]],
+            "earliest_value": float(first_vals[i]),
+            "latest_year": frame.periods[last_pos[i]],
+            "latest_value": float(last_vals[i]),
+            "delta_value": float(last_vals[i] - first_vals[i]),
         }
 
-    def _rank_slice(data: list[dict[str, Any]], key: str, order: str, limit: int):
-        is_desc = order.lower() == "desc"
-        sorted_data = sorted(
-            data, key=lambda x: (x.get(key, 0.0), x.get("municipality_id", "")), reverse=is_desc
-        )
-        n = len(sorted_data)
-        if n == 0:
-            return [], [], []
-        safe_limit = max(1, min(limit, n))
-        top_list = sorted_data[:safe_limit]
-        bottom_list = list(reversed(sorted_data[-safe_limit:]))
-        median_start = max(0, (n - 1) // 2 - (safe_limit // 2))
-        median_start = min(median_start, n - safe_limit)
-        median_list = sorted_data[median_start : median_start + safe_limit]
-        return top_list, bottom_list, median_list
-
-    top_main, bottom_main, median_main = _rank_slice(full_list, "latest_value", sort_order, limit)
-    top_delta, bottom_delta, median_delta = _rank_slice(
-        delta_list, "delta_value", sort_order, limit
-    )
+    def _rank_slice(
+        idx: np.ndarray, values: np.ndarray, build: Callable[[int], dict[str, Any]]
+    ) -> list[list[dict[str, Any]]]:
+        tiebreak = store.id_rank[rows[idx]]
+        return [
+            [build(int(idx[j])) for j in sl.tolist()]
+            for sl in rank_slices(values, tiebreak, sort_order, limit)
+        ]
+
+    top_main, bottom_main, median_main = _rank_slice(latest_idx, latest_values, _latest_entry)
+    top_delta, bottom_delta, median_delta = _rank_slice(delta_idx, delta_values, _delta_entry)
+    stats = summary_stats(latest_values)
 
     return {
         "kpi_info": kpi_metadata,
         "selected_years": year_list,
         "selected_gender": gender,
-        "municipalities_count": len(full_list),
+        "municipalities_count": int(latest_idx.size),
         "summary_stats": {
-            "min_latest": _summary_stats(latest_values).get("min"),
-            "max_latest": _summary_stats(latest_values).get("max"),
-            "mean_latest": _summary_stats(latest_values).get("mean"),
-            "median_latest": _summary_stats(latest_values).get("median"),
-            "count": _summary_stats(latest_values).get("count"),
+            "min_latest": stats["min"],
+            "max_latest": stats["max"],
+            "mean_latest": stats["mean"],
+            "median_latest": stats["median"],
+            "count": stats["count"],
+            "std_latest": stats["std"],
+            **{f"{p}_latest": stats[p] for p in ("p10", "p25", "p75", "p90")},
         },
         "top_municipalities": top_main,
         "bottom_municipalities": bottom_main,
@@ -367,11 +543,46 @@ async def analyze_kpi_across_municipalities(
         "top_delta_municipalities": top_delta,
         "bottom_delta_municipalities": bottom_delta,
         "median_delta_municipalities": median_delta,
-        "multi_year_delta": len(sorted_years) > 1,
+        "multi_year_delta": len(year_list) > 1,
         "only_return_rate": only_return_rate,
     }
 
 
+async def analyze_multiple_kpis(
+    kpi_ids: str,
+    ctx: Context,  # type: ignore[Context]
+    year: str,
+    sort_order: str = "desc",
+    limit: int = 10,
+    gender: str = "T",
+    municipality_type: str = "K",
+) -> dict[str, Any]:
+    kpi_list = list(dict.fromkeys(k.strip() for k in kpi_ids.split(",") if k.strip()))
+    if not kpi_list:
+        return {"error": "No valid KPI ID provided."}
+    results = await asyncio.gather(
+        *(
+            analyze_kpi_across_municipalities(
+                kpi_id,
+                ctx,
+                year,
+                sort_order=sort_order,
+                limit=limit,
+                gender=gender,
+                municipality_type=municipality_type,
+            )
+            for kpi_id in kpi_list
+        )
+    )
+    return {
+        "selected_years": _parse_years(year),
+        "selected_gender": gender,
+        "municipality_type": municipality_type,
+        "kpi_count": len(kpi_list),
+        "results": results,
+    }
+
+
 async def compare_kpis(
     kpi1_id: str,
     kpi2_id: str,
@@ -382,55 +593,32 @@ async def compare_kpis(
     municipality_ids: str | None = None,
 ) -> dict[str, Any]:
     # Reuse analyze code by fetching both datasets and computing correlation/difference
-    def _parse_years(year_str: str) -> list[str]:
-        if not year_str:
-            return []
-        return [y.strip() for y in year_str.split(",") if y.strip()]
-
     year_list = _parse_years(year)
     is_multi_year = len(year_list) > 1
 
-    from tools import fetch_kolada_data as _fetch
-
-    data1 = await _fetch(kpi1_id, municipality_ids or "", ctx, year, municipality_type)
-    data2 = await _fetch(kpi2_id, municipality_ids or "", ctx, year, municipality_type)
-    if "error" in data1:
-        return {"error": data1["error"]}
-    if "error" in data2:
-        return {"error": data2["error"]}
-
-    def _group(data: dict[str, Any]) -> dict[str, dict[str, float]]:
-        grouped: dict[str, dict[str, float]] = {}
-        for item in data.get("values", []):
-            m = item.get("municipality")
-            p = str(item.get("period"))
-            for sub in item.get("values", []):
-                if sub.get("gender") == gender and sub.get("value") is not None:
-                    grouped.setdefault(m, {})[p] = float(sub.get("value"))
-        return grouped
-
-    g1 = _group(data1)
-    g2 = _group(data2)
-
-    # Restrict to municipality_type present in context
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return {"error": waiting}
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
         return {"error": "Server context structure invalid or incomplete."}
-    municipality_map = lifespan_ctx.get("municipality_map", {})
+    store = lifespan_ctx["value_store"]
 
-    def _filter_type(g: dict[str, dict[str, float]]):
-        res: dict[str, dict[str, float]] = {}
-        for m_id, vals in g.items():
-            if (
-                municipality_type
-                and municipality_map.get(m_id, {}).get("type") != municipality_type
-            ):
-                continue
-            res[m_id] = vals
-        return res
+    # Restrict to the requested municipalities, or all of municipality_type
+    rows = _select_rows(lifespan_ctx, municipality_ids, municipality_type)
+    if isinstance(rows, str):
+        return {"error": rows}
+    frame1, frame2 = await asyncio.gather(
+        _load_frame(lifespan_ctx, kpi1_id, year_list),
+        _load_frame(lifespan_ctx, kpi2_id, year_list),
+    )
+    if isinstance(frame1, dict):
+        return {"error": frame1["error"]}
+    if isinstance(frame2, dict):
+        return {"error": frame2["error"]}
 
-    g1 = _filter_type(g1)
-    g2 = _filter_type(g2)
+    g1 = frame1.to_grouped(store.municipality_ids, gender, rows.tolist(), year_list)
+    g2 = frame2.to_grouped(store.municipality_ids, gender, rows.tolist(), year_list)
 
     import statistics
 
@@ -455,7 +643,8 @@ async def compare_kpis(
         if not year_list:
             return {**result, "error": "No valid year specified for single-year analysis."}
         y = year_list[0]
-        diffs = []
+        xs1: list[float] = []
+        xs2: list[float] = []
         entries = []
         for m_id, vals1 in g1.items():
             vals2 = g2.get(m_id)
@@ -472,7 +661,8 @@ async def compare_kpis(
                         "difference": v2 - v1,
                     }
                 )
-                diffs.append(v2 - v1)
+                xs1.append(v1)
+                xs2.append(v2)
         if not entries:
             return {**result, "error": f"No overlapping data for single year {y}."}
         entries.sort(key=lambda e: e["difference"])
@@ -486,7 +676,7 @@ async def compare_kpis(
                 "top_difference_municipalities": list(reversed(entries[-sl:])),
                 "bottom_difference_municipalities": entries[:sl],
                 "median_difference_municipalities": entries[median_start:median_end],
-                "overall_correlation": _corr(diffs, diffs),
+                "overall_correlation": _corr(xs1, xs2),
             }
         )
         return result
@@ -541,10 +731,384 @@ async def compare_kpis(
     return result
 
 
+async def correlate_kpis(
+    kpi_ids: str,
+    year: str,
+    ctx: Context,  # type: ignore[Context]
+    target_kpi_id: str | None = None,
+    method: str = "pearson",
+    gender: str = "T",
+    municipality_type: str = "K",
+    municipality_ids: str | None = None,
+    limit: int = 20,
+) -> dict[str, Any]:
+    # Correlates a target KPI with each of kpi_ids, or every pair of kpi_ids, strongest first.
+    method = method.lower()
+    if method not in ("pearson", "spearman"):
+        return {"error": f"Unknown method '{method}'. Use 'pearson' or 'spearman'."}
+    if gender not in GENDER_INDEX:
+        return {"error": f"Unknown gender '{gender}'. Use one of {', '.join(GENDER_INDEX)}."}
+    year_list = sorted(set(_parse_years(year)))
+    if not year_list:
+        return {"error": "No valid year specified."}
+    target = (target_kpi_id or "").strip()
+    requested = [k.strip() for k in kpi_ids.split(",") if k.strip()]
+    kpi_list = list(dict.fromkeys(([target] if target else []) + requested))
+    if len(kpi_list) < 2:
+        return {"error": "At least two distinct KPI IDs are needed."}
+
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return {"error": waiting}
+    lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
+    if not lifespan_ctx:
+        return {"error": "Server context structure invalid or incomplete."}
+    kpi_map = lifespan_ctx.get("kpi_map", {})
+    rows = _select_rows(lifespan_ctx, municipality_ids, municipality_type)
+    if isinstance(rows, str):
+        return {"error": rows}
+
+    loaded = await asyncio.gather(*(_load_frame(lifespan_ctx, k, year_list) for k in kpi_list))
+    errors = {k: f["error"] for k, f in zip(kpi_list, loaded, strict=True) if isinstance(f, dict)}
+    frames = [f for f in loaded if not isinstance(f, dict)]
+    if target and target in errors:
+        return {"error": f"Target KPI {target}: {errors[target]}", "kpi_errors": errors}
+    if len(frames) < 2:
+        return {"error": "Fewer than two KPIs had data.", "kpi_errors": errors}
+    ids = [f.kpi_id for f in frames]
+
+    # cube[municipality, year, kpi]; years a KPI has no period for stay NaN.
+    cube = np.full((rows.size, len(year_list), len(frames)), np.nan)
+    for k, frame in enumerate(frames):
+        series = cast(np.ndarray, frame.series(gender))
+        for y, year_id in enumerate(year_list):
+            p = frame.period_index.get(year_id)
+            if p is not None:
+                cube[:, y, k] = series[rows, p]
+
+    # Cross-sectional correlation uses the latest year where two or more KPIs have data.
+    has_data = (~np.isnan(cube)).any(axis=0).sum(axis=1) >= 2
+    cross_years = np.flatnonzero(has_data)
+    cross_year = year_list[int(cross_years[-1])] if cross_years.size else None
+    if cross_year is not None:
+        cross_r, cross_n = pairwise_correlation(cube[:, year_list.index(cross_year), :], method)
+    else:
+        cross_r = np.full((len(frames), len(frames)), np.nan)
+        cross_n = np.zeros((len(frames), len(frames)), dtype=np.intp)
+
+    if target:
+        pairs = [(0, j) for j in range(1, len(frames))]
+    else:
+        pairs = [(i, j) for i in range(len(frames)) for j in range(i + 1, len(frames))]
+
+    # Per-municipality correlation across the selected years, averaged per pair.
+    over_time: dict[tuple[int, int], tuple[float | None, int]] = {}
+    if len(year_list) > 1:
+        series_by_kpi = [cube[:, :, k] for k in range(len(frames))]
+        if method == "spearman":
+            series_by_kpi = [rank_columns(s.T).T for s in series_by_kpi]
+        for i, j in pairs:
+            r, _ = rowwise_correlation(series_by_kpi[i], series_by_kpi[j])
+            defined = r[~np.isnan(r)]
+            over_time[(i, j)] = (float(defined.mean()) if defined.size else None, int(defined.size))
+
+    def _value(v: float) -> float | None:
+        return None if np.isnan(v) else float(v)
+
+    entries = []
+    for i, j in pairs:
+        mean_r, n_munis = over_time.get((i, j), (None, 0))
+        entries.append(
+            {
+                "kpi1_id": ids[i],
+                "kpi1_title": kpi_map.get(ids[i], {}).get("title", ""),
+                "kpi2_id": ids[j],
+                "kpi2_title": kpi_map.get(ids[j], {}).get("title", ""),
+                "correlation": _value(cross_r[i, j]),
+                "n_municipalities": int(cross_n[i, j]),
+                "mean_municipality_correlation": mean_r,
+                "n_municipality_correlations": n_munis,
+            }
+        )
+    entries.sort(
+        key=lambda e: (
+            e["correlation"] is None,
+            -abs(e["correlation"] or 0.0),
+            e["kpi1_id"],
+            e["kpi2_id"],
+        )
+    )
+
+    result: dict[str, Any] = {
+        "method": method,
+        "selected_years": year_list,
+        "cross_sectional_year": cross_year,
+        "gender": gender,
+        "municipality_type": municipality_type,
+        "target_kpi_id": target or None,
+        "pair_count": len(entries),
+        "correlations": entries[: max(1, limit)],
+    }
+    if not target:
+        result["matrix"] = {
+            "kpi_ids": ids,
+            "correlations": [[_value(v) for v in row] for row in cross_r.tolist()],
+        }
+    if errors:
+        result["kpi_errors"] = errors
+    return result
+
+
+TREND_SORT_KEYS: tuple[str, ...] = ("slope", "cagr", "volatility", "trend_breaks")
+
+
+async def analyze_kpi_trends(
+    kpi_ids: str,
+    ctx: Context,  # type: ignore[Context]
+    year: str = "",
+    sort_by: str = "slope",
+    sort_order: str = "desc",
+    limit: int = 10,
+    gender: str = "T",
+    municipality_type: str = "K",
+    municipality_ids: str | None = None,
+    min_years: int = 3,
+) -> dict[str, Any]:
+    # Multi-year trends for every selected municipality at once, per KPI in kpi_ids:
+    # least-squares slope, CAGR, volatility and trend breaks, ranked by sort_by.
+    sort_by = sort_by.lower()
+    if sort_by not in TREND_SORT_KEYS:
+        return {"error": f"Unknown sort_by '{sort_by}'. Use one of {', '.join(TREND_SORT_KEYS)}."}
+    if gender not in GENDER_INDEX:
+        return {"error": f"Unknown gender '{gender}'. Use one of {', '.join(GENDER_INDEX)}."}
+    kpi_list = list(dict.fromkeys(k.strip() for k in kpi_ids.split(",") if k.strip()))
+    if not kpi_list:
+        return {"error": "No valid KPI ID provided."}
+    year_list = sorted(set(_parse_years(year)))
+
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return {"error": waiting}
+    lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
+    if not lifespan_ctx:
+        return {"error": "Server context structure invalid or incomplete."}
+    rows = _select_rows(lifespan_ctx, municipality_ids, municipality_type)
+    if isinstance(rows, str):
+        return {"error": rows}
+    frames = await asyncio.gather(*(_load_frame(lifespan_ctx, k, year_list) for k in kpi_list))
+    results = [
+        _kpi_trends(
+            lifespan_ctx,
+            kpi_id,
+            frame,
+            rows,
+            year_list,
+            gender,
+            sort_by,
+            sort_order,
+            limit,
+            min_years,
+        )
+        for kpi_id, frame in zip(kpi_list, frames, strict=True)
+    ]
+    return {
+        "selected_years": year_list,
+        "selected_gender": gender,
+        "municipality_type": municipality_type,
+        "sort_by": sort_by,
+        "min_years": min_years,
+        "kpi_count": len(kpi_list),
+        "results": results,
+    }
+
+
+def _kpi_trends(
+    lifespan_ctx: LifespanContext,
+    kpi_id: str,
+    frame: KpiFrame | dict[str, Any],
+    rows: np.ndarray,
+    years: list[str],
+    gender: str,
+    sort_by: str,
+    sort_order: str,
+    limit: int,
+    min_years: int,
+) -> dict[str, Any]:
+    kpi = lifespan_ctx.get("kpi_map", {}).get(kpi_id, {})
+    kpi_info = {"id": kpi_id, "title": kpi.get("title", "")}
+    if isinstance(frame, dict):
+        return {"kpi_info": kpi_info, "error": frame["error"]}
+    store = lifespan_ctx["value_store"]
+    municipality_map = lifespan_ctx.get("municipality_map", {})
+    # Only periods that are years can be placed on the time axis.
+    positions = [p for p in frame.period_positions(years) if frame.periods[p].isdigit()]
+    x = np.array([float(frame.periods[p]) for p in positions])
+    series = cast(np.ndarray, frame.series(gender))
+    trends = trend_metrics(series[np.ix_(rows, np.asarray(positions, dtype=np.intp))], x)
+
+    metric = trends[sort_by]
+    ranked = np.flatnonzero((trends["observations"] >= max(2, min_years)) & ~np.isnan(metric))
+    top, bottom, _ = rank_slices(metric[ranked], store.id_rank[rows[ranked]], sort_order, limit)
+
+    def _value(v: float) -> float | None:
+        return None if np.isnan(v) else float(v)
+
+    def _entry(i: int) -> dict[str, Any]:
+        m_id = store.municipality_ids[int(rows[i])]
+        return {
+            "municipality_id": m_id,
+            "municipality_name": municipality_map.get(m_id, {}).get("title", f"Kommun {m_id}"),
+            "first_year": frame.periods[positions[trends["first"][i]]],
+            "first_value": float(trends["first_values"][i]),
+            "last_year": frame.periods[positions[trends["last"][i]]],
+            "last_value": float(trends["last_values"][i]),
+            "observations": int(trends["observations"][i]),
+            **{key: _value(trends[key][i]) for key in TREND_SORT_KEYS},
+        }
+
+    slopes = trends["slope"][ranked]
+    return {
+        "kpi_info": kpi_info,
+        "years_in_data": [frame.periods[p] for p in positions],
+        "municipalities_count": int(ranked.size),
+        "slope_stats": summary_stats(slopes[~np.isnan(slopes)]),
+        "top_municipalities": [_entry(int(ranked[j])) for j in top.tolist()],
+        "bottom_municipalities": [_entry(int(ranked[j])) for j in bottom.tolist()],
+    }
+
+
+async def list_municipality_groups(
+    ctx: Context,  # type: ignore[Context]
+    search: str = "",
+    limit: int = 100,
+) -> list[dict[str, Any]]:
+    # Kolada's municipality groups (e.g. counties and comparison groups), optionally only
+    # those whose title contains `search`.
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return [{"error": waiting}]
+    lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
+    if not lifespan_ctx:
+        return []
+    needle = search.strip().lower()
+    result: list[dict[str, Any]] = []
+    for group in lifespan_ctx.get("municipality_groups", []):
+        title = group.get("title", "")
+        if needle and needle not in title.lower():
+            continue
+        result.append(
+            {"id": group["id"], "title": title, "member_count": len(group.get("members", []))}
+        )
+        if len(result) >= limit:
+            break
+    return result
+
+
+GROUP_SORT_KEYS: tuple[str, ...] = ("mean", "weighted_mean", "median", "std", "min", "max")
+
+
+async def analyze_kpi_by_municipality_group(
+    kpi_id: str,
+    ctx: Context,  # type: ignore[Context]
+    year: str = "",
+    group_ids: str = "",
+    weight_kpi_id: str | None = None,
+    gender: str = "T",
+    sort_by: str = "mean",
+    sort_order: str = "desc",
+    limit: int = 20,
+) -> dict[str, Any]:
+    # Statistics of each member municipality's latest value in `year` per municipality
+    # group (all groups, or the comma-separated group_ids), optionally weighted by another
+    # KPI such as population. Rollups are cached per KPI, so repeated calls are cheap.
+    sort_by = sort_by.lower()
+    if sort_by not in GROUP_SORT_KEYS:
+        return {"error": f"Unknown sort_by '{sort_by}'. Use one of {', '.join(GROUP_SORT_KEYS)}."}
+    if sort_by == "weighted_mean" and not weight_kpi_id:
+        return {"error": "sort_by 'weighted_mean' requires weight_kpi_id."}
+    if gender not in GENDER_INDEX:
+        return {"error": f"Unknown gender '{gender}'. Use one of {', '.join(GENDER_INDEX)}."}
+    year_list = sorted(set(_parse_years(year)))
+
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return {"error": waiting}
+    lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
+    if not lifespan_ctx:
+        return {"error": "Server context structure invalid or incomplete."}
+    index = lifespan_ctx["group_index"]
+    if not len(index):
+        return {"error": "No municipality groups are available."}
+    if group_ids:
+        wanted = list(dict.fromkeys(g.strip() for g in group_ids.split(",") if g.strip()))
+        for gid in wanted:
+            if gid not in index.position:
+                return {"error": f"Municipality group '{gid}' not found in system."}
+        selected = np.array([index.position[gid] for gid in wanted], dtype=np.intp)
+    else:
+        selected = np.arange(len(index))
+
+    kpi_ids = [kpi_id] + ([weight_kpi_id] if weight_kpi_id else [])
+    frames = await asyncio.gather(*(_load_frame(lifespan_ctx, k, year_list) for k in kpi_ids))
+    for frame in frames:
+        if isinstance(frame, dict):
+            return frame
+    frame = cast(KpiFrame, frames[0])
+    weights = cast(KpiFrame, frames[1]) if weight_kpi_id else None
+    stats = index.rollup(
+        frame,
+        gender,
+        frame.period_positions(year_list),
+        weights,
+        weights.period_positions(year_list) if weights is not None else None,
+    )
+
+    metric = stats["p50" if sort_by == "median" else sort_by][selected]
+    ranked = np.flatnonzero((stats["count"][selected] > 0) & ~np.isnan(metric))
+    top, bottom, _ = rank_slices(metric[ranked], ranked, sort_order, limit)
+
+    def _value(key: str, i: int) -> float | None:
+        v = stats[key][i] if key in stats else np.nan
+        return None if np.isnan(v) else float(v)
+
+    def _entry(j: int) -> dict[str, Any]:
+        i = int(selected[ranked[j]])
+        gid = index.ids[i]
+        return {
+            "group_id": gid,
+            "title": index.groups[i].get("title", ""),
+            "member_count": len(index.members[gid]),
+            "municipalities_with_data": int(stats["count"][i]),
+            "mean": _value("mean", i),
+            "weighted_mean": _value("weighted_mean", i),
+            "median": _value("p50", i),
+            "p25": _value("p25", i),
+            "p75": _value("p75", i),
+            "std": _value("std", i),
+            "min": _value("min", i),
+            "max": _value("max", i),
+        }
+
+    kpi = lifespan_ctx.get("kpi_map", {}).get(kpi_id, {})
+    return {
+        "kpi_info": {"id": kpi_id, "title": kpi.get("title", "")},
+        "weight_kpi_id": weight_kpi_id,
+        "selected_years": year_list,
+        "selected_gender": gender,
+        "sort_by": sort_by,
+        "groups_count": int(ranked.size),
+        "top_groups": [_entry(j) for j in top.tolist()],
+        "bottom_groups": [_entry(j) for j in bottom.tolist()],
+    }
+
+
 async def list_municipalities(
     ctx: Context,  # type: ignore[Context]
     municipality_type: str = "K",
 ) -> list[dict[str, str]]:
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return [{"error": waiting}]
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
         return []
@@ -558,75 +1122,136 @@ async def list_municipalities(
     return result
 
 
+FILTER_OPERATORS: tuple[str, ...] = ("above", "below", "between", "top_percent", "bottom_percent")
+
+
 async def filter_municipalities_by_kpi(
     ctx: Context,  # type: ignore[Context]
-    kpi_id: str,
-    cutoff: float,
+    kpi_id: str = "",
+    cutoff: float | None = None,
     operator: str = "above",
     year: str | None = None,
     municipality_type: str = "K",
     gender: str = "T",
+    upper: float | None = None,
+    conditions: list[dict[str, Any]] | None = None,
+    combine: str = "and",
 ) -> list[dict[str, Any]]:
+    # operator: "above"/"below" compare strictly with cutoff, "between" keeps
+    # cutoff <= value <= upper, "top_percent"/"bottom_percent" take cutoff as a percentage.
+    # conditions: [{"kpi_id", "operator", "cutoff", "upper"?}, ...] combined with combine.
+    waiting = await _wait_for(ctx, "municipalities")
+    if waiting:
+        return [{"error": waiting}]
     lifespan_ctx: LifespanContext | None = _safe_ctx(ctx)
     if not lifespan_ctx:
         return []
     municipality_map = lifespan_ctx.get("municipality_map", {})
-    filtered_ids = [
-        m_id
-        for m_id, muni in municipality_map.items()
-        if not municipality_type or muni.get("type") == municipality_type
-    ]
-    if not filtered_ids:
-        return []
-    muni_ids_str = ",".join(filtered_ids)
-    data_response = await fetch_kolada_data(kpi_id, muni_ids_str, ctx, year)
-    if "error" in data_response:
-        return [data_response]
-    values_list = data_response.get("values", [])
-    latest_by_muni: dict[str, dict[str, Any]] = {}
-    if year:
-        for rec in values_list:
-            if str(rec.get("period")) == year:
-                latest_by_muni[rec.get("municipality")] = rec
-    else:
-        for rec in values_list:
-            m_id = rec.get("municipality")
-            if m_id is None:
-                continue
-            period = rec.get("period")
-            if period is None:
-                continue
-            cur = latest_by_muni.get(m_id)
-            if cur is None or rec.get("period") > cur.get("period"):
-                latest_by_muni[m_id] = rec
-    results: list[dict[str, Any]] = []
-    for m_id, rec in latest_by_muni.items():
-        val = None
-        for d in rec.get("values", []):
-            if d.get("gender") == gender:
-                val = d.get("value")
-                break
-        if val is None:
-            continue
-        try:
-            val_float = float(val)
-        except (ValueError, TypeError):
-            continue
-        include = (operator == "above" and val_float > cutoff) or (
-            operator == "below" and val_float < cutoff
+    store = lifespan_ctx["value_store"]
+    year_list = _parse_years(year or "")
+
+    single = not conditions
+    if single:
+        conditions = [{"kpi_id": kpi_id, "operator": operator, "cutoff": cutoff, "upper": upper}]
+    conditions = cast(list[dict[str, Any]], conditions)
+    combine = combine.lower()
+    if combine not in ("and", "or"):
+        return [{"error": f"Unknown combine '{combine}'. Use 'and' or 'or'."}]
+    parsed: list[tuple[str, str, float, float | None]] = []
+    for cond in conditions:
+        error = _check_condition(cond)
+        if error:
+            return [{"error": error}]
+        parsed.append(
+            (
+                str(cond["kpi_id"]).strip(),
+                str(cond.get("operator") or "above").lower(),
+                float(cond["cutoff"]),
+                float(cond["upper"]) if cond.get("upper") is not None else None,
+            )
         )
-        if include:
+
+    frames = await asyncio.gather(
+        *(_load_frame(lifespan_ctx, kid, year_list) for kid in dict.fromkeys(c[0] for c in parsed))
+    )
+    frame_map: dict[str, KpiFrame] = {}
+    for f in frames:
+        if isinstance(f, dict):
+            return [f]
+        frame_map[f.kpi_id] = f
+    rows = store.rows_of_type(municipality_type)
+
+    indexes: list[ValueIndex] = []
+    matched: np.ndarray | None = None
+    for kid, op, low, high in parsed:
+        frame = frame_map[kid]
+        positions = frame.period_positions(year_list) if year_list else None
+        if positions == []:
+            index = ValueIndex(np.full(rows.size, np.nan), np.full(rows.size, -1))
+        else:
+            index = frame.value_index(gender, municipality_type, rows, positions)
+        indexes.append(index)
+        if op == "above":
+            hits = index.above(low)
+        elif op == "below":
+            hits = index.below(low)
+        elif op == "between":
+            hits = index.between(low, cast(float, high))
+        elif op == "top_percent":
+            hits = index.top_percent(low)
+        else:
+            hits = index.bottom_percent(low)
+        if matched is None:
+            matched = hits
+        elif combine == "and":
+            matched = np.intersect1d(matched, hits)
+        else:
+            matched = np.union1d(matched, hits)
+
+    results: list[dict[str, Any]] = []
+    for i in np.unique(cast(np.ndarray, matched)).tolist():
+        m_id = store.municipality_ids[rows[i]]
+        name = municipality_map.get(m_id, {}).get("title", f"Municipality {m_id}")
+        if single:
+            index = indexes[0]
+            val_float = float(index.values[i])
+            period = frame_map[parsed[0][0]].periods[index.period_pos[i]]
             results.append(
                 {
                     "municipality_id": m_id,
-                    "period": rec.get("period"),
+                    "period": int(period) if period.isdigit() else period,
                     "value": val_float,
-                    "cutoff": cutoff,
-                    "difference": val_float - cutoff,
-                    "municipality_name": municipality_map.get(m_id, {}).get(
-                        "title", f"Municipality {m_id}"
-                    ),
+                    "cutoff": conditions[0]["cutoff"],
+                    "difference": val_float - parsed[0][2],
+                    "municipality_name": name,
                 }
             )
+            continue
+        values: dict[str, dict[str, Any]] = {}
+        for (kid, _, _, _), index in zip(parsed, indexes, strict=True):
+            if kid in values or np.isnan(index.values[i]):
+                continue
+            period = frame_map[kid].periods[index.period_pos[i]]
+            values[kid] = {
+                "period": int(period) if period.isdigit() else period,
+                "value": float(index.values[i]),
+            }
+        results.append({"municipality_id": m_id, "municipality_name": name, "values": values})
     results.sort(key=lambda x: x["municipality_id"])
     return results
+
+
+def _check_condition(cond: dict[str, Any]) -> str | None:
+    if not str(cond.get("kpi_id") or "").strip():
+        return "Each condition needs a kpi_id."
+    op = str(cond.get("operator") or "above").lower()
+    if op not in FILTER_OPERATORS:
+        return f"Unknown operator '{op}'. Use one of {', '.join(FILTER_OPERATORS)}."
+    try:
+        float(cond["cutoff"])
+        if op == "between":
+            float(cond["upper"])
+    except (KeyError, TypeError, ValueError):
+        needed = "cutoff and upper" if op == "between" else "cutoff"
+        return f"Operator '{op}' needs a numeric {needed}."
+    return None
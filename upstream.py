@@ -0,0 +1,187 @@
+import asyncio
+import sys
+import time
+from typing import Any
+
+import httpx
+
+from config import (
+    BASE_URL,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    DATA_FETCH_CONCURRENCY,
+    DATA_MUNICIPALITY_CHUNK_SIZE,
+    DATA_PER_PAGE,
+    DATA_REQUEST_TIMEOUT,
+    DATA_YEAR_CHUNK_SIZE,
+    HTTP2_ENABLED,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    UPSTREAM_CONCURRENCY_BACKOFF,
+    UPSTREAM_DEADLINE,
+    UPSTREAM_HEDGE_DELAY,
+    UPSTREAM_INITIAL_CONCURRENCY,
+    UPSTREAM_MAX_CONCURRENCY,
+    UPSTREAM_MIN_CONCURRENCY,
+    UPSTREAM_RETRIES,
+    UPSTREAM_RETRY_BASE_DELAY,
+    UPSTREAM_RETRY_MAX_DELAY,
+)
+from codec import DataTable, decode_data_page, loads
+from metrics import REGISTRY, UPSTREAM_DECODE, Family, MeteredTransport, endpoint_label
+from scheduler import AdaptiveLimiter, CircuitBreaker, UpstreamScheduler
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  # type: ignore[import-not-found]
+    except ImportError:
+        return False
+    return True
+
+
+def create_http_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    """
+    Creates the long-lived client shared by the lifespan and all tools. Connections to
+    api.kolada.se are kept alive and pooled so that tool calls skip the TCP/TLS handshake.
+    A custom `transport` (e.g. a stand-in API for benchmarks) replaces the pooled one.
+    Every request goes through the upstream scheduler (concurrency limit, retries,
+    circuit breaker, hedging); each attempt is metered separately.
+    """
+    if transport is None:
+        http2 = HTTP2_ENABLED
+        if http2 and not _http2_available():
+            print(
+                "[Kolada MCP Lite] HTTP/2 requested but 'h2' is not installed; using HTTP/1.1.",
+                file=sys.stderr,
+            )
+            http2 = False
+        transport = httpx.AsyncHTTPTransport(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    metered = MeteredTransport(transport)
+    REGISTRY.add_collector("http_pool", lambda: _pool_families(metered))
+    scheduler = UpstreamScheduler(
+        metered,
+        AdaptiveLimiter(
+            UPSTREAM_INITIAL_CONCURRENCY,
+            UPSTREAM_MIN_CONCURRENCY,
+            UPSTREAM_MAX_CONCURRENCY,
+            UPSTREAM_CONCURRENCY_BACKOFF,
+        ),
+        CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT),
+        UPSTREAM_RETRIES,
+        UPSTREAM_RETRY_BASE_DELAY,
+        UPSTREAM_RETRY_MAX_DELAY,
+        UPSTREAM_HEDGE_DELAY,
+        UPSTREAM_DEADLINE,
+    )
+    REGISTRY.add_collector("upstream_scheduler", scheduler.families)
+    return httpx.AsyncClient(
+        transport=scheduler,
+        timeout=httpx.Timeout(DATA_REQUEST_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+
+def _pool_families(transport: MeteredTransport) -> list[Family]:
+    usage = transport.pool_usage()
+    return [
+        (
+            "kolada_upstream_pool_connections",
+            "gauge",
+            "Upstream connection pool usage by state.",
+            [({"state": state}, float(n)) for state, n in usage.items()],
+        ),
+        (
+            "kolada_upstream_pool_max_connections",
+            "gauge",
+            "Configured upstream connection pool size.",
+            [({}, float(HTTP_MAX_CONNECTIONS))],
+        ),
+    ]
+
+
+def decode_json(resp: httpx.Response) -> dict[str, Any]:
+    """Decodes a Kolada response body, recording the time spent in the decode metric."""
+    start = time.perf_counter()
+    data = loads(resp.content)
+    UPSTREAM_DECODE.observe(time.perf_counter() - start, endpoint=endpoint_label(resp.url.path))
+    return data
+
+
+def decode_data(resp: httpx.Response) -> tuple[DataTable, str | None]:
+    """Decodes a /data page into a DataTable and the next page URL, timed like decode_json."""
+    start = time.perf_counter()
+    page = decode_data_page(resp.content)
+    UPSTREAM_DECODE.observe(time.perf_counter() - start, endpoint=endpoint_label(resp.url.path))
+    return page
+
+
+def _chunks(items: list[str], size: int) -> list[list[str]]:
+    if not items:
+        return [[]]
+    size = max(1, size)
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def build_data_urls(
+    kpi_id: str, municipality_ids: list[str] | None, years: list[str]
+) -> list[str]:
+    """
+    Returns one URL per (municipality chunk, year chunk). `None` means all municipalities,
+    which uses the cheaper /data/kpi/{id}/year/{years} form without a municipality list.
+    """
+    urls: list[str] = []
+    for year_chunk in _chunks(years, DATA_YEAR_CHUNK_SIZE):
+        year_part = f"/year/{','.join(year_chunk)}" if year_chunk else ""
+        if municipality_ids is None:
+            urls.append(f"{BASE_URL}/data/kpi/{kpi_id}{year_part}?per_page={DATA_PER_PAGE}")
+            continue
+        for muni_chunk in _chunks(municipality_ids, DATA_MUNICIPALITY_CHUNK_SIZE):
+            urls.append(
+                f"{BASE_URL}/data/kpi/{kpi_id}/municipality/{','.join(muni_chunk)}"
+                f"{year_part}?per_page={DATA_PER_PAGE}"
+            )
+    return urls
+
+
+async def fetch_all_pages(client: httpx.AsyncClient, url: str) -> list[DataTable]:
+    pages: list[DataTable] = []
+    next_url: str | None = url
+    while next_url:
+        resp = await client.get(next_url, timeout=DATA_REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        table, next_url = decode_data(resp)
+        pages.append(table)
+    return pages
+
+
+async def fetch_kpi_data(
+    client: httpx.AsyncClient,
+    kpi_id: str,
+    municipality_ids: list[str] | None,
+    years: list[str],
+    semaphore: asyncio.Semaphore | None = None,
+) -> DataTable:
+    """
+    Fetches KPI data split into size-bounded chunks that run concurrently, follows
+    pagination for each chunk and merges all pages into one DataTable.
+    Pass a shared `semaphore` to bound chunks across several calls with one limit.
+    """
+    urls = build_data_urls(kpi_id, municipality_ids, years)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(DATA_FETCH_CONCURRENCY)
+
+    async def _fetch_chunk(url: str) -> list[DataTable]:
+        async with semaphore:
+            return await fetch_all_pages(client, url)
+
+    chunks = await asyncio.gather(*(_fetch_chunk(url) for url in urls))
+    return DataTable.concat([page for chunk in chunks for page in chunk])